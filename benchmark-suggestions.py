@@ -0,0 +1,197 @@
+"""Time the suggestions list against a generated database.
+
+Fills a new database with random suggestions, then reads pages of the list the
+way the suggestions page does, following the cursor from one page to the next.
+Each filter is run three times and the best time per page is printed:
+
+    uv run benchmark-suggestions.py
+
+Pass --database to keep the generated database; an existing file is reused
+as it is, so later runs can skip the insert.
+"""
+
+import argparse
+import pathlib
+import random
+import secrets
+import tempfile
+import time
+
+import rainwave_library.models.storage
+import rainwave_library.models.suggestions
+
+WORDS = (
+    "chrono trigger final fantasy zelda mario sonic mega man castlevania metroid "
+    "ost arrange remix piano jazz orchestra"
+).split()
+STATUSES = ("new", "claimed", "accepted", "completed", "declined")
+STATUS_WEIGHTS = (1, 1, 1, 6, 2)
+KINDS = ("new-album", "add-to-existing-album", "metadata-update", "removal")
+CHANNEL_IDS = (1, 2, 3, 4, 6)
+
+
+def database_fill(path: str, count: int) -> None:
+    rnd = random.Random(1)  # noqa: S311
+    suggestions = []
+    channels = []
+    activity = []
+    for i in range(count):
+        suggestion_id = secrets.token_urlsafe(16)
+        timestamp = (
+            f"2020-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+            f"T{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:"
+            f"{rnd.randint(0, 59):02d}.{i % 1000:03d}Z"
+        )
+        suggestions.append(
+            (
+                suggestion_id,
+                " ".join(rnd.choices(WORDS, k=3)).title(),
+                rnd.choice(KINDS),
+                rnd.choices(STATUSES, STATUS_WEIGHTS)[0],
+                " ".join(rnd.choices(WORDS, k=30)),
+                f"user{rnd.randint(1, 500)}",
+                timestamp,
+                rnd.choice((None, "staff1", "staff2", "staff3")),
+                timestamp,
+                timestamp,
+            )
+        )
+        channels.extend(
+            (suggestion_id, channel_id)
+            for channel_id in rnd.sample(CHANNEL_IDS, rnd.randint(0, 2))
+        )
+        if rnd.random() < 0.5:
+            activity.append(
+                (
+                    secrets.token_urlsafe(16),
+                    suggestion_id,
+                    "comment",
+                    "x",
+                    " ".join(rnd.choices(WORDS, k=10)),
+                    timestamp,
+                )
+            )
+
+    con = rainwave_library.models.storage.connection_get(path)
+    try:
+        con.executemany(
+            """
+            insert into suggestions (
+                suggestion_id, title, kind, status, description, requester_name,
+                requested_at, claimed_by_name, created_at, updated_at
+            ) values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            suggestions,
+        )
+        con.executemany(
+            """
+            insert into suggestion_channels (suggestion_id, channel_id)
+            values (?, ?)
+            """,
+            channels,
+        )
+        con.executemany(
+            """
+            insert into suggestion_activity (
+                activity_id, suggestion_id, activity_type, actor_name, body,
+                created_at
+            ) values (?, ?, ?, ?, ?, ?)
+            """,
+            activity,
+        )
+        con.commit()
+        con.execute("analyze")
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+
+
+def pages_time(path: str, pages: int, **kwargs: object) -> float:
+    """The best time of three runs, in seconds per page"""
+    con = rainwave_library.models.storage.connection_get_readonly(path)
+    try:
+        best = None
+        for _ in range(3):
+            started = time.perf_counter()
+            cursor = None
+            for page in range(1, pages + 1):
+                suggestions = rainwave_library.models.suggestions.suggestions_get(
+                    con, page=page, cursor=cursor, **kwargs
+                )
+                # A page holds 100 suggestions and one more when there is a next
+                # page, like the list reads them
+                if len(suggestions) > 100:
+                    cursor = suggestions[99].cursor
+            duration = time.perf_counter() - started
+            best = duration if best is None else min(best, duration)
+    finally:
+        con.close()
+    return best / pages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time the suggestions list against a generated database."
+    )
+    parser.add_argument(
+        "--database",
+        type=pathlib.Path,
+        help="Keep the generated database here, or reuse it if it exists.",
+    )
+    parser.add_argument(
+        "--suggestions",
+        type=int,
+        default=100_000,
+        help="How many suggestions to generate. Default: 100000.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        path = str(args.database or pathlib.Path(temporary_dir) / "benchmark.db")
+        exists = pathlib.Path(path).exists()
+        rainwave_library.models.storage.connection_init(path)
+        con = rainwave_library.models.storage.connection_get(path)
+        try:
+            rainwave_library.models.storage.migrate(con)
+        finally:
+            con.close()
+        if not exists:
+            started = time.perf_counter()
+            database_fill(path, args.suggestions)
+            print(
+                f"# {args.suggestions} suggestions generated "
+                f"in {time.perf_counter() - started:.1f} seconds"
+            )
+
+        every_channel = {
+            "statuses": STATUSES,
+            "channel_ids": CHANNEL_IDS,
+            "include_unassigned_channel": True,
+        }
+        benchmarks = (
+            ("default", 5, every_channel),
+            ("default, pages 1-20", 20, every_channel),
+            ("status new, channel 3", 5, {"statuses": ["new"], "channel_ids": [3]}),
+            (
+                "title ascending",
+                5,
+                {"statuses": None, "sort_col": "title", "sort_dir": "asc"},
+            ),
+            (
+                "claimed by staff1",
+                5,
+                {"statuses": None, "claimed_by_names": ["staff1"]},
+            ),
+            ("search chrono", 5, {"statuses": None, "query": "chrono"}),
+        )
+        for label, pages, kwargs in benchmarks:
+            kwargs.setdefault("query", None)
+            seconds = pages_time(path, pages, **kwargs)
+            print(f"{label:30s} {seconds * 1000:8.1f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
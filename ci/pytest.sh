@@ -0,0 +1,2 @@
+pip install uv
+uv run --with pytest python -m pytest --quiet
@@ -9,6 +9,9 @@ the same environment file:
 Omit the query argument to read SQL from stdin or enter an interactive prompt:
 
     uv run --env-file .local/.env dbtest.py
+
+Pass --check-song-paging to walk every page of the song list sorted by rating,
+once by cursor and once by offset, and report where the two differ.
 """
 
 import argparse
@@ -72,6 +75,52 @@ def run(
     print(f"({len(rows)} row{'s' if len(rows) != 1 else ''})")
 
 
+def song_paging_check(db: fort.PostgresDatabase) -> bool:
+    """Compare cursor paging with offset paging for the song list sorted by
+    rating, where many songs share a rating"""
+    matched = True
+    for sort_dir in ("asc", "desc"):
+        by_offset: list[int] = []
+        page = 1
+        while True:
+            songs = rainwave_library.models.rainwave.get_songs(
+                db, page=page, sort_col="song_rating", sort_dir=sort_dir
+            )
+            by_offset.extend(song.id for song in songs[:100])
+            if len(songs) <= 100:
+                break
+            page += 1
+        by_cursor: list[int] = []
+        page = 1
+        cursor = None
+        while True:
+            songs = rainwave_library.models.rainwave.get_songs(
+                db, page=page, sort_col="song_rating", sort_dir=sort_dir, cursor=cursor
+            )
+            by_cursor.extend(song.id for song in songs[:100])
+            if len(songs) <= 100:
+                break
+            page += 1
+            cursor = songs[99].cursor
+        if by_cursor == by_offset:
+            print(f"song_rating {sort_dir}: {len(by_cursor)} songs, pages match")
+            continue
+        matched = False
+        index = next(
+            (
+                index
+                for index, (a, b) in enumerate(zip(by_cursor, by_offset, strict=False))
+                if a != b
+            ),
+            min(len(by_cursor), len(by_offset)),
+        )
+        print(
+            f"song_rating {sort_dir}: pages differ from song {index + 1} "
+            f"({len(by_cursor)} songs by cursor, {len(by_offset)} by offset)"
+        )
+    return matched
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Connect to Rainwave's configured database and run ad-hoc queries."
@@ -91,10 +140,18 @@ def main() -> None:
         metavar="TABLE",
         help="Show the columns of TABLE.",
     )
+    parser.add_argument(
+        "--check-song-paging",
+        action="store_true",
+        help="Check that cursor paging by song rating matches offset paging.",
+    )
     args = parser.parse_args()
 
     db = database_get()
 
+    if args.check_song_paging:
+        sys.exit(0 if song_paging_check(db) else 1)
+
     if args.tables:
         run(
             db,
@@ -6,7 +6,9 @@ import json
 import os
 import pathlib
 import secrets
+import sqlite3
 import string
+import tempfile
 import textwrap
 import time
 import typing
@@ -16,7 +18,10 @@ import flask
 import httpx
 import mutagen.id3
 import waitress
+import werkzeug.datastructures
+import werkzeug.http
 import werkzeug.middleware.proxy_fix
+import werkzeug.wsgi
 import xlsxwriter
 
 import rainwave_library.components
@@ -70,12 +75,161 @@ try:
     rainwave_connection = rainwave_library.models.storage.setting_get(
         storage_cnx, "rainwave/connection"
     )
+    rating_aggregate_max_age = rainwave_library.models.storage.setting_get(
+        storage_cnx, "rainwave/rating-aggregate-max-age"
+    )
+    library_watch = rainwave_library.models.storage.setting_get(
+        storage_cnx, "library/watch"
+    )
+    search_indexes = rainwave_library.models.storage.setting_get(
+        storage_cnx, "rainwave/search-indexes"
+    )
+    app.config["AUDIO_OFFLOAD"] = rainwave_library.models.storage.setting_get(
+        storage_cnx, "library/offload"
+    )
+    app.config["AUDIO_OFFLOAD_PREFIX"] = (
+        rainwave_library.models.storage.setting_get(
+            storage_cnx, "library/offload-prefix"
+        )
+        or "/library-internal"
+    )
 finally:
     storage_cnx.close()
 
 app.config["RAINWAVE_DATABASE"] = rainwave_library.models.rainwave.connection_get(
     rainwave_connection or ""
 )
+if rating_aggregate_max_age:
+    rainwave_library.models.rainwave.rating_aggregates.max_age_seconds = float(
+        rating_aggregate_max_age
+    )
+rainwave_library.models.rainwave.rating_aggregates.start(
+    app.config["RAINWAVE_DATABASE"]
+)
+if search_indexes == "true":
+    rainwave_library.models.rainwave.search_indexes.start(
+        app.config["RAINWAVE_DATABASE"]
+    )
+rainwave_library.models.tag_jobs.tag_job_runner.start(app.config["STORAGE_CNX"])
+rainwave_library.models.reconciliation.library_reconciliation_runner.start(
+    app.config["STORAGE_CNX"]
+)
+if library_watch == "true":
+    rainwave_library.models.watcher.library_watcher.watch(app.config["LIBRARY_ROOT"])
+    rainwave_library.models.watcher.library_watcher.watch(
+        rainwave_library.models.rainwave.art_dir
+    )
+    rainwave_library.models.watcher.library_watcher.start()
+
+if app.config["AUDIO_OFFLOAD"] not in (None, "x-accel-redirect", "x-sendfile"):
+    app.logger.warning(
+        "Ignoring unknown library/offload setting %r", app.config["AUDIO_OFFLOAD"]
+    )
+    app.config["AUDIO_OFFLOAD"] = None
+
+
+class _FileRange:
+    """length bytes of a file from start, looking like the whole file to a
+    wsgi.file_wrapper so it sends only the range"""
+
+    def __init__(self, f: typing.BinaryIO, start: int, length: int) -> None:
+        self._file = f
+        self._end = start + length
+        f.seek(start)
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = max(self._end - self._file.tell(), 0)
+        return self._file.read(remaining if size < 0 else min(size, remaining))
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_END:
+            return self._file.seek(self._end + offset)
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _audio_file_send(
+    path: str | pathlib.Path,
+    mimetype: str = "audio/mpeg",
+    *,
+    as_attachment: bool = False,
+) -> flask.Response:
+    """Send an audio file with validators and byte ranges.
+
+    The body is handed to waitress as a file wrapper positioned at the start of
+    the range, so waitress writes it from its event loop and the worker thread
+    returns at once. With the library/offload setting, files under the library
+    root are instead left to the fronting proxy through X-Accel-Redirect (under
+    library/offload-prefix) or X-Sendfile."""
+    path = pathlib.Path(path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        flask.abort(404)
+    last_modified = datetime.datetime.fromtimestamp(int(stat.st_mtime), datetime.UTC)
+    # Built like the ETag nginx gives static files, so it stays the same when
+    # the proxy serves the file
+    etag = f"{int(stat.st_mtime):x}-{stat.st_size:x}"
+    response = flask.Response(mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.accept_ranges = "bytes"
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    if as_attachment:
+        response.headers.set("Content-Disposition", "attachment", filename=path.name)
+    if not werkzeug.http.is_resource_modified(
+        flask.request.environ, etag=etag, last_modified=last_modified
+    ):
+        response.status_code = 304
+        return response
+
+    offload = app.config["AUDIO_OFFLOAD"]
+    library_root = app.config["LIBRARY_ROOT"].resolve()
+    resolved = path.resolve()
+    if offload is not None and resolved.is_relative_to(library_root):
+        if offload == "x-accel-redirect":
+            response.headers["X-Accel-Redirect"] = urllib.parse.quote(
+                f"{app.config['AUDIO_OFFLOAD_PREFIX'].rstrip('/')}/"
+                f"{resolved.relative_to(library_root).as_posix()}"
+            )
+        else:
+            response.headers["X-Sendfile"] = str(resolved)
+        return response
+
+    start = 0
+    length = stat.st_size
+    if_range = flask.request.if_range
+    if flask.request.range is not None and (
+        (if_range.etag is None and if_range.date is None)
+        or if_range.etag == etag
+        or (if_range.date is not None and if_range.date == last_modified)
+    ):
+        bounds = flask.request.range.range_for_length(stat.st_size)
+        if bounds is None:
+            response.status_code = 416
+            response.content_range = werkzeug.datastructures.ContentRange(
+                "bytes", None, None, stat.st_size
+            )
+            return response
+        start, stop = bounds
+        length = stop - start
+        response.status_code = 206
+        response.content_range = werkzeug.datastructures.ContentRange(
+            "bytes", start, stop, stat.st_size
+        )
+    response.response = werkzeug.wsgi.wrap_file(
+        flask.request.environ, _FileRange(path.open("rb"), start, length)
+    )
+    response.direct_passthrough = True
+    response.content_length = length
+    return response
 
 
 def external_url_for(endpoint: str, *args, **kwargs) -> str:  # noqa: ANN002, ANN003
@@ -94,18 +248,13 @@ def _suggestion_discord_message_send(
     mentioned_user_ids: tuple[str, ...] = (),
 ) -> None:
     try:
-        storage_cnx_ = rainwave_library.models.storage.connection_get(
-            app.config["STORAGE_CNX"]
+        storage_cnx_ = _storage_cnx_get()
+        bot_token = rainwave_library.models.storage.setting_get(
+            storage_cnx_, "discord/bot-token"
+        )
+        discord_channel_id = rainwave_library.models.storage.setting_get(
+            storage_cnx_, "discord/music-suggestion-channel-id"
         )
-        try:
-            bot_token = rainwave_library.models.storage.setting_get(
-                storage_cnx_, "discord/bot-token"
-            )
-            discord_channel_id = rainwave_library.models.storage.setting_get(
-                storage_cnx_, "discord/music-suggestion-channel-id"
-            )
-        finally:
-            storage_cnx_.close()
 
         if not bot_token or not discord_channel_id:
             app.logger.warning(
@@ -289,6 +438,38 @@ def secure(f: typing.Callable) -> typing.Callable:
     return decorated_function
 
 
+def _storage_cnx_get() -> sqlite3.Connection:
+    """The storage connection for this request, returned to the pool when the
+    request ends"""
+    storage_cnx = flask.g.get("storage_cnx")
+    if storage_cnx is None:
+        storage_cnx = rainwave_library.models.storage.connection_get(
+            app.config["STORAGE_CNX"]
+        )
+        flask.g.storage_cnx = storage_cnx
+    else:
+        # Start a new read so writes made since on other connections are seen
+        storage_cnx.rollback()
+    return storage_cnx
+
+
+@app.teardown_appcontext
+def storage_cnx_release(_: BaseException | None) -> None:
+    storage_cnx = flask.g.pop("storage_cnx", None)
+    if storage_cnx is not None:
+        storage_cnx.close()
+    for stats in rainwave_library.models.storage.connection_pool_stats_get():
+        app.logger.debug(
+            "Storage pool %s%s: %d opened, %d reused, %d idle, %d in use",
+            stats.path,
+            " (read-only)" if stats.readonly else "",
+            stats.opened,
+            stats.reused,
+            stats.idle,
+            stats.in_use,
+        )
+
+
 @app.before_request
 def before_request() -> None:
     app.logger.debug(f"{flask.request.method} {flask.request.path}")
@@ -301,16 +482,21 @@ def before_request() -> None:
     flask.g.discord_avatar_url = flask.session.get("discord_avatar_url")
     flask.g.color_mode = rainwave_library.models.storage.USER_COLOR_MODE_DEFAULT
     if flask.g.discord_id:
-        storage_cnx = rainwave_library.models.storage.connection_get(
-            app.config["STORAGE_CNX"]
+        # Settings are cached at sign-in, so the database is only read for
+        # users who fell out of the cache or signed in before a restart
+        discord_id = str(flask.g.discord_id)
+        user_settings_ = rainwave_library.models.storage.user_settings_cache_get(
+            discord_id
         )
-        try:
-            flask.g.color_mode = rainwave_library.models.storage.user_color_mode_get(
-                storage_cnx,
-                str(flask.g.discord_id),
+        if user_settings_ is None:
+            user_settings_ = rainwave_library.models.storage.user_settings_cache_load(
+                _storage_cnx_get(), discord_id
+            )
+        flask.g.color_mode = (
+            rainwave_library.models.storage.user_color_mode_from_settings(
+                user_settings_
             )
-        finally:
-            storage_cnx.close()
+        )
 
 
 @app.route("/", methods=["GET"])
@@ -351,12 +537,62 @@ def library_browser_index() -> werkzeug.Response:
     )
 
 
+@app.route("/library-reconciliation", methods=["GET", "POST"])
+@secure
+def library_reconciliation() -> werkzeug.Response | str:
+    if flask.request.method == "POST":
+        db = app.config["RAINWAVE_DATABASE"]
+        rainwave_library.models.reconciliation.library_reconciliation_runner.submit(
+            app.config["LIBRARY_ROOT"],
+            functools.partial(rainwave_library.models.rainwave.get_song_filenames, db),
+            full=bool(flask.request.values.get("full")),
+        )
+        return flask.redirect(flask.url_for("library_reconciliation"))
+    storage_cnx = rainwave_library.models.storage.connection_get_readonly(
+        app.config["STORAGE_CNX"]
+    )
+    try:
+        reconciliation = (
+            rainwave_library.models.reconciliation.library_reconciliation_get(
+                storage_cnx
+            )
+        )
+        run = rainwave_library.models.reconciliation.library_reconciliation_run_get(
+            storage_cnx
+        )
+    finally:
+        storage_cnx.close()
+    return rainwave_library.components.library_reconciliation(reconciliation, run)
+
+
+@app.route("/library-reconciliation/run", methods=["GET"])
+@secure
+def library_reconciliation_run() -> werkzeug.Response | str:
+    storage_cnx = rainwave_library.models.storage.connection_get_readonly(
+        app.config["STORAGE_CNX"]
+    )
+    try:
+        run = rainwave_library.models.reconciliation.library_reconciliation_run_get(
+            storage_cnx
+        )
+    finally:
+        storage_cnx.close()
+    if run is None or not run.running:
+        # Reload the page to show the new findings
+        response = flask.make_response()
+        response.headers["HX-Refresh"] = "true"
+        return response
+    return rainwave_library.components.library_reconciliation_run(run)
+
+
 @app.route("/library-files/<browser_root>", methods=["GET"])
 @secure
 def library_browser(browser_root: str) -> str:
     selected_root = _library_browser_root_get(browser_root)
+    storage_cnx = _storage_cnx_get()
     try:
         directory = rainwave_library.models.storage.library_browser_directory_get(
+            storage_cnx,
             app.config["LIBRARY_ROOT"],
             selected_root,
             flask.request.args.get("path", ""),
@@ -400,13 +636,8 @@ def library_browser_audio(browser_root: str) -> flask.Response:
         )
     except ValueError:
         flask.abort(404)
-    response = flask.send_file(
-        path,
-        conditional=True,
-        mimetype=mimetype,
-    )
+    response = _audio_file_send(path, mimetype)
     response.headers["Content-Security-Policy"] = "default-src 'none'"
-    response.headers["X-Content-Type-Options"] = "nosniff"
     return response
 
 
@@ -423,11 +654,15 @@ def library_browser_audio_preview(browser_root: str) -> str:
         )
     except ValueError:
         flask.abort(404)
+    storage_cnx = _storage_cnx_get()
+    tag_values, file_info = rainwave_library.models.storage.mp3_metadata_get(
+        storage_cnx, path
+    )
     return rainwave_library.components.library_browser_audio_preview(
         selected_root,
         relative_path,
-        rainwave_library.models.mp3.id3_tag_values_get(path),
-        rainwave_library.models.mp3.mp3_file_info_get(path),
+        tag_values,
+        file_info,
     )
 
 
@@ -563,13 +798,51 @@ def albums() -> str:
     return rainwave_library.components.albums_index()
 
 
-@app.route("/albums/<int:album_id>", methods=["GET"])
+@app.route("/albums/<int:album_id>", methods=["GET", "POST"])
 @secure
-def albums_detail(album_id: int) -> str:
+def albums_detail(album_id: int) -> werkzeug.Response | str:
     db = app.config["RAINWAVE_DATABASE"]
     album = rainwave_library.models.rainwave.get_album(db, album_id)
     songs_ = rainwave_library.models.rainwave.get_album_songs(db, album_id)
-    return rainwave_library.components.albums_detail(album, songs_)
+    tag_result = None
+    if flask.request.method == "POST":
+        filenames = [song.filename for song in songs_]
+        job_id = None
+        if "album-name" in flask.request.values:
+            new_name = flask.request.values.get("album-name", "").strip()
+            if not new_name:
+                tag_result = ("alert-danger", "Album name is required.")
+            elif new_name == album.name:
+                tag_result = ("alert-info", "The album name is unchanged.")
+            else:
+                job_id = _tag_job_create(
+                    "album-rename",
+                    {
+                        "album_id": str(album_id),
+                        "old_name": album.name,
+                        "new_name": new_name,
+                    },
+                    filenames,
+                )
+        else:
+            job_id = _tag_job_create(
+                "genre-set",
+                {
+                    "album_id": str(album_id),
+                    "genre": flask.request.values.get("genre", "").strip(),
+                },
+                filenames,
+            )
+        if job_id is not None:
+            return flask.redirect(
+                flask.url_for("albums_detail", album_id=album_id, job=job_id)
+            )
+    return rainwave_library.components.albums_detail(
+        album,
+        songs_,
+        tag_result=tag_result,
+        tag_job_id=flask.request.values.get("job"),
+    )
 
 
 @app.route("/albums/missing-art", methods=["GET"])
@@ -580,16 +853,63 @@ def albums_missing_art() -> str:
     return rainwave_library.components.albums_missing_art(albums_)
 
 
+def _tag_job_create(kind: str, params: dict[str, str], filenames: list[str]) -> str:
+    storage_cnx = _storage_cnx_get()
+    job_id = rainwave_library.models.tag_jobs.tag_job_create(
+        storage_cnx, kind, params, filenames, flask.g.discord_id
+    )
+    rainwave_library.models.tag_jobs.tag_job_runner.submit(job_id)
+    return job_id
+
+
+@app.route("/tag-jobs/<job_id>", methods=["GET"])
+@secure
+def tag_job_progress(job_id: str) -> str:
+    storage_cnx = rainwave_library.models.storage.connection_get_readonly(
+        app.config["STORAGE_CNX"]
+    )
+    try:
+        job = rainwave_library.models.tag_jobs.tag_job_get(storage_cnx, job_id)
+        if job is None:
+            flask.abort(404)
+        failures = (
+            rainwave_library.models.tag_jobs.tag_job_failures_get(storage_cnx, job_id)
+            if job.finished
+            else []
+        )
+    finally:
+        storage_cnx.close()
+    next_url = None
+    if job.finished and job.kind == "artist-rename":
+        # Rainwave creates the renamed artist when it rescans the files
+        renamed_artist = rainwave_library.models.rainwave.get_artist_by_name(
+            app.config["RAINWAVE_DATABASE"], job.params["new_name"]
+        )
+        if renamed_artist is not None:
+            next_url = flask.url_for("artists_detail", artist_id=renamed_artist.id)
+    elif job.finished and job.kind == "album-rename":
+        # Songs move to the renamed album when Rainwave rescans the files
+        renamed_album = rainwave_library.models.rainwave.get_album_by_name(
+            app.config["RAINWAVE_DATABASE"], job.params["new_name"]
+        )
+        if renamed_album is not None:
+            next_url = flask.url_for("albums_detail", album_id=renamed_album.id)
+    elif job.finished:
+        next_url = flask.url_for("albums_detail", album_id=job.params["album_id"])
+    return rainwave_library.components.tag_job_progress(job, failures, next_url)
+
+
 @app.route("/albums/rows", methods=["POST"])
 @secure
 def albums_rows() -> str:
     db = app.config["RAINWAVE_DATABASE"]
     q = flask.request.values.get("q")
     page = int(flask.request.values.get("page", 1))
+    cursor = flask.request.values.get("cursor")
     sort_col = flask.request.values.get("sort-col", "album_id")
     sort_dir = flask.request.values.get("sort-dir", "asc")
     albums_ = rainwave_library.models.rainwave.get_albums(
-        db, q, page, sort_col, sort_dir
+        db, q, page, sort_col, sort_dir, cursor
     )
     return rainwave_library.components.albums_rows(albums_, page)
 
@@ -616,37 +936,23 @@ def artists_detail(artist_id: int) -> werkzeug.Response | str:
         elif new_name == artist.name:
             rename_result = ("alert-info", "The artist name is unchanged.")
         else:
-            errors = rainwave_library.models.mp3.rename_artist(
-                [song.filename for song in songs_], artist.name, new_name
+            job_id = _tag_job_create(
+                "artist-rename",
+                {
+                    "artist_id": str(artist_id),
+                    "old_name": artist.name,
+                    "new_name": new_name,
+                },
+                [song.filename for song in songs_],
+            )
+            return flask.redirect(
+                flask.url_for("artists_detail", artist_id=artist_id, job=job_id)
             )
-            if errors:
-                rename_result = (
-                    "alert-danger",
-                    f"Processed {len(songs_)} song files, but {len(errors)} failed. "
-                    "See the application log for details.",
-                )
-            else:
-                renamed_artist = rainwave_library.models.rainwave.get_artist_by_name(
-                    db, new_name
-                )
-                if renamed_artist is None:
-                    time.sleep(1)
-                    renamed_artist = (
-                        rainwave_library.models.rainwave.get_artist_by_name(
-                            db, new_name
-                        )
-                    )
-                if renamed_artist is not None:
-                    return flask.redirect(
-                        flask.url_for("artists_detail", artist_id=renamed_artist.id)
-                    )
-                rename_result = (
-                    "alert-warning",
-                    f"Processed {len(songs_)} song files, but Rainwave has not yet "
-                    f"created the artist {new_name!r}. Try reloading this page.",
-                )
     return rainwave_library.components.artists_detail(
-        artist, songs_, rename_result=rename_result
+        artist,
+        songs_,
+        rename_result=rename_result,
+        tag_job_id=flask.request.values.get("job"),
     )
 
 
@@ -656,10 +962,11 @@ def artists_rows() -> str:
     db = app.config["RAINWAVE_DATABASE"]
     q = flask.request.values.get("q")
     page = int(flask.request.values.get("page", 1))
+    cursor = flask.request.values.get("cursor")
     sort_col = flask.request.values.get("sort-col", "artist_id")
     sort_dir = flask.request.values.get("sort-dir", "asc")
     artists_ = rainwave_library.models.rainwave.get_artists(
-        db, q, page, sort_col, sort_dir
+        db, q, page, sort_col, sort_dir, cursor
     )
     return rainwave_library.components.artists_rows(artists_, page)
 
@@ -706,46 +1013,41 @@ def impersonate_user() -> werkzeug.Response | str:
             error="Enter a valid Discord user ID.",
         )
 
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    stored_user = rainwave_library.models.storage.user_get(
+        storage_cnx_,
+        discord_user_id,
     )
-    try:
-        stored_user = rainwave_library.models.storage.user_get(
+    use_stored_user = bool(
+        stored_user
+        and stored_user.username
+        and stored_user.display_name
+        and stored_user.role in {"member", "staff"}
+    )
+    bot_token = (
+        None
+        if use_stored_user
+        else rainwave_library.models.storage.setting_get(
             storage_cnx_,
-            discord_user_id,
-        )
-        use_stored_user = bool(
-            stored_user
-            and stored_user.username
-            and stored_user.display_name
-            and stored_user.role in {"member", "staff"}
-        )
-        bot_token = (
-            None
-            if use_stored_user
-            else rainwave_library.models.storage.setting_get(
-                storage_cnx_,
-                "discord/bot-token",
-            )
+            "discord/bot-token",
         )
-        guild_id = (
-            None
-            if use_stored_user
-            else rainwave_library.models.storage.setting_get(
-                storage_cnx_,
-                "discord/guild-id",
-            )
+    )
+    guild_id = (
+        None
+        if use_stored_user
+        else rainwave_library.models.storage.setting_get(
+            storage_cnx_,
+            "discord/guild-id",
         )
-        staff_role_id = (
-            None
-            if use_stored_user
-            else rainwave_library.models.storage.setting_get(
-                storage_cnx_,
-                "discord/staff-role-id",
-            )
+    )
+    staff_role_id = (
+        None
+        if use_stored_user
+        else rainwave_library.models.storage.setting_get(
+            storage_cnx_,
+            "discord/staff-role-id",
         )
-    finally:
-        storage_cnx_.close()
+    )
 
     if use_stored_user and stored_user is not None:
         username = stored_user.username
@@ -871,20 +1173,18 @@ def impersonate_user() -> werkzeug.Response | str:
         else:
             avatar_url = None
         role = "staff" if staff_role_id in roles else "member"
-        storage_cnx_ = rainwave_library.models.storage.connection_get(
-            app.config["STORAGE_CNX"]
+        storage_cnx_ = _storage_cnx_get()
+        rainwave_library.models.storage.user_upsert(
+            storage_cnx_,
+            discord_user_id,
+            username=username,
+            display_name=display_name,
+            avatar_url=avatar_url,
+            role=role,
+        )
+        rainwave_library.models.storage.user_settings_cache_load(
+            storage_cnx_, discord_user_id
         )
-        try:
-            rainwave_library.models.storage.user_upsert(
-                storage_cnx_,
-                discord_user_id,
-                username=username,
-                display_name=display_name,
-                avatar_url=avatar_url,
-                role=role,
-            )
-        finally:
-            storage_cnx_.close()
 
     impersonator = {key: flask.session.get(key) for key in _IDENTITY_SESSION_KEYS}
     flask.session["impersonator"] = impersonator
@@ -933,40 +1233,35 @@ def authorize() -> werkzeug.Response:
     if flask.session.get("state") != flask.request.values.get("state"):
         return flask.Response("State mismatch", 401)
     flask.session.pop("impersonator", None)
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
-    try:
-        client_id = (
-            rainwave_library.models.storage.setting_get(
-                storage_cnx,
-                "openid/client-id",
-            )
-            or ""
+    storage_cnx = _storage_cnx_get()
+    client_id = (
+        rainwave_library.models.storage.setting_get(
+            storage_cnx,
+            "openid/client-id",
         )
-        client_secret = (
-            rainwave_library.models.storage.setting_get(
-                storage_cnx,
-                "openid/client-secret",
-            )
-            or ""
+        or ""
+    )
+    client_secret = (
+        rainwave_library.models.storage.setting_get(
+            storage_cnx,
+            "openid/client-secret",
         )
-        guild_id = (
-            rainwave_library.models.storage.setting_get(
-                storage_cnx,
-                "discord/guild-id",
-            )
-            or ""
+        or ""
+    )
+    guild_id = (
+        rainwave_library.models.storage.setting_get(
+            storage_cnx,
+            "discord/guild-id",
         )
-        staff_role = (
-            rainwave_library.models.storage.setting_get(
-                storage_cnx,
-                "discord/staff-role-id",
-            )
-            or ""
+        or ""
+    )
+    staff_role = (
+        rainwave_library.models.storage.setting_get(
+            storage_cnx,
+            "discord/staff-role-id",
         )
-    finally:
-        storage_cnx.close()
+        or ""
+    )
     resp = rainwave_library.models.discord.exchange_authorization_code(
         client_id,
         client_secret,
@@ -1015,20 +1310,16 @@ def authorize() -> werkzeug.Response:
     else:
         app.logger.debug(f"{username} is member")
         role = "member"
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
-    try:
-        rainwave_library.models.storage.user_upsert(
-            storage_cnx,
-            user_id,
-            username=username,
-            display_name=display_name,
-            avatar_url=avatar_url,
-            role=role,
-        )
-    finally:
-        storage_cnx.close()
+    storage_cnx = _storage_cnx_get()
+    rainwave_library.models.storage.user_upsert(
+        storage_cnx,
+        user_id,
+        username=username,
+        display_name=display_name,
+        avatar_url=avatar_url,
+        role=role,
+    )
+    rainwave_library.models.storage.user_settings_cache_load(storage_cnx, user_id)
     flask.session.update(
         {
             "discord_id": user_id,
@@ -1046,26 +1337,21 @@ def authorize() -> werkzeug.Response:
 def bluesky() -> werkzeug.Response | str:
     if flask.request.method == "GET":
         return rainwave_library.components.bluesky_post()
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
-    try:
-        handle = (
-            rainwave_library.models.storage.setting_get(
-                storage_cnx,
-                "bluesky/handle",
-            )
-            or ""
+    storage_cnx = _storage_cnx_get()
+    handle = (
+        rainwave_library.models.storage.setting_get(
+            storage_cnx,
+            "bluesky/handle",
         )
-        password = (
-            rainwave_library.models.storage.setting_get(
-                storage_cnx,
-                "bluesky/password",
-            )
-            or ""
+        or ""
+    )
+    password = (
+        rainwave_library.models.storage.setting_get(
+            storage_cnx,
+            "bluesky/password",
         )
-    finally:
-        storage_cnx.close()
+        or ""
+    )
     b = rainwave_library.models.bsky.get_client(handle, password)
     b.post(flask.request.values["body"])
     return flask.redirect(flask.url_for("index"))
@@ -1128,10 +1414,24 @@ def get_ocremix_download() -> str:
         tags.delall(tag)
     tags.save(mp3_data)
     target_file = pathlib.Path(get_ocremix_target_file())
+    audio_hash = rainwave_library.models.mp3.mp3_audio_hash_read(mp3_data)
+    storage_cnx = _storage_cnx_get()
+    duplicates = tuple(
+        path
+        for path in rainwave_library.models.audio_index.audio_hash_paths_get(
+            storage_cnx, audio_hash
+        )
+        if path != str(target_file)
+    )
     target_file.parent.mkdir(parents=True, exist_ok=True)
     app.logger.debug(f"Saving file to {target_file}")
     target_file.write_bytes(mp3_data.getvalue())
-    return rainwave_library.components.get_ocremix_download()
+    rainwave_library.models.audio_index.audio_hashes_get(storage_cnx, [target_file])
+    if duplicates:
+        app.logger.warning(
+            "Saved %s, which has the same audio as %s", target_file, duplicates
+        )
+    return rainwave_library.components.get_ocremix_download(duplicates)
 
 
 @app.route("/get-ocremix/fetch", methods=["POST"])
@@ -1217,11 +1517,12 @@ def listeners_rows() -> str:
     db = app.config["RAINWAVE_DATABASE"]
     q = flask.request.values.get("q")
     page = int(flask.request.values.get("page", 1))
+    cursor = flask.request.values.get("cursor")
     ranks = list(map(int, flask.request.values.getlist("ranks")))
     sort_col = flask.request.values.get("sort-col", "user_id")
     sort_dir = flask.request.values.get("sort-dir", "asc")
     listeners_ = rainwave_library.models.rainwave.get_listeners(
-        db, q, page, ranks, sort_col, sort_dir
+        db, q, page, ranks, sort_col, sort_dir, cursor
     )
     return rainwave_library.components.listeners_rows(listeners_, page)
 
@@ -1239,34 +1540,29 @@ def settings() -> str:
     value = ""
     protected = False
     result: tuple[str, str] | None = None
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
-    try:
-        if flask.request.method == "POST":
-            key = flask.request.form.get("key", "")
-            value = flask.request.form.get("value", "")
-            protected = "protected" in flask.request.form
-            try:
-                created = rainwave_library.models.storage.setting_set(
-                    storage_cnx,
-                    key,
-                    value,
-                    protected=protected,
-                )
-            except ValueError as error:
-                result = ("alert-danger", str(error))
-            else:
-                result = (
-                    "alert-success",
-                    f"Setting {'created' if created else 'replaced'}.",
-                )
-                key = ""
-                value = ""
-                protected = False
-        settings_ = rainwave_library.models.storage.settings_get(storage_cnx)
-    finally:
-        storage_cnx.close()
+    storage_cnx = _storage_cnx_get()
+    if flask.request.method == "POST":
+        key = flask.request.form.get("key", "")
+        value = flask.request.form.get("value", "")
+        protected = "protected" in flask.request.form
+        try:
+            created = rainwave_library.models.storage.setting_set(
+                storage_cnx,
+                key,
+                value,
+                protected=protected,
+            )
+        except ValueError as error:
+            result = ("alert-danger", str(error))
+        else:
+            result = (
+                "alert-success",
+                f"Setting {'created' if created else 'replaced'}.",
+            )
+            key = ""
+            value = ""
+            protected = False
+    settings_ = rainwave_library.models.storage.settings_get(storage_cnx)
     return rainwave_library.components.settings_index(
         settings_,
         key=key,
@@ -1287,64 +1583,57 @@ def user_settings() -> str:
     value = ""
     result: tuple[str, str] | None = None
     color_mode_result: tuple[str, str] | None = None
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
-    try:
-        if flask.request.method == "POST":
-            if flask.request.form.get("form") == "color-mode":
-                color_mode = flask.request.form.get("color-mode", "")
-                try:
-                    rainwave_library.models.storage.user_setting_set(
+    storage_cnx_ = _storage_cnx_get()
+    if flask.request.method == "POST":
+        if flask.request.form.get("form") == "color-mode":
+            color_mode = flask.request.form.get("color-mode", "")
+            try:
+                rainwave_library.models.storage.user_setting_set(
+                    storage_cnx_,
+                    discord_id,
+                    rainwave_library.models.storage.USER_COLOR_MODE_SETTING_KEY,
+                    color_mode,
+                )
+            except ValueError as error:
+                color_mode_result = ("alert-danger", str(error))
+            else:
+                color_mode_result = ("alert-success", "Color mode updated.")
+        else:
+            key = flask.request.form.get("key", "")
+            value = flask.request.form.get("value", "")
+            try:
+                if value:
+                    created = rainwave_library.models.storage.user_setting_set(
                         storage_cnx_,
                         discord_id,
-                        rainwave_library.models.storage.USER_COLOR_MODE_SETTING_KEY,
-                        color_mode,
+                        key,
+                        value,
                     )
-                except ValueError as error:
-                    color_mode_result = ("alert-danger", str(error))
+                    message = f"Setting {'created' if created else 'replaced'}."
                 else:
-                    color_mode_result = ("alert-success", "Color mode updated.")
+                    removed = rainwave_library.models.storage.user_setting_delete(
+                        storage_cnx_,
+                        discord_id,
+                        key,
+                    )
+                    message = (
+                        "Setting removed." if removed else "The setting did not exist."
+                    )
+            except ValueError as error:
+                result = ("alert-danger", str(error))
             else:
-                key = flask.request.form.get("key", "")
-                value = flask.request.form.get("value", "")
-                try:
-                    if value:
-                        created = rainwave_library.models.storage.user_setting_set(
-                            storage_cnx_,
-                            discord_id,
-                            key,
-                            value,
-                        )
-                        message = f"Setting {'created' if created else 'replaced'}."
-                    else:
-                        removed = rainwave_library.models.storage.user_setting_delete(
-                            storage_cnx_,
-                            discord_id,
-                            key,
-                        )
-                        message = (
-                            "Setting removed."
-                            if removed
-                            else "The setting did not exist."
-                        )
-                except ValueError as error:
-                    result = ("alert-danger", str(error))
-                else:
-                    result = ("alert-success", message)
-                    key = ""
-                    value = ""
-        color_mode = rainwave_library.models.storage.user_color_mode_get(
-            storage_cnx_,
-            discord_id,
-        )
-        flask.g.color_mode = color_mode
-        settings_ = rainwave_library.models.storage.user_settings_get(
-            storage_cnx_,
-            discord_id,
-        )
-    finally:
-        storage_cnx_.close()
+                result = ("alert-success", message)
+                key = ""
+                value = ""
+    color_mode = rainwave_library.models.storage.user_color_mode_get(
+        storage_cnx_,
+        discord_id,
+    )
+    flask.g.color_mode = color_mode
+    settings_ = rainwave_library.models.storage.user_settings_get(
+        storage_cnx_,
+        discord_id,
+    )
     return rainwave_library.components.user_settings_index(
         settings_,
         color_mode=color_mode,
@@ -1359,26 +1648,21 @@ def user_settings() -> str:
 @signed_in
 def suggestions() -> str:
     discord_id = str(flask.g.discord_id or "")
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
-    try:
-        your_suggestions_active_count, your_suggestions_complete_count = (
-            rainwave_library.models.suggestions.suggestion_counts_by_requester(
-                storage_cnx_,
-                discord_id or None,
-            )
-        )
-        claimants = rainwave_library.models.suggestions.suggestion_claimants_get(
-            storage_cnx_
-        )
-        saved_filters = rainwave_library.models.storage.user_setting_get(
+    storage_cnx_ = _storage_cnx_get()
+    your_suggestions_active_count, your_suggestions_complete_count = (
+        rainwave_library.models.suggestions.suggestion_counts_by_requester(
             storage_cnx_,
-            discord_id,
-            rainwave_library.models.storage.USER_SUGGESTION_FILTERS_SETTING_KEY,
+            discord_id or None,
         )
-    finally:
-        storage_cnx_.close()
+    )
+    claimants = rainwave_library.models.suggestions.suggestion_claimants_get(
+        storage_cnx_
+    )
+    saved_filters = rainwave_library.models.storage.user_setting_get(
+        storage_cnx_,
+        discord_id,
+        rainwave_library.models.storage.USER_SUGGESTION_FILTERS_SETTING_KEY,
+    )
     filters = rainwave_library.models.suggestions.SuggestionFilterSet.default()
     if saved_filters:
         try:
@@ -1451,18 +1735,13 @@ def _suggestion_filter_set_from_request() -> (
 @signed_in
 def suggestion_default_filters() -> str:
     filters = _suggestion_filter_set_from_request()
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    rainwave_library.models.storage.user_setting_set(
+        storage_cnx_,
+        str(flask.g.discord_id or ""),
+        rainwave_library.models.storage.USER_SUGGESTION_FILTERS_SETTING_KEY,
+        filters.to_json(),
     )
-    try:
-        rainwave_library.models.storage.user_setting_set(
-            storage_cnx_,
-            str(flask.g.discord_id or ""),
-            rainwave_library.models.storage.USER_SUGGESTION_FILTERS_SETTING_KEY,
-            filters.to_json(),
-        )
-    finally:
-        storage_cnx_.close()
     return rainwave_library.components.suggestion_default_filters_saved()
 
 
@@ -1519,27 +1798,22 @@ def suggestion_wizard() -> str:
                 links=links,
                 **_suggestion_notice(),
             )
-        storage_cnx_ = rainwave_library.models.storage.connection_get(
-            app.config["STORAGE_CNX"]
-        )
+        storage_cnx_ = _storage_cnx_get()
         title_matches: tuple[str, ...] = ()
-        try:
-            open_count = (
-                rainwave_library.models.suggestions.suggestion_open_count_for_channel(
+        open_count = (
+            rainwave_library.models.suggestions.suggestion_open_count_for_channel(
+                storage_cnx_,
+                str(flask.g.discord_id) if flask.g.discord_id else None,
+                channel_id,
+            )
+        )
+        if step in {"4", "5"} and kind == "new-album" and title.strip():
+            title_matches = (
+                rainwave_library.models.suggestions.suggestion_title_match_statuses(
                     storage_cnx_,
-                    str(flask.g.discord_id) if flask.g.discord_id else None,
-                    channel_id,
+                    title,
                 )
             )
-            if step in {"4", "5"} and kind == "new-album" and title.strip():
-                title_matches = (
-                    rainwave_library.models.suggestions.suggestion_title_match_statuses(
-                        storage_cnx_,
-                        title,
-                    )
-                )
-        finally:
-            storage_cnx_.close()
         if limits_apply and open_count >= 5:
             return rainwave_library.components.suggestion_wizard_body(
                 2,
@@ -1662,33 +1936,28 @@ def suggestion_create() -> werkzeug.Response | str:
         )
     ]
     entered_links = tuple(pair for pair in link_pairs if pair[0] or pair[1])
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
+    storage_cnx = _storage_cnx_get()
     try:
-        try:
-            suggestion_id = rainwave_library.models.suggestions.suggestion_create(
-                storage_cnx,
-                title=title,
-                description=description,
-                channel_id=channel_id,
-                kind=kind,
-                requester_name=flask.g.discord_display_name,
-                requester_discord_id=(
-                    str(flask.g.discord_id) if flask.g.discord_id else None
-                ),
-                links=entered_links,
-            )
-        except ValueError as error:
-            return rainwave_library.components.suggestion_create_form(
-                title=title,
-                description=description,
-                channel_id=channel_id or None,
-                links=entered_links,
-                result=("alert-danger", str(error)),
-            )
-    finally:
-        storage_cnx.close()
+        suggestion_id = rainwave_library.models.suggestions.suggestion_create(
+            storage_cnx,
+            title=title,
+            description=description,
+            channel_id=channel_id,
+            kind=kind,
+            requester_name=flask.g.discord_display_name,
+            requester_discord_id=(
+                str(flask.g.discord_id) if flask.g.discord_id else None
+            ),
+            links=entered_links,
+        )
+    except ValueError as error:
+        return rainwave_library.components.suggestion_create_form(
+            title=title,
+            description=description,
+            channel_id=channel_id or None,
+            links=entered_links,
+            result=("alert-danger", str(error)),
+        )
 
     _suggestion_created_announce(
         suggestion_id,
@@ -1736,34 +2005,29 @@ def suggestion_staff_create() -> werkzeug.Response | str:
     )
     entered_links = tuple(pair for pair in link_pairs if pair[0] or pair[1])
 
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
+    storage_cnx = _storage_cnx_get()
     try:
-        try:
-            suggestion_id = rainwave_library.models.suggestions.suggestion_create(
-                storage_cnx,
-                title=title,
-                description=description,
-                channel_id=channel_id,
-                kind=kind,
-                requester_name=requester_name,
-                requester_discord_id=requester_discord_id,
-                links=entered_links,
-            )
-        except ValueError as error:
-            return rainwave_library.components.staff_suggestion_create_form(
-                title=title,
-                description=description,
-                channel_id=channel_id or None,
-                kind=kind,
-                requester_name=requester_name_input,
-                requester_discord_id=requester_discord_id_input,
-                links=entered_links,
-                result=("alert-danger", str(error)),
-            )
-    finally:
-        storage_cnx.close()
+        suggestion_id = rainwave_library.models.suggestions.suggestion_create(
+            storage_cnx,
+            title=title,
+            description=description,
+            channel_id=channel_id,
+            kind=kind,
+            requester_name=requester_name,
+            requester_discord_id=requester_discord_id,
+            links=entered_links,
+        )
+    except ValueError as error:
+        return rainwave_library.components.staff_suggestion_create_form(
+            title=title,
+            description=description,
+            channel_id=channel_id or None,
+            kind=kind,
+            requester_name=requester_name_input,
+            requester_discord_id=requester_discord_id_input,
+            links=entered_links,
+            result=("alert-danger", str(error)),
+        )
 
     _suggestion_created_announce(
         suggestion_id,
@@ -1785,18 +2049,13 @@ def suggestion_staff_create() -> werkzeug.Response | str:
 @app.route("/suggestions/staff-requester-discord-id", methods=["GET"])
 @secure
 def suggestion_staff_requester_discord_id() -> str:
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
-    try:
-        requester_discord_id = (
-            rainwave_library.models.suggestions.suggestion_requester_discord_id_get(
-                storage_cnx,
-                flask.request.args.get("requester-name", ""),
-            )
+    storage_cnx = _storage_cnx_get()
+    requester_discord_id = (
+        rainwave_library.models.suggestions.suggestion_requester_discord_id_get(
+            storage_cnx,
+            flask.request.args.get("requester-name", ""),
         )
-    finally:
-        storage_cnx.close()
+    )
     if flask.request.args.get("target") == "edit":
         return rainwave_library.components.suggestion_edit_requester_discord_id_field(
             requester_discord_id or ""
@@ -1822,6 +2081,7 @@ def suggestions_rows() -> str:
     query = flask.request.values.get("q")
     filters = _suggestion_filter_set_from_request()
     page = max(int(flask.request.values.get("page", 1)), 1)
+    cursor = flask.request.values.get("cursor")
     input_channels = filters.channel
     include_unassigned_channel = "unassigned" in input_channels
     channel_ids = [
@@ -1836,7 +2096,7 @@ def suggestions_rows() -> str:
     claimed_by_discord_id = (
         str(flask.g.discord_id or "") if is_staff and filters.your_claims else None
     )
-    storage_cnx = rainwave_library.models.storage.connection_get(
+    storage_cnx = rainwave_library.models.storage.connection_get_readonly(
         app.config["STORAGE_CNX"]
     )
     try:
@@ -1853,6 +2113,7 @@ def suggestions_rows() -> str:
             channel_ids,
             filters.type,
             include_unassigned_channel,
+            cursor,
         )
     finally:
         storage_cnx.close()
@@ -1876,60 +2137,74 @@ def _suggestion_staged_files_get(
         suggestion_id,
     )
     music_tags = {}
+    file_paths = {}
     for path, _ in staged_files:
         if not path.casefold().endswith(".mp3"):
             continue
         try:
-            file_path = rainwave_library.models.storage.suggestion_staging_file_get(
-                library_root,
-                suggestion_id,
-                path,
+            file_paths[path] = (
+                rainwave_library.models.storage.suggestion_staging_file_get(
+                    library_root,
+                    suggestion_id,
+                    path,
+                )
             )
         except (OSError, ValueError):
             music_tags[path] = rainwave_library.models.mp3.Mp3TagValues(
                 error="Could not read ID3 tags."
             )
-            continue
-        music_tags[path] = rainwave_library.models.mp3.id3_tag_values_get(file_path)
+    metadata = rainwave_library.models.storage.mp3_metadata_get_many(
+        _storage_cnx_get(), file_paths.values()
+    )
+    for path, file_path in file_paths.items():
+        music_tags[path], _ = metadata[file_path]
     return staged_files, folder_path, music_tags
 
 
+def _suggestion_staging_mp3_duration_get(suggestion_id: str) -> float:
+    storage_cnx = _storage_cnx_get()
+    return rainwave_library.models.storage.suggestion_staging_mp3_duration_get(
+        storage_cnx,
+        app.config["LIBRARY_ROOT"],
+        suggestion_id,
+    )
+
+
+def _upcoming_music_date_mp3_duration_get(release_date: str) -> float:
+    storage_cnx = _storage_cnx_get()
+    return rainwave_library.models.storage.upcoming_music_date_mp3_duration_get(
+        storage_cnx,
+        app.config["LIBRARY_ROOT"],
+        release_date,
+    )
+
+
+def _mp3_metadata_invalidate(paths: typing.Iterable[str | pathlib.Path]) -> None:
+    storage_cnx = _storage_cnx_get()
+    rainwave_library.models.storage.mp3_metadata_delete(storage_cnx, paths)
+
+
 def _suggestion_file_reviews_get(
     suggestion_id: str,
 ) -> dict[str, rainwave_library.models.suggestions.SuggestionFileReview]:
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    return rainwave_library.models.suggestions.suggestion_file_reviews_get(
+        _storage_cnx_get(),
+        suggestion_id,
     )
-    try:
-        return rainwave_library.models.suggestions.suggestion_file_reviews_get(
-            storage_cnx,
-            suggestion_id,
-        )
-    finally:
-        storage_cnx.close()
 
 
 @app.route("/suggestions/<suggestion_id>", methods=["GET"])
 @secure
 def suggestion_page(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        _storage_cnx_get(), suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
-        )
-    finally:
-        storage_cnx_.close()
     if suggestion is None:
         flask.abort(404)
     staged_files, folder_path, music_tags = _suggestion_staged_files_get(suggestion_id)
     music_reviews = _suggestion_file_reviews_get(suggestion_id)
-    staged_mp3_duration_seconds = (
-        rainwave_library.models.storage.suggestion_staging_mp3_duration_get(
-            app.config["LIBRARY_ROOT"],
-            suggestion_id,
-        )
+    staged_mp3_duration_seconds = sum(
+        values.duration_seconds or 0.0 for values in music_tags.values()
     )
     return rainwave_library.components.suggestion_page(
         suggestion,
@@ -1947,35 +2222,22 @@ def suggestion_page(suggestion_id: str) -> str:
 )
 @secure
 def suggestion_schedule_release_duration(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_,
+        suggestion_id,
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_,
-            suggestion_id,
-        )
-    finally:
-        storage_cnx_.close()
     if suggestion is None:
         flask.abort(404)
 
     release_date = flask.request.args.get("release-date", "")
     release_immediately = flask.request.args.get("release-immediately") == "1"
-    staged_duration_seconds = (
-        rainwave_library.models.storage.suggestion_staging_mp3_duration_get(
-            app.config["LIBRARY_ROOT"],
-            suggestion_id,
-        )
-    )
+    staged_duration_seconds = _suggestion_staging_mp3_duration_get(suggestion_id)
     upcoming_duration_seconds = None
     if release_date and not release_immediately:
         try:
-            upcoming_duration_seconds = (
-                rainwave_library.models.storage.upcoming_music_date_mp3_duration_get(
-                    app.config["LIBRARY_ROOT"],
-                    release_date,
-                )
+            upcoming_duration_seconds = _upcoming_music_date_mp3_duration_get(
+                release_date
             )
         except ValueError:
             pass
@@ -1993,16 +2255,11 @@ def suggestion_schedule_release_duration(suggestion_id: str) -> str:
 )
 @secure
 def suggestion_schedule_release_target(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_,
+        suggestion_id,
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_,
-            suggestion_id,
-        )
-    finally:
-        storage_cnx_.close()
     if suggestion is None:
         flask.abort(404)
 
@@ -2036,16 +2293,11 @@ def suggestion_schedule_release_target(suggestion_id: str) -> str:
 @app.route("/suggestions/<suggestion_id>/schedule-release", methods=["POST"])
 @secure
 def suggestion_schedule_release(suggestion_id: str) -> werkzeug.Response | str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_,
+        suggestion_id,
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_,
-            suggestion_id,
-        )
-    finally:
-        storage_cnx_.close()
     if suggestion is None:
         flask.abort(404)
 
@@ -2053,25 +2305,17 @@ def suggestion_schedule_release(suggestion_id: str) -> werkzeug.Response | str:
     release_immediately = flask.request.form.get("release-immediately") == "1"
     channel_folder = flask.request.form.get("channel-folder", "")
     folder_path = flask.request.form.get("folder-path", "")
-    staged_duration_seconds = (
-        rainwave_library.models.storage.suggestion_staging_mp3_duration_get(
-            app.config["LIBRARY_ROOT"],
-            suggestion_id,
-        )
-    )
+    staged_duration_seconds = _suggestion_staging_mp3_duration_get(suggestion_id)
     upcoming_duration_seconds = None
     if release_date and not release_immediately:
         try:
-            upcoming_duration_seconds = (
-                rainwave_library.models.storage.upcoming_music_date_mp3_duration_get(
-                    app.config["LIBRARY_ROOT"],
-                    release_date,
-                )
+            upcoming_duration_seconds = _upcoming_music_date_mp3_duration_get(
+                release_date
             )
         except ValueError:
             pass
     try:
-        destination = rainwave_library.models.storage.suggestion_release_schedule(
+        release = rainwave_library.models.storage.suggestion_release_schedule(
             app.config["LIBRARY_ROOT"],
             suggestion_id,
             release_date,
@@ -2112,23 +2356,30 @@ def suggestion_schedule_release(suggestion_id: str) -> werkzeug.Response | str:
 
     if release_immediately:
         app.logger.info(
-            "Released suggestion %s immediately at %s",
+            "Released suggestion %s immediately at %s, copying %d files in %.1f "
+            "seconds",
             suggestion_id,
-            destination,
+            release.destination,
+            len(release.manifest),
+            release.duration_seconds,
         )
+        for path, sha256 in release.manifest:
+            app.logger.info(
+                "Released %s/%s, SHA-256 %s", release.destination, path, sha256
+            )
         redirect_url = flask.url_for("suggestion_page", suggestion_id=suggestion_id)
     else:
         app.logger.info(
             "Scheduled suggestion %s for release at %s",
             suggestion_id,
-            destination,
+            release.destination,
         )
         redirect_url = flask.url_for(
             "library_browser",
             browser_root=(
                 rainwave_library.models.storage.LibraryBrowserRoot.UPCOMING.value
             ),
-            path=destination,
+            path=release.destination,
         )
     if flask.request.headers.get("HX-Request") == "true":
         response = flask.make_response()
@@ -2137,21 +2388,19 @@ def suggestion_schedule_release(suggestion_id: str) -> werkzeug.Response | str:
     return flask.redirect(redirect_url)
 
 
-@app.route("/suggestions/<suggestion_id>/files", methods=["POST"])
-@secure
-def suggestion_files_upload(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+def _suggestion_exists_check(suggestion_id: str) -> None:
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
-        )
-    finally:
-        storage_cnx_.close()
     if suggestion is None:
         flask.abort(404)
 
+
+@app.route("/suggestions/<suggestion_id>/files", methods=["POST"])
+@secure
+def suggestion_files_upload(suggestion_id: str) -> str:
+    _suggestion_exists_check(suggestion_id)
     uploads = [
         (upload.filename or "", upload.stream)
         for upload in flask.request.files.getlist("files")
@@ -2192,61 +2441,23 @@ def suggestion_files_upload(suggestion_id: str) -> str:
     )
 
 
-@app.route("/suggestions/<suggestion_id>/files", methods=["DELETE"])
+@app.route("/suggestions/<suggestion_id>/files", methods=["GET"])
 @secure
-def suggestion_file_delete(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
-        )
-        if suggestion is None:
-            flask.abort(404)
-
-        relative_path = flask.request.args.get("path", "")
-        try:
-            deleted_path = (
-                rainwave_library.models.storage.suggestion_staging_file_delete(
-                    app.config["LIBRARY_ROOT"],
-                    suggestion_id,
-                    relative_path,
-                )
-            )
-            rainwave_library.models.suggestions.suggestion_file_review_set(
-                storage_cnx_,
-                suggestion_id,
-                deleted_path,
-                "unreviewed",
-                reviewed_by_discord_id=None,
-            )
-            result = ("alert-success", f"Deleted {deleted_path}.")
-            app.logger.info(
-                "Deleted file %s for suggestion %s",
-                deleted_path,
-                suggestion_id,
-            )
-        except ValueError as error:
-            result = ("alert-danger", str(error))
-        except OSError:
-            app.logger.exception(
-                "Could not delete file %s for suggestion %s",
-                relative_path,
-                suggestion_id,
-            )
-            result = ("alert-danger", "The file could not be deleted.")
-
-        staged_files, folder_path, music_tags = _suggestion_staged_files_get(
-            suggestion_id
-        )
-        music_reviews = rainwave_library.models.suggestions.suggestion_file_reviews_get(
-            storage_cnx_,
-            suggestion_id,
+def suggestion_files_get(suggestion_id: str) -> str:
+    """The files card after a chunked upload, reporting how it went"""
+    _suggestion_exists_check(suggestion_id)
+    uploaded = flask.request.args.get("uploaded", 0, type=int)
+    error = flask.request.args.get("error")
+    result = None
+    if error:
+        result = ("alert-danger", error)
+    elif uploaded:
+        result = (
+            "alert-success",
+            f"Uploaded {uploaded} file{'' if uploaded == 1 else 's'}.",
         )
-    finally:
-        storage_cnx_.close()
-
+    staged_files, folder_path, music_tags = _suggestion_staged_files_get(suggestion_id)
+    music_reviews = _suggestion_file_reviews_get(suggestion_id)
     return rainwave_library.components.suggestion_files_card(
         suggestion_id,
         staged_files,
@@ -2257,117 +2468,245 @@ def suggestion_file_delete(suggestion_id: str) -> str:
     )
 
 
-@app.route(
-    "/suggestions/<suggestion_id>/files/normalize",
-    methods=["GET", "POST"],
-)
+def _suggestion_upload_json(
+    upload: rainwave_library.models.storage.SuggestionStagingUpload,
+) -> dict[str, str | int]:
+    return {"id": upload.id, "offset": upload.offset, "size": upload.size}
+
+
+@app.route("/suggestions/<suggestion_id>/uploads", methods=["POST"])
 @secure
-def suggestion_files_normalize(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
+def suggestion_upload_start(suggestion_id: str) -> flask.Response:
+    _suggestion_exists_check(suggestion_id)
     try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_,
+        upload = rainwave_library.models.storage.suggestion_staging_upload_start(
+            app.config["LIBRARY_ROOT"],
             suggestion_id,
+            flask.request.form.get("name", ""),
+            flask.request.form.get("size", -1, type=int),
+            flask.request.form.get("key", ""),
         )
-        if suggestion is None:
-            flask.abort(404)
+    except ValueError as error:
+        return flask.make_response(flask.jsonify({"error": str(error)}), 400)
+    return flask.jsonify(_suggestion_upload_json(upload))
 
-        staged_files, folder_path, music_tags = _suggestion_staged_files_get(
-            suggestion_id
-        )
-        music_paths = tuple(
-            path for path, _ in staged_files if path.casefold().endswith(".mp3")
-        )
-        normalizations = rainwave_library.models.mp3.filename_normalizations_get(
-            music_paths,
-            music_tags,
+
+@app.route("/suggestions/<suggestion_id>/uploads/<upload_id>", methods=["PUT"])
+@secure
+def suggestion_upload_append(suggestion_id: str, upload_id: str) -> flask.Response:
+    offset = flask.request.args.get("offset", -1, type=int)
+    try:
+        upload = rainwave_library.models.storage.suggestion_staging_upload_append(
+            app.config["LIBRARY_ROOT"],
+            suggestion_id,
+            upload_id,
+            offset,
+            flask.request.stream,
+        )
+    except LookupError as error:
+        (upload,) = error.args
+        return flask.make_response(
+            flask.jsonify(
+                {
+                    "error": "Resume from the offset given.",
+                    **_suggestion_upload_json(upload),
+                }
+            ),
+            409,
         )
-        if flask.request.method == "GET":
-            return rainwave_library.components.suggestion_normalize_filenames_form(
-                suggestion_id,
-                normalizations,
-            )
+    except ValueError as error:
+        return flask.make_response(flask.jsonify({"error": str(error)}), 400)
+    return flask.jsonify(_suggestion_upload_json(upload))
 
-        if any(item.error is not None for item in normalizations):
-            result = (
-                "alert-danger",
-                "Resolve the filename normalization errors before trying again.",
+
+@app.route("/suggestions/<suggestion_id>/uploads/<upload_id>/finish", methods=["POST"])
+@secure
+def suggestion_upload_finish(suggestion_id: str, upload_id: str) -> flask.Response:
+    try:
+        filename, sha256 = (
+            rainwave_library.models.storage.suggestion_staging_upload_finish(
+                app.config["LIBRARY_ROOT"],
+                suggestion_id,
+                upload_id,
+                flask.request.form.get("sha256") or None,
             )
+        )
+    except ValueError as error:
+        return flask.make_response(flask.jsonify({"error": str(error)}), 400)
+    app.logger.info("Uploaded %s for suggestion %s", filename, suggestion_id)
+    return flask.jsonify({"filename": filename, "sha256": sha256})
+
+
+@app.route("/suggestions/<suggestion_id>/uploads/<upload_id>", methods=["DELETE"])
+@secure
+def suggestion_upload_cancel(suggestion_id: str, upload_id: str) -> flask.Response:
+    try:
+        rainwave_library.models.storage.suggestion_staging_upload_cancel(
+            app.config["LIBRARY_ROOT"], suggestion_id, upload_id
+        )
+    except ValueError as error:
+        return flask.make_response(flask.jsonify({"error": str(error)}), 400)
+    return flask.make_response("", 204)
+
+
+@app.route("/suggestions/<suggestion_id>/files", methods=["DELETE"])
+@secure
+def suggestion_file_delete(suggestion_id: str) -> str:
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
+    )
+    if suggestion is None:
+        flask.abort(404)
+
+    relative_path = flask.request.args.get("path", "")
+    try:
+        deleted_path = rainwave_library.models.storage.suggestion_staging_file_delete(
+            app.config["LIBRARY_ROOT"],
+            suggestion_id,
+            relative_path,
+        )
+        rainwave_library.models.suggestions.suggestion_file_review_set(
+            storage_cnx_,
+            suggestion_id,
+            deleted_path,
+            "unreviewed",
+            reviewed_by_discord_id=None,
+        )
+        result = ("alert-success", f"Deleted {deleted_path}.")
+        app.logger.info(
+            "Deleted file %s for suggestion %s",
+            deleted_path,
+            suggestion_id,
+        )
+    except ValueError as error:
+        result = ("alert-danger", str(error))
+    except OSError:
+        app.logger.exception(
+            "Could not delete file %s for suggestion %s",
+            relative_path,
+            suggestion_id,
+        )
+        result = ("alert-danger", "The file could not be deleted.")
+
+    staged_files, folder_path, music_tags = _suggestion_staged_files_get(suggestion_id)
+    music_reviews = rainwave_library.models.suggestions.suggestion_file_reviews_get(
+        storage_cnx_,
+        suggestion_id,
+    )
+
+    return rainwave_library.components.suggestion_files_card(
+        suggestion_id,
+        staged_files,
+        result,
+        folder_path=str(folder_path),
+        music_tags=music_tags,
+        music_reviews=music_reviews,
+    )
+
+
+@app.route(
+    "/suggestions/<suggestion_id>/files/normalize",
+    methods=["GET", "POST"],
+)
+@secure
+def suggestion_files_normalize(suggestion_id: str) -> str:
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_,
+        suggestion_id,
+    )
+    if suggestion is None:
+        flask.abort(404)
+
+    staged_files, folder_path, music_tags = _suggestion_staged_files_get(suggestion_id)
+    music_paths = tuple(
+        path for path, _ in staged_files if path.casefold().endswith(".mp3")
+    )
+    normalizations = rainwave_library.models.mp3.filename_normalizations_get(
+        music_paths,
+        music_tags,
+    )
+    if flask.request.method == "GET":
+        return rainwave_library.components.suggestion_normalize_filenames_form(
+            suggestion_id,
+            normalizations,
+        )
+
+    if any(item.error is not None for item in normalizations):
+        result = (
+            "alert-danger",
+            "Resolve the filename normalization errors before trying again.",
+        )
+    else:
+        requested_renames = {
+            item.source_path: item.target_path
+            for item in normalizations
+            if item.changed and item.target_path is not None
+        }
+        if not requested_renames:
+            result = ("alert-info", "All MP3 filenames are already normalized.")
         else:
-            requested_renames = {
-                item.source_path: item.target_path
-                for item in normalizations
-                if item.changed and item.target_path is not None
-            }
-            if not requested_renames:
-                result = ("alert-info", "All MP3 filenames are already normalized.")
-            else:
+            try:
+                completed_renames = (
+                    rainwave_library.models.storage.suggestion_staging_files_rename(
+                        app.config["LIBRARY_ROOT"],
+                        suggestion_id,
+                        requested_renames,
+                    )
+                )
                 try:
-                    completed_renames = (
+                    rainwave_library.models.suggestions.suggestion_file_review_paths_rename(
+                        storage_cnx_,
+                        suggestion_id,
+                        dict(completed_renames),
+                    )
+                except Exception:
+                    try:
                         rainwave_library.models.storage.suggestion_staging_files_rename(
                             app.config["LIBRARY_ROOT"],
                             suggestion_id,
-                            requested_renames,
+                            {
+                                target_path: source_path
+                                for source_path, target_path in completed_renames
+                            },
                         )
-                    )
-                    try:
-                        rainwave_library.models.suggestions.suggestion_file_review_paths_rename(
-                            storage_cnx_,
+                    except (OSError, ValueError):
+                        app.logger.exception(
+                            "Could not roll back normalized filenames for "
+                            "suggestion %s",
                             suggestion_id,
-                            dict(completed_renames),
                         )
-                    except Exception:
-                        try:
-                            rainwave_library.models.storage.suggestion_staging_files_rename(
-                                app.config["LIBRARY_ROOT"],
-                                suggestion_id,
-                                {
-                                    target_path: source_path
-                                    for source_path, target_path in completed_renames
-                                },
-                            )
-                        except (OSError, ValueError):
-                            app.logger.exception(
-                                "Could not roll back normalized filenames for "
-                                "suggestion %s",
-                                suggestion_id,
-                            )
-                        raise
-                except ValueError as error:
-                    result = ("alert-danger", str(error))
-                except OSError:
-                    app.logger.exception(
-                        "Could not normalize filenames for suggestion %s",
-                        suggestion_id,
-                    )
-                    result = (
-                        "alert-danger",
-                        "The MP3 filenames could not be normalized.",
-                    )
-                else:
-                    renamed_count = len(completed_renames)
-                    result = (
-                        "alert-success",
-                        f"Normalized {renamed_count} MP3 filename"
-                        f"{'' if renamed_count == 1 else 's'}.",
-                    )
-                    app.logger.info(
-                        "Normalized %d MP3 filenames for suggestion %s",
-                        renamed_count,
-                        suggestion_id,
-                    )
+                    raise
+            except ValueError as error:
+                result = ("alert-danger", str(error))
+            except OSError:
+                app.logger.exception(
+                    "Could not normalize filenames for suggestion %s",
+                    suggestion_id,
+                )
+                result = (
+                    "alert-danger",
+                    "The MP3 filenames could not be normalized.",
+                )
+            else:
+                renamed_count = len(completed_renames)
+                result = (
+                    "alert-success",
+                    f"Normalized {renamed_count} MP3 filename"
+                    f"{'' if renamed_count == 1 else 's'}.",
+                )
+                app.logger.info(
+                    "Normalized %d MP3 filenames for suggestion %s",
+                    renamed_count,
+                    suggestion_id,
+                )
 
-        staged_files, folder_path, music_tags = _suggestion_staged_files_get(
-            suggestion_id
-        )
-        music_reviews = rainwave_library.models.suggestions.suggestion_file_reviews_get(
-            storage_cnx_,
-            suggestion_id,
-        )
-    finally:
-        storage_cnx_.close()
+    staged_files, folder_path, music_tags = _suggestion_staged_files_get(suggestion_id)
+    music_reviews = rainwave_library.models.suggestions.suggestion_file_reviews_get(
+        storage_cnx_,
+        suggestion_id,
+    )
 
     return rainwave_library.components.suggestion_files_card(
         suggestion_id,
@@ -2384,9 +2723,7 @@ def suggestion_files_normalize(suggestion_id: str) -> str:
 def suggestion_file_review(suggestion_id: str) -> str:
     relative_path, _ = _suggestion_staged_file_get(suggestion_id, {".mp3"})
     decision = flask.request.form.get("decision", "")
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
+    storage_cnx_ = _storage_cnx_get()
     try:
         rainwave_library.models.suggestions.suggestion_file_review_set(
             storage_cnx_,
@@ -2403,8 +2740,6 @@ def suggestion_file_review(suggestion_id: str) -> str:
         ).get(relative_path)
     except ValueError as error:
         flask.abort(400, str(error))
-    finally:
-        storage_cnx_.close()
     return rainwave_library.components.suggestion_music_review_controls(
         suggestion_id,
         relative_path,
@@ -2415,15 +2750,10 @@ def suggestion_file_review(suggestion_id: str) -> str:
 @app.route("/suggestions/<suggestion_id>/files/tags", methods=["POST"])
 @secure
 def suggestion_file_tags_update(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
-        )
-    finally:
-        storage_cnx_.close()
     if suggestion is None:
         flask.abort(404)
 
@@ -2443,10 +2773,13 @@ def suggestion_file_tags_update(suggestion_id: str) -> str:
                     suggestion_id,
                     relative_path,
                 )
-                rainwave_library.models.mp3.id3_tag_values_set_all(
-                    file_path,
-                    tag_values,
-                )
+                try:
+                    rainwave_library.models.mp3.id3_tag_values_set_all(
+                        file_path,
+                        tag_values,
+                    )
+                finally:
+                    _mp3_metadata_invalidate([file_path])
                 result = (
                     "alert-success",
                     f"Updated tags for {relative_path}.",
@@ -2460,38 +2793,26 @@ def suggestion_file_tags_update(suggestion_id: str) -> str:
         if tag_label is None:
             result = ("alert-danger", "Choose a valid ID3 tag.")
         elif scope == "all":
-            staged_files = rainwave_library.models.storage.suggestion_staging_files_get(
-                app.config["LIBRARY_ROOT"],
-                suggestion_id,
+            music_files = (
+                rainwave_library.models.storage.suggestion_staging_mp3_files_get(
+                    app.config["LIBRARY_ROOT"],
+                    suggestion_id,
+                )
             )
-            music_paths = [
-                path for path, _ in staged_files if path.casefold().endswith(".mp3")
-            ]
-            updated_count = 0
-            failed_count = 0
-            for path in music_paths:
-                try:
-                    file_path = (
-                        rainwave_library.models.storage.suggestion_staging_file_get(
-                            app.config["LIBRARY_ROOT"],
-                            suggestion_id,
-                            path,
-                        )
-                    )
-                    rainwave_library.models.mp3.id3_tag_values_set(
-                        file_path,
-                        tag_name,
-                        value,
-                    )
-                    updated_count += 1
-                except (OSError, ValueError):
-                    failed_count += 1
-                    app.logger.exception(
-                        "Could not update %s for suggestion file %s",
-                        tag_name,
-                        path,
-                    )
-            if not music_paths:
+            batch = rainwave_library.models.mp3.id3_tag_values_set_many(
+                {file_path: {tag_name: value} for file_path in music_files.values()}
+            )
+            storage_cnx = _storage_cnx_get()
+            # The files card reads these back from the cache
+            rainwave_library.models.storage.mp3_metadata_put_many(
+                storage_cnx, batch.metadata
+            )
+            rainwave_library.models.storage.mp3_metadata_delete(
+                storage_cnx, batch.errors
+            )
+            updated_count = len(batch.written) + len(batch.unchanged)
+            failed_count = len(batch.errors)
+            if not music_files:
                 result = ("alert-danger", "There are no MP3 files to update.")
             elif failed_count:
                 result = (
@@ -2519,11 +2840,14 @@ def suggestion_file_tags_update(suggestion_id: str) -> str:
                             relative_path,
                         )
                     )
-                    rainwave_library.models.mp3.id3_tag_values_set(
-                        file_path,
-                        tag_name,
-                        value,
-                    )
+                    try:
+                        rainwave_library.models.mp3.id3_tag_values_set(
+                            file_path,
+                            tag_name,
+                            value,
+                        )
+                    finally:
+                        _mp3_metadata_invalidate([file_path])
                     result = (
                         "alert-success",
                         f"Updated {tag_label} for {relative_path}.",
@@ -2554,15 +2878,10 @@ def _suggestion_staged_file_get(
     if extension not in allowed_extensions:
         flask.abort(404)
 
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
-        )
-    finally:
-        storage_cnx_.close()
     if suggestion is None:
         flask.abort(404)
 
@@ -2577,6 +2896,25 @@ def _suggestion_staged_file_get(
     return relative_path, file_path
 
 
+@app.route("/suggestions/<suggestion_id>/files/duplicates", methods=["GET"])
+@secure
+def suggestion_file_duplicates(suggestion_id: str) -> str:
+    staged_mp3s = rainwave_library.models.storage.suggestion_staging_mp3_files_get(
+        app.config["LIBRARY_ROOT"], suggestion_id
+    )
+    storage_cnx = _storage_cnx_get()
+    duplicates = rainwave_library.models.audio_index.audio_duplicates_get(
+        storage_cnx, staged_mp3s.values()
+    )
+    return rainwave_library.components.suggestion_file_duplicates(
+        {
+            relative_path: duplicates[path]
+            for relative_path, path in staged_mp3s.items()
+            if path in duplicates
+        }
+    )
+
+
 @app.route("/suggestions/<suggestion_id>/files/preview", methods=["GET"])
 @secure
 def suggestion_file_preview(suggestion_id: str) -> flask.Response:
@@ -2625,27 +2963,16 @@ def suggestion_file_play(suggestion_id: str) -> str:
 @secure
 def suggestion_file_stream(suggestion_id: str) -> flask.Response:
     _, audio_path = _suggestion_staged_file_get(suggestion_id, {".mp3"})
-    response = flask.send_file(
-        audio_path,
-        conditional=True,
-        mimetype="audio/mpeg",
-    )
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    return response
+    return _audio_file_send(audio_path)
 
 
 @app.route("/suggestions/<suggestion_id>/details", methods=["GET"])
 @signed_in
 def suggestion_details(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
-        )
-    finally:
-        storage_cnx_.close()
     if suggestion is None:
         flask.abort(404)
     editable = (
@@ -2661,57 +2988,52 @@ def suggestion_details(suggestion_id: str) -> str:
 @signed_in
 def suggestion_description(suggestion_id: str) -> str:
     requester_discord_id = str(flask.g.discord_id or "")
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
+    if suggestion is None:
+        flask.abort(404)
+    if (
+        not requester_discord_id
+        or suggestion.requester_discord_id != requester_discord_id
+    ):
+        flask.abort(403)
+    if suggestion.status not in (
+        rainwave_library.models.suggestions.Suggestion.owner_editable_statuses
+    ):
+        flask.abort(
+            409,
+            "Only new or claimed suggestions can be edited by their owner.",
         )
-        if suggestion is None:
-            flask.abort(404)
-        if (
-            not requester_discord_id
-            or suggestion.requester_discord_id != requester_discord_id
-        ):
-            flask.abort(403)
-        if suggestion.status not in (
-            rainwave_library.models.suggestions.Suggestion.owner_editable_statuses
-        ):
-            flask.abort(
-                409,
-                "Only new or claimed suggestions can be edited by their owner.",
-            )
 
-        if flask.request.method == "GET":
-            if "close" in flask.request.args:
-                return rainwave_library.components.suggestion_description_block(
-                    suggestion, editable=True
-                )
-            return rainwave_library.components.suggestion_description_form(suggestion)
-
-        description = flask.request.form.get("description", "")
-        try:
-            updated = rainwave_library.models.suggestions.suggestion_description_update(
-                storage_cnx_,
-                suggestion_id,
-                requester_discord_id=requester_discord_id,
-                description=description,
-                actor_name=flask.g.discord_display_name,
-            )
-        except ValueError as error:
-            return rainwave_library.components.suggestion_description_form(
-                suggestion,
-                description=description,
-                error=str(error),
+    if flask.request.method == "GET":
+        if "close" in flask.request.args:
+            return rainwave_library.components.suggestion_description_block(
+                suggestion, editable=True
             )
-        if not updated:
-            flask.abort(403)
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
+        return rainwave_library.components.suggestion_description_form(suggestion)
+
+    description = flask.request.form.get("description", "")
+    try:
+        updated = rainwave_library.models.suggestions.suggestion_description_update(
+            storage_cnx_,
+            suggestion_id,
+            requester_discord_id=requester_discord_id,
+            description=description,
+            actor_name=flask.g.discord_display_name,
         )
-    finally:
-        storage_cnx_.close()
+    except ValueError as error:
+        return rainwave_library.components.suggestion_description_form(
+            suggestion,
+            description=description,
+            error=str(error),
+        )
+    if not updated:
+        flask.abort(403)
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
+    )
 
     if suggestion is None:
         flask.abort(404)
@@ -2723,15 +3045,10 @@ def suggestion_description(suggestion_id: str) -> str:
 @app.route("/suggestions/<suggestion_id>/activity", methods=["GET"])
 @signed_in
 def suggestion_activity(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
-        )
-    finally:
-        storage_cnx_.close()
 
     if suggestion is None:
         flask.abort(404)
@@ -2744,49 +3061,42 @@ def suggestion_activity(suggestion_id: str) -> str:
 @app.route("/suggestions/<suggestion_id>/comment", methods=["GET", "POST"])
 @signed_in
 def suggestion_comment(suggestion_id: str) -> werkzeug.Response | str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
     )
+    if suggestion is None:
+        flask.abort(404)
+    if suggestion.status not in (
+        rainwave_library.models.suggestions.Suggestion.open_statuses
+    ):
+        flask.abort(409, "Comments can only be added to open suggestions.")
+    if flask.request.method == "GET":
+        return rainwave_library.components.suggestion_comment_form(suggestion)
+
+    body = flask.request.form.get("body", "")
     try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
+        added = rainwave_library.models.suggestions.suggestion_comment_add(
+            storage_cnx_,
+            suggestion_id,
+            actor_name=flask.g.discord_display_name,
+            actor_discord_id=(str(flask.g.discord_id) if flask.g.discord_id else None),
+            body=body,
         )
-        if suggestion is None:
-            flask.abort(404)
-        if suggestion.status not in (
-            rainwave_library.models.suggestions.Suggestion.open_statuses
-        ):
-            flask.abort(409, "Comments can only be added to open suggestions.")
-        if flask.request.method == "GET":
-            return rainwave_library.components.suggestion_comment_form(suggestion)
-
-        body = flask.request.form.get("body", "")
-        try:
-            added = rainwave_library.models.suggestions.suggestion_comment_add(
-                storage_cnx_,
-                suggestion_id,
-                actor_name=flask.g.discord_display_name,
-                actor_discord_id=(
-                    str(flask.g.discord_id) if flask.g.discord_id else None
-                ),
-                body=body,
-            )
-        except ValueError as error:
-            response = flask.make_response(
-                rainwave_library.components.suggestion_comment_form(
-                    suggestion, body=body, error=str(error)
-                )
+    except ValueError as error:
+        response = flask.make_response(
+            rainwave_library.components.suggestion_comment_form(
+                suggestion, body=body, error=str(error)
             )
-            response.headers["HX-Retarget"] = "#modal-lg-content"
-            response.headers["HX-Reswap"] = "outerHTML"
-            return response
-        if not added:
-            flask.abort(409, "Comments can only be added to open suggestions.")
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
         )
-    finally:
-        storage_cnx_.close()
+        response.headers["HX-Retarget"] = "#modal-lg-content"
+        response.headers["HX-Reswap"] = "outerHTML"
+        return response
+    if not added:
+        flask.abort(409, "Comments can only be added to open suggestions.")
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
+    )
 
     if suggestion is None:
         flask.abort(404)
@@ -2798,61 +3108,56 @@ def suggestion_comment(suggestion_id: str) -> werkzeug.Response | str:
 def suggestion_link(suggestion_id: str) -> werkzeug.Response | str:
     requester_discord_id = str(flask.g.discord_id or "")
     is_staff = flask.session.get("role") == "staff"
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx_ = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
+    if suggestion is None:
+        flask.abort(404)
+    if not is_staff and (
+        not requester_discord_id
+        or suggestion.requester_discord_id != requester_discord_id
+    ):
+        flask.abort(403)
+    if not is_staff and suggestion.status not in (
+        rainwave_library.models.suggestions.Suggestion.owner_editable_statuses
+    ):
+        flask.abort(
+            409,
+            "Links can only be added while a suggestion is new or claimed.",
         )
-        if suggestion is None:
-            flask.abort(404)
-        if not is_staff and (
-            not requester_discord_id
-            or suggestion.requester_discord_id != requester_discord_id
-        ):
-            flask.abort(403)
-        if not is_staff and suggestion.status not in (
-            rainwave_library.models.suggestions.Suggestion.owner_editable_statuses
-        ):
-            flask.abort(
-                409,
-                "Links can only be added while a suggestion is new or claimed.",
-            )
 
-        if flask.request.method == "GET":
-            if "close" in flask.request.args:
-                return rainwave_library.components.suggestion_link_button(suggestion_id)
-            return rainwave_library.components.suggestion_link_form(suggestion_id)
+    if flask.request.method == "GET":
+        if "close" in flask.request.args:
+            return rainwave_library.components.suggestion_link_button(suggestion_id)
+        return rainwave_library.components.suggestion_link_form(suggestion_id)
 
-        url = flask.request.form.get("url", "")
-        label = flask.request.form.get("label", "")
-        try:
-            added = rainwave_library.models.suggestions.suggestion_link_add(
-                storage_cnx_,
-                suggestion_id,
-                url=url,
-                label=label,
-                actor_name=flask.g.discord_display_name,
-                actor_discord_id=requester_discord_id,
-                is_staff=is_staff,
-            )
-        except ValueError as error:
-            response = flask.make_response(
-                rainwave_library.components.suggestion_link_form(
-                    suggestion_id, url=url, label=label, error=str(error)
-                )
+    url = flask.request.form.get("url", "")
+    label = flask.request.form.get("label", "")
+    try:
+        added = rainwave_library.models.suggestions.suggestion_link_add(
+            storage_cnx_,
+            suggestion_id,
+            url=url,
+            label=label,
+            actor_name=flask.g.discord_display_name,
+            actor_discord_id=requester_discord_id,
+            is_staff=is_staff,
+        )
+    except ValueError as error:
+        response = flask.make_response(
+            rainwave_library.components.suggestion_link_form(
+                suggestion_id, url=url, label=label, error=str(error)
             )
-            response.headers["HX-Retarget"] = f"#suggestion-add-link-{suggestion_id}"
-            response.headers["HX-Reswap"] = "innerHTML"
-            return response
-        if not added:
-            flask.abort(403)
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx_, suggestion_id
         )
-    finally:
-        storage_cnx_.close()
+        response.headers["HX-Retarget"] = f"#suggestion-add-link-{suggestion_id}"
+        response.headers["HX-Reswap"] = "innerHTML"
+        return response
+    if not added:
+        flask.abort(403)
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx_, suggestion_id
+    )
 
     if suggestion is None:
         flask.abort(404)
@@ -2867,40 +3172,35 @@ def suggestion_link(suggestion_id: str) -> werkzeug.Response | str:
 def suggestion_link_delete(suggestion_id: str, link_id: str) -> str:
     actor_discord_id = str(flask.g.discord_id or "")
     is_staff = flask.session.get("role") == "staff"
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx, suggestion_id
-        )
-        if suggestion is None:
-            flask.abort(404)
-        is_owner = bool(actor_discord_id) and (
-            suggestion.requester_discord_id == actor_discord_id
-        )
-        if not is_owner and not is_staff:
-            flask.abort(403)
-        if not is_staff and suggestion.status not in (
-            rainwave_library.models.suggestions.Suggestion.owner_editable_statuses
-        ):
-            flask.abort(
-                409,
-                "Links can only be deleted while a suggestion is new or claimed.",
-            )
-        if not any(link.id == link_id for link in suggestion.links):
-            flask.abort(404)
+    if suggestion is None:
+        flask.abort(404)
+    is_owner = bool(actor_discord_id) and (
+        suggestion.requester_discord_id == actor_discord_id
+    )
+    if not is_owner and not is_staff:
+        flask.abort(403)
+    if not is_staff and suggestion.status not in (
+        rainwave_library.models.suggestions.Suggestion.owner_editable_statuses
+    ):
+        flask.abort(
+            409,
+            "Links can only be deleted while a suggestion is new or claimed.",
+        )
+    if not any(link.id == link_id for link in suggestion.links):
+        flask.abort(404)
 
-        deleted = rainwave_library.models.suggestions.suggestion_link_delete(
-            storage_cnx,
-            suggestion_id,
-            link_id,
-            actor_name=flask.g.discord_display_name,
-            actor_discord_id=actor_discord_id,
-            is_staff=is_staff,
-        )
-    finally:
-        storage_cnx.close()
+    deleted = rainwave_library.models.suggestions.suggestion_link_delete(
+        storage_cnx,
+        suggestion_id,
+        link_id,
+        actor_name=flask.g.discord_display_name,
+        actor_discord_id=actor_discord_id,
+        is_staff=is_staff,
+    )
 
     if not deleted:
         flask.abort(404)
@@ -2910,9 +3210,7 @@ def suggestion_link_delete(suggestion_id: str, link_id: str) -> str:
 @app.route("/suggestions/<suggestion_id>/claim", methods=["POST"])
 @secure
 def suggestion_claim(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
+    storage_cnx_ = _storage_cnx_get()
     try:
         claimed = rainwave_library.models.suggestions.suggestion_claim(
             storage_cnx_,
@@ -2925,8 +3223,6 @@ def suggestion_claim(suggestion_id: str) -> str:
         )
     except ValueError as error:
         flask.abort(400, str(error))
-    finally:
-        storage_cnx_.close()
 
     if suggestion is None:
         flask.abort(404)
@@ -2938,9 +3234,7 @@ def suggestion_claim(suggestion_id: str) -> str:
 @app.route("/suggestions/<suggestion_id>/release", methods=["POST"])
 @signed_in
 def suggestion_release(suggestion_id: str) -> str:
-    storage_cnx_ = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
-    )
+    storage_cnx_ = _storage_cnx_get()
     try:
         released = rainwave_library.models.suggestions.suggestion_release(
             storage_cnx_,
@@ -2953,8 +3247,6 @@ def suggestion_release(suggestion_id: str) -> str:
         )
     except ValueError as error:
         flask.abort(400, str(error))
-    finally:
-        storage_cnx_.close()
 
     if suggestion is None:
         flask.abort(404)
@@ -2966,38 +3258,33 @@ def suggestion_release(suggestion_id: str) -> str:
 @app.route("/suggestions/<suggestion_id>/decline", methods=["GET", "POST"])
 @secure
 def suggestion_decline(suggestion_id: str) -> werkzeug.Response | str:
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx, suggestion_id
-        )
-        if suggestion is None:
-            flask.abort(404)
-        if suggestion.status not in ("new", "claimed"):
-            flask.abort(409, "Only new or claimed suggestions can be declined.")
-        if flask.request.method == "GET":
-            return rainwave_library.components.suggestion_decline_form(suggestion)
+    if suggestion is None:
+        flask.abort(404)
+    if suggestion.status not in ("new", "claimed"):
+        flask.abort(409, "Only new or claimed suggestions can be declined.")
+    if flask.request.method == "GET":
+        return rainwave_library.components.suggestion_decline_form(suggestion)
 
-        comment = flask.request.form.get("comment", "")
-        send_discord_notification = (
-            flask.request.form.get("send-discord-notification") == "1"
-        )
-        declined = rainwave_library.models.suggestions.suggestion_decline(
-            storage_cnx,
-            suggestion_id,
-            actor_name=flask.g.discord_display_name,
-            actor_discord_id=(str(flask.g.discord_id) if flask.g.discord_id else None),
-            comment=comment,
-        )
-        if not declined:
-            flask.abort(409, "This suggestion is no longer available to decline.")
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx, suggestion_id
-        )
-    finally:
-        storage_cnx.close()
+    comment = flask.request.form.get("comment", "")
+    send_discord_notification = (
+        flask.request.form.get("send-discord-notification") == "1"
+    )
+    declined = rainwave_library.models.suggestions.suggestion_decline(
+        storage_cnx,
+        suggestion_id,
+        actor_name=flask.g.discord_display_name,
+        actor_discord_id=(str(flask.g.discord_id) if flask.g.discord_id else None),
+        comment=comment,
+    )
+    if not declined:
+        flask.abort(409, "This suggestion is no longer available to decline.")
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx, suggestion_id
+    )
 
     if suggestion is None:
         flask.abort(404)
@@ -3018,38 +3305,33 @@ def suggestion_decline(suggestion_id: str) -> werkzeug.Response | str:
 @app.route("/suggestions/<suggestion_id>/accept", methods=["GET", "POST"])
 @secure
 def suggestion_accept(suggestion_id: str) -> werkzeug.Response | str:
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx, suggestion_id
-        )
-        if suggestion is None:
-            flask.abort(404)
-        if suggestion.status not in ("new", "claimed"):
-            flask.abort(409, "Only new or claimed suggestions can be accepted.")
-        if flask.request.method == "GET":
-            return rainwave_library.components.suggestion_accept_form(suggestion)
+    if suggestion is None:
+        flask.abort(404)
+    if suggestion.status not in ("new", "claimed"):
+        flask.abort(409, "Only new or claimed suggestions can be accepted.")
+    if flask.request.method == "GET":
+        return rainwave_library.components.suggestion_accept_form(suggestion)
 
-        comment = flask.request.form.get("comment", "")
-        send_discord_notification = (
-            flask.request.form.get("send-discord-notification") == "1"
-        )
-        accepted = rainwave_library.models.suggestions.suggestion_accept(
-            storage_cnx,
-            suggestion_id,
-            actor_name=flask.g.discord_display_name,
-            actor_discord_id=(str(flask.g.discord_id) if flask.g.discord_id else None),
-            comment=comment,
-        )
-        if not accepted:
-            flask.abort(409, "This suggestion is no longer available to accept.")
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx, suggestion_id
-        )
-    finally:
-        storage_cnx.close()
+    comment = flask.request.form.get("comment", "")
+    send_discord_notification = (
+        flask.request.form.get("send-discord-notification") == "1"
+    )
+    accepted = rainwave_library.models.suggestions.suggestion_accept(
+        storage_cnx,
+        suggestion_id,
+        actor_name=flask.g.discord_display_name,
+        actor_discord_id=(str(flask.g.discord_id) if flask.g.discord_id else None),
+        comment=comment,
+    )
+    if not accepted:
+        flask.abort(409, "This suggestion is no longer available to accept.")
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx, suggestion_id
+    )
 
     if suggestion is None:
         flask.abort(404)
@@ -3085,61 +3367,49 @@ def suggestion_update(suggestion_id: str) -> str:
         ]
         primary_channel = flask.request.form.get("primary-channel", "")
         primary_channel_id = int(primary_channel) if primary_channel.isdigit() else None
-        storage_cnx = rainwave_library.models.storage.connection_get(
-            app.config["STORAGE_CNX"]
+        storage_cnx = _storage_cnx_get()
+        previous_suggestion = rainwave_library.models.suggestions.suggestion_get(
+            storage_cnx, suggestion_id
+        )
+        if previous_suggestion is None:
+            flask.abort(404)
+        updated = rainwave_library.models.suggestions.suggestion_update(
+            storage_cnx,
+            suggestion_id,
+            title=flask.request.form.get("title", ""),
+            kind=flask.request.form.get("kind", ""),
+            status=flask.request.form.get("status", ""),
+            description=flask.request.form.get("description", ""),
+            requester_name=optional_value("requester-name"),
+            requester_discord_id=optional_value("requester-discord-id"),
+            requested_at=optional_value("requested-at"),
+            channel_ids=channel_ids,
+            primary_channel_id=primary_channel_id,
+            actor_name=flask.g.discord_display_name,
+            actor_discord_id=(str(flask.g.discord_id) if flask.g.discord_id else None),
+        )
+        if not updated:
+            flask.abort(404)
+        suggestion = rainwave_library.models.suggestions.suggestion_get(
+            storage_cnx, suggestion_id
+        )
+        accepted = (
+            suggestion is not None
+            and previous_suggestion.status != "accepted"
+            and suggestion.status == "accepted"
+        )
+        declined = (
+            suggestion is not None
+            and previous_suggestion.status != "declined"
+            and suggestion.status == "declined"
         )
-        try:
-            previous_suggestion = rainwave_library.models.suggestions.suggestion_get(
-                storage_cnx, suggestion_id
-            )
-            if previous_suggestion is None:
-                flask.abort(404)
-            updated = rainwave_library.models.suggestions.suggestion_update(
-                storage_cnx,
-                suggestion_id,
-                title=flask.request.form.get("title", ""),
-                kind=flask.request.form.get("kind", ""),
-                status=flask.request.form.get("status", ""),
-                description=flask.request.form.get("description", ""),
-                requester_name=optional_value("requester-name"),
-                requester_discord_id=optional_value("requester-discord-id"),
-                requested_at=optional_value("requested-at"),
-                channel_ids=channel_ids,
-                primary_channel_id=primary_channel_id,
-                actor_name=flask.g.discord_display_name,
-                actor_discord_id=(
-                    str(flask.g.discord_id) if flask.g.discord_id else None
-                ),
-            )
-            if not updated:
-                flask.abort(404)
-            suggestion = rainwave_library.models.suggestions.suggestion_get(
-                storage_cnx, suggestion_id
-            )
-            accepted = (
-                suggestion is not None
-                and previous_suggestion.status != "accepted"
-                and suggestion.status == "accepted"
-            )
-            declined = (
-                suggestion is not None
-                and previous_suggestion.status != "declined"
-                and suggestion.status == "declined"
-            )
-        finally:
-            storage_cnx.close()
         result = ("alert-success", "Suggestion updated.")
     except ValueError as error:
         result = ("alert-danger", str(error))
-        storage_cnx = rainwave_library.models.storage.connection_get(
-            app.config["STORAGE_CNX"]
+        storage_cnx = _storage_cnx_get()
+        suggestion = rainwave_library.models.suggestions.suggestion_get(
+            storage_cnx, suggestion_id
         )
-        try:
-            suggestion = rainwave_library.models.suggestions.suggestion_get(
-                storage_cnx, suggestion_id
-            )
-        finally:
-            storage_cnx.close()
 
     if suggestion is None:
         flask.abort(404)
@@ -3155,15 +3425,10 @@ def suggestion_update(suggestion_id: str) -> str:
 @app.route("/suggestions/<suggestion_id>", methods=["DELETE"])
 @secure
 def suggestion_delete(suggestion_id: str) -> str:
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx = _storage_cnx_get()
+    deleted = rainwave_library.models.suggestions.suggestion_delete(
+        storage_cnx, suggestion_id
     )
-    try:
-        deleted = rainwave_library.models.suggestions.suggestion_delete(
-            storage_cnx, suggestion_id
-        )
-    finally:
-        storage_cnx.close()
 
     if not deleted:
         flask.abort(404)
@@ -3173,15 +3438,10 @@ def suggestion_delete(suggestion_id: str) -> str:
 @app.route("/suggestions/<suggestion_id>/row", methods=["GET"])
 @signed_in
 def suggestion_row(suggestion_id: str) -> str:
-    storage_cnx = rainwave_library.models.storage.connection_get(
-        app.config["STORAGE_CNX"]
+    storage_cnx = _storage_cnx_get()
+    suggestion = rainwave_library.models.suggestions.suggestion_get(
+        storage_cnx, suggestion_id
     )
-    try:
-        suggestion = rainwave_library.models.suggestions.suggestion_get(
-            storage_cnx, suggestion_id
-        )
-    finally:
-        storage_cnx.close()
     if suggestion is None:
         flask.abort(404)
     return rainwave_library.components.suggestion_row(suggestion)
@@ -3223,11 +3483,12 @@ def songs() -> str:
 def songs_detail(song_id: int) -> str:
     db = app.config["RAINWAVE_DATABASE"]
     song = rainwave_library.models.rainwave.get_song(db, song_id)
-    file_info = (
-        rainwave_library.models.mp3.mp3_file_info_get(song.filename)
-        if song.verified
-        else None
-    )
+    file_info = None
+    if song.verified:
+        storage_cnx = _storage_cnx_get()
+        _, file_info = rainwave_library.models.storage.mp3_metadata_get(
+            storage_cnx, song.filename
+        )
     return rainwave_library.components.songs_detail(
         song,
         file_size_bytes=file_info.file_size_bytes if file_info else None,
@@ -3311,7 +3572,7 @@ def songs_download(song_id: int) -> flask.Response:
     song = rainwave_library.models.rainwave.get_song(db, song_id)
     if not song.verified:
         flask.abort(404)
-    return flask.send_file(song.filename, as_attachment=True)
+    return _audio_file_send(song.filename, as_attachment=True)
 
 
 @app.route("/songs/<int:song_id>/edit", methods=["GET", "POST"])
@@ -3331,6 +3592,7 @@ def songs_edit(song_id: int) -> str:
         "url": flask.request.values["url"],
     }
     result = rainwave_library.models.mp3.set_tags(song.filename, **kwargs)
+    _mp3_metadata_invalidate([song.filename])
     if result:
         edit_result = result
         alert_class = "alert-danger"
@@ -3392,7 +3654,7 @@ def stream_song(song_id: int) -> flask.Response:
     song = rainwave_library.models.rainwave.get_song(db, song_id)
     if not song.verified:
         flask.abort(404)
-    return flask.send_file(song.filename)
+    return _audio_file_send(song.filename)
 
 
 @app.route("/songs/rows", methods=["POST"])
@@ -3401,6 +3663,7 @@ def songs_rows() -> str:
     db = app.config["RAINWAVE_DATABASE"]
     q = flask.request.values.get("q")
     page = int(flask.request.values.get("page", 1))
+    cursor = flask.request.values.get("cursor")
     sort_col = flask.request.values.get("sort-col", "song_id")
     sort_dir = flask.request.values.get("sort-dir", "asc")
     input_channels = flask.request.values.getlist("channels")
@@ -3419,6 +3682,7 @@ def songs_rows() -> str:
         valid_channels,
         include_unrated,
         verified,
+        cursor,
     )
     return rainwave_library.components.songs_rows(songs_, page)
 
@@ -3428,7 +3692,6 @@ def songs_rows() -> str:
 def songs_xlsx() -> flask.Response:
     db = app.config["RAINWAVE_DATABASE"]
     query = flask.request.values.get("q")
-    page = 0
     sort_col = flask.request.values["sort-col"]
     sort_dir = flask.request.values["sort-dir"]
     input_channels = flask.request.values.getlist("channels")
@@ -3437,10 +3700,9 @@ def songs_xlsx() -> flask.Response:
     ] or None
     include_unrated = "include-unrated" in flask.request.values
     verified = flask.request.values.get("verification", "verified") != "unverified"
-    data = rainwave_library.models.rainwave.get_songs(
+    data = rainwave_library.models.rainwave.iter_songs(
         db,
         query,
-        page,
         sort_col,
         sort_dir,
         channels,
@@ -3463,17 +3725,24 @@ def songs_xlsx() -> flask.Response:
         "song_link_text",
     ]
     col_widths = [len(h) for h in headers]
-    output = io.BytesIO()
+    # constant_memory flushes each finished row to disk, so the workbook never
+    # holds more than one row; the finished file spills from memory to disk too
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
     workbook_options = {
+        "constant_memory": True,
         "default_date_format": "yyyy-mm-dd HH:mm:ss",
-        "in_memory": True,
         "remove_timezone": True,
         "strings_to_formulas": False,
     }
     workbook = xlsxwriter.Workbook(output, workbook_options)
+    header_format = workbook.add_format({"bold": True})
     rating_format = workbook.add_format({"num_format": "0.00"})
     worksheet = workbook.add_worksheet()
+    for j, header in enumerate(headers):
+        worksheet.write(0, j, header, header_format)
+    row_count = 0
     for i, row in enumerate(data, start=1):
+        row_count = i
         for j, col_name in enumerate(headers):
             if col_name == "channels":
                 col_data = ", ".join(
@@ -3506,14 +3775,17 @@ def songs_xlsx() -> flask.Response:
                 worksheet.write(i, j, col_data)
     for i, width in enumerate(col_widths):
         worksheet.set_column(i, i, width)
-    table_options = {"name": "songs", "columns": [{"header": h} for h in headers]}
-    worksheet.add_table(0, 0, len(data), len(headers) - 1, table_options)
+    # add_table() is not available in constant_memory mode
+    worksheet.autofilter(0, 0, row_count, len(headers) - 1)
+    worksheet.freeze_panes(1, 0)
     workbook.close()
-    response = flask.make_response(output.getvalue())
-    cd = 'attachment; filename="rainwave-songs.xlsx"'
-    ct = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    response.headers.update({"Content-Disposition": cd, "Content-Type": ct})
-    return response
+    output.seek(0)
+    return flask.send_file(
+        output,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        as_attachment=True,
+        download_name="rainwave-songs.xlsx",
+    )
 
 
 def main(port: int) -> None:
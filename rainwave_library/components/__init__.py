@@ -6,6 +6,8 @@ from .home import (
     library_browser_audio_preview,
     library_browser_image_preview,
     library_browser_text_preview,
+    library_reconciliation,
+    library_reconciliation_run,
     welcome,
 )
 from .listeners import (
@@ -41,6 +43,7 @@ from .suggestions import (
     suggestion_description_form,
     suggestion_detail_row,
     suggestion_edit_requester_discord_id_field,
+    suggestion_file_duplicates,
     suggestion_file_player,
     suggestion_files_card,
     suggestion_image_preview_modal,
@@ -59,6 +62,7 @@ from .suggestions import (
     suggestions_index,
     suggestions_rows,
 )
+from .tag_jobs import tag_job_progress
 from .tools import (
     bluesky_post,
     favicon,
@@ -85,6 +89,8 @@ __all__ = (
     "library_browser_audio_preview",
     "library_browser_image_preview",
     "library_browser_text_preview",
+    "library_reconciliation",
+    "library_reconciliation_run",
     "listeners_detail",
     "listeners_edit",
     "listeners_index",
@@ -114,6 +120,7 @@ __all__ = (
     "suggestion_description_form",
     "suggestion_detail_row",
     "suggestion_edit_requester_discord_id_field",
+    "suggestion_file_duplicates",
     "suggestion_file_player",
     "suggestion_files_card",
     "suggestion_image_preview_modal",
@@ -131,6 +138,7 @@ __all__ = (
     "suggestion_wizard_body",
     "suggestions_index",
     "suggestions_rows",
+    "tag_job_progress",
     "user_settings_index",
     "welcome",
 )
@@ -7,15 +7,91 @@ from rainwave_library.models.rainwave import (
 )
 
 from .common import _back_button, _base, _user_menu
+from .tag_jobs import _tag_job_poller
 
 
-def albums_detail(album: Album, songs: list[Song]) -> str:
+def albums_detail(
+    album: Album,
+    songs: list[Song],
+    tag_result: tuple[str, str] | None = None,
+    tag_job_id: str | None = None,
+) -> str:
+    expanded = bool(tag_result or tag_job_id)
     content = [
         htpy.div(".g-1.pt-3.row")[
             _back_button(flask.url_for("albums"), "Albums"), _user_menu()
         ],
         htpy.div(".pt-3.row")[htpy.div(".col")[htpy.h1["Album details"]]],
         htpy.div(".pt-3.row")[htpy.div(".col")[album.detail_table]],
+        htpy.div(".pt-3.row")[
+            htpy.div(".col-12.col-lg-6")[
+                htpy.button(
+                    ".btn.btn-warning",
+                    aria_controls="album-tags",
+                    aria_expanded="true" if expanded else "false",
+                    data_bs_target="#album-tags",
+                    data_bs_toggle="collapse",
+                    type="button",
+                )[htpy.i(".bi-pencil"), " Update album tags"],
+                htpy.div(
+                    "#album-tags.collapse.show" if expanded else "#album-tags.collapse"
+                )[
+                    htpy.div(".card.card-body.mt-2")[
+                        tag_job_id and _tag_job_poller(tag_job_id),
+                        tag_result
+                        and htpy.div(f".alert.{tag_result[0]}", role="alert")[
+                            tag_result[1]
+                        ],
+                        htpy.form(
+                            method="post",
+                            onsubmit=(
+                                "return window.confirm('Rename this album in every "
+                                "associated song file?')"
+                            ),
+                        )[
+                            htpy.label(".form-label", for_="album-name")["Album name"],
+                            htpy.div(".input-group")[
+                                htpy.input(
+                                    "#album-name.form-control",
+                                    name="album-name",
+                                    required=True,
+                                    type="text",
+                                    value=album.name,
+                                ),
+                                htpy.button(".btn.btn-warning", type="submit")[
+                                    htpy.i(".bi-pencil"), " Rename"
+                                ],
+                            ],
+                        ],
+                        htpy.form(
+                            ".mt-3",
+                            method="post",
+                            onsubmit=(
+                                "return window.confirm('Set this category in every "
+                                "associated song file?')"
+                            ),
+                        )[
+                            htpy.label(".form-label", for_="album-genre")["Category"],
+                            htpy.div(".input-group")[
+                                htpy.input(
+                                    "#album-genre.form-control",
+                                    name="genre",
+                                    type="text",
+                                ),
+                                htpy.button(".btn.btn-warning", type="submit")[
+                                    htpy.i(".bi-tags"), " Set category"
+                                ],
+                            ],
+                            htpy.div(".form-text")[
+                                "Replaces the category tag in every verified song "
+                                "file on this album. Leave it empty to remove the "
+                                "category."
+                            ],
+                        ],
+                    ]
+                ],
+            ]
+        ],
         htpy.div(".pt-3.row")[
             htpy.div(".col")[
                 htpy.details[
@@ -175,7 +251,9 @@ def albums_rows(albums: list[Album], page: int) -> str:
                         ".py-3.text-center",
                         colspan=Album.colspan,
                         hx_include="form",
-                        hx_post=flask.url_for("albums_rows", page=page + 1),
+                        hx_post=flask.url_for(
+                            "albums_rows", page=page + 1, cursor=albums[i - 1].cursor
+                        ),
                         hx_swap="outerHTML",
                         hx_target="closest tr",
                         hx_trigger="revealed",
@@ -7,13 +7,16 @@ from rainwave_library.models.rainwave import (
 )
 
 from .common import _back_button, _base, _user_menu
+from .tag_jobs import _tag_job_poller
 
 
 def artists_detail(
     artist: Artist,
     songs: list[Song],
     rename_result: tuple[str, str] | None = None,
+    tag_job_id: str | None = None,
 ) -> str:
+    expanded = bool(rename_result or tag_job_id)
     song_rows: list[htpy.Node] = [song.tr for song in songs]
     if not song_rows:
         song_rows.append(
@@ -32,17 +35,18 @@ def artists_detail(
                 htpy.button(
                     ".btn.btn-warning",
                     aria_controls="artist-rename",
-                    aria_expanded="true" if rename_result else "false",
+                    aria_expanded="true" if expanded else "false",
                     data_bs_target="#artist-rename",
                     data_bs_toggle="collapse",
                     type="button",
                 )[htpy.i(".bi-pencil"), " Rename artist"],
                 htpy.div(
                     "#artist-rename.collapse.show"
-                    if rename_result
+                    if expanded
                     else "#artist-rename.collapse"
                 )[
                     htpy.div(".card.card-body.mt-2")[
+                        tag_job_id and _tag_job_poller(tag_job_id),
                         rename_result
                         and htpy.div(f".alert.{rename_result[0]}", role="alert")[
                             rename_result[1]
@@ -214,7 +218,11 @@ def artists_rows(artists: list[Artist], page: int) -> str:
                         ".py-3.text-center",
                         colspan=Artist.colspan,
                         hx_include="form",
-                        hx_post=flask.url_for("artists_rows", page=page + 1),
+                        hx_post=flask.url_for(
+                            "artists_rows",
+                            page=page + 1,
+                            cursor=artists[index - 1].cursor,
+                        ),
                         hx_swap="outerHTML",
                         hx_target="closest tr",
                         hx_trigger="revealed",
@@ -4,6 +4,10 @@ import flask
 import htpy
 
 from rainwave_library.models.mp3 import ID3_TAG_LABELS, Mp3FileInfo, Mp3TagValues
+from rainwave_library.models.reconciliation import (
+    LibraryReconciliation,
+    LibraryReconciliationRun,
+)
 from rainwave_library.models.storage import (
     LibraryBrowserDirectory,
     LibraryBrowserEntry,
@@ -464,6 +468,123 @@ def library_browser(directory: LibraryBrowserDirectory) -> str:
     return str(_base(content))
 
 
+def _library_reconciliation_findings(
+    title: str, description: str, items: list[htpy.Node]
+) -> htpy.Element:
+    return htpy.div(".pt-3.row")[
+        htpy.div(".col")[
+            htpy.h2(".h4")[
+                title, " ", htpy.span(".badge.text-bg-secondary")[len(items)]
+            ],
+            htpy.p(".small.text-secondary")[description],
+            (
+                htpy.ul(".list-group")[
+                    (htpy.li(".list-group-item.small.text-break")[i] for i in items)
+                ]
+                if items
+                else htpy.p["Nothing to report."]
+            ),
+        ]
+    ]
+
+
+def _library_reconciliation_run(run: LibraryReconciliationRun) -> htpy.Element:
+    scope = "every folder" if run.full else "changed folders"
+    if run.running:
+        return htpy.div(
+            ".alert.alert-info",
+            hx_get=flask.url_for("library_reconciliation_run"),
+            hx_swap="outerHTML",
+            hx_trigger="every 2s",
+            role="alert",
+        )[
+            htpy.span(".spinner-border.spinner-border-sm.me-2"),
+            f"Scanning {scope} since {run.started_at}.",
+        ]
+    return htpy.div(".alert.alert-danger", role="alert")[
+        f"The scan of {scope} started {run.started_at} failed: {run.error}"
+    ]
+
+
+def library_reconciliation_run(run: LibraryReconciliationRun) -> str:
+    return str(_library_reconciliation_run(run))
+
+
+def library_reconciliation(
+    reconciliation: LibraryReconciliation | None,
+    run: LibraryReconciliationRun | None,
+) -> str:
+    rescan_url = flask.url_for("library_reconciliation")
+    running = run is not None and run.running
+    content = [
+        htpy.div(".g-1.pt-3.row")[
+            _back_button(flask.url_for("index"), "Home"),
+            _user_menu(),
+        ],
+        htpy.div(".pt-3.row")[
+            htpy.div(".col")[
+                htpy.h1["Library reconciliation"],
+                htpy.p(".text-secondary")[
+                    (
+                        f"Last scanned {reconciliation.scanned_at}: "
+                        f"{reconciliation.files_total:,} files in "
+                        f"{reconciliation.directories_total:,} folders, "
+                        f"{reconciliation.directories_rescanned:,} rescanned, in "
+                        f"{reconciliation.duration_seconds:.1f} seconds."
+                    )
+                    if reconciliation
+                    else "The library has not been scanned yet."
+                ],
+                run and run.status != "completed" and _library_reconciliation_run(run),
+                htpy.form(action=rescan_url, method="post")[
+                    htpy.button(
+                        ".btn.btn-primary.me-1",
+                        disabled=running,
+                        name="full",
+                        type="submit",
+                        value="",
+                    )[htpy.i(".bi-arrow-repeat"), " Scan changed folders"],
+                    htpy.button(
+                        ".btn.btn-outline-primary",
+                        disabled=running,
+                        name="full",
+                        type="submit",
+                        value="1",
+                    )[htpy.i(".bi-arrow-clockwise"), " Scan everything"],
+                ],
+            ]
+        ],
+        reconciliation
+        and [
+            _library_reconciliation_findings(
+                "Moved",
+                "Songs whose file is missing, with exactly one unknown file of the "
+                "same name elsewhere in the library",
+                [
+                    [htpy.code[m.old_path], " → ", htpy.code[m.new_path]]
+                    for m in reconciliation.moved
+                ],
+            ),
+            _library_reconciliation_findings(
+                "Missing",
+                "Verified songs whose file is not in the library",
+                [htpy.code[path] for path in reconciliation.missing],
+            ),
+            _library_reconciliation_findings(
+                "Disabled",
+                "Files in the library for songs that are not verified",
+                [htpy.code[path] for path in reconciliation.disabled],
+            ),
+            _library_reconciliation_findings(
+                "Orphans",
+                "Files in the library that Rainwave does not know about",
+                [htpy.code[path] for path in reconciliation.orphans],
+            ),
+        ],
+    ]
+    return str(_base(content))
+
+
 def welcome(role: str) -> str:
     tools: list[tuple[str, str, str]] = [
         (
@@ -493,6 +614,11 @@ def welcome(role: str) -> str:
                     "Library files",
                     "Browse upcoming and removed music files",
                 ),
+                (
+                    "library_reconciliation",
+                    "Library reconciliation",
+                    "Find library files that are orphaned, disabled, missing or moved",
+                ),
                 (
                     "new_music_power_hours",
                     "New Music Power Hours",
@@ -207,7 +207,11 @@ def listeners_rows(listeners: list[Listener], page: int) -> str:
                         ".py-3.text-center",
                         colspan=Listener.colspan,
                         hx_include="form",
-                        hx_post=flask.url_for("listeners_rows", page=page + 1),
+                        hx_post=flask.url_for(
+                            "listeners_rows",
+                            page=page + 1,
+                            cursor=listeners[i - 1].cursor,
+                        ),
                         hx_swap="outerHTML",
                         hx_target="closest tr",
                         hx_trigger="revealed",
@@ -715,7 +715,9 @@ def songs_rows(songs: list[Song], page: int) -> str:
                         ".py-3.text-center",
                         colspan=Song.colspan,
                         hx_include="form",
-                        hx_post=flask.url_for("songs_rows", page=page + 1),
+                        hx_post=flask.url_for(
+                            "songs_rows", page=page + 1, cursor=songs[i - 1].cursor
+                        ),
                         hx_target="closest tr",
                         hx_trigger="revealed",
                         hx_swap="outerHTML",
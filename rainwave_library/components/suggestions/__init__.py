@@ -16,6 +16,7 @@ from .file_controls import (
     suggestion_normalize_filenames_form,
 )
 from .files import (
+    suggestion_file_duplicates,
     suggestion_file_player,
     suggestion_files_card,
     suggestion_image_preview_modal,
@@ -57,6 +58,7 @@ __all__ = (
     "suggestion_description_form",
     "suggestion_detail_row",
     "suggestion_edit_requester_discord_id_field",
+    "suggestion_file_duplicates",
     "suggestion_file_player",
     "suggestion_files_card",
     "suggestion_image_preview_modal",
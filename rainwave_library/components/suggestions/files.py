@@ -1,10 +1,12 @@
 import flask
 import htpy
+import markupsafe
 
 from rainwave_library.models.mp3 import (
     ID3_TAG_LABELS,
     Mp3TagValues,
 )
+from rainwave_library.models.storage import SUGGESTION_UPLOAD_CHUNK_BYTES
 from rainwave_library.models.suggestions import (
     SuggestionFileReview,
 )
@@ -24,6 +26,138 @@ from .file_controls import (
 )
 
 
+def _suggestion_files_upload_script() -> htpy.Element:
+    """Uploads the files of a form with data-chunked-upload one chunk at a time,
+    retrying failed chunks and resuming from the offset the server reports.
+
+    Each upload is keyed by a SHA-256 of the file's first and last bytes, size
+    and modification time, so only the same file resumes a partial upload. The
+    server hashes the whole file as it receives it. Browsers without Web Crypto
+    post the form as a whole."""
+    script = markupsafe.Markup(
+        """
+        if (!window.suggestionFilesUpload) {
+            window.suggestionFilesUpload = true;
+            const uploadContentKey = async (file) => {
+                const edge = 64 * 1024;
+                const data = await new Blob([
+                    file.slice(0, edge),
+                    file.slice(Math.max(file.size - edge, 0)),
+                    `${file.size}:${file.lastModified}`,
+                ]).arrayBuffer();
+                const digest = await crypto.subtle.digest("SHA-256", data);
+                return Array.from(
+                    new Uint8Array(digest),
+                    (x) => x.toString(16).padStart(2, "0"),
+                ).join("");
+            };
+            document.addEventListener("submit", async (event) => {
+                const form = event.target;
+                if (
+                    !(form instanceof HTMLFormElement) ||
+                    !form.matches("[data-chunked-upload]") ||
+                    !window.crypto?.subtle
+                ) {
+                    return;
+                }
+                event.preventDefault();
+                event.stopPropagation();
+                const startUrl = form.dataset.chunkedUpload;
+                const chunkSize = Number(form.dataset.chunkSize);
+                const files = Array.from(form.querySelector("input[type=file]").files);
+                const total = files.reduce((sum, file) => sum + file.size, 0);
+                const progress = document.getElementById(form.dataset.progress);
+                const bar = progress.querySelector(".progress-bar");
+                const label = progress.querySelector(".small");
+                const show = (sent, text) => {
+                    const percent = total ? Math.round((sent / total) * 100) : 100;
+                    bar.style.width = `${percent}%`;
+                    bar.setAttribute("aria-valuenow", String(percent));
+                    bar.textContent = `${percent}%`;
+                    label.textContent = text;
+                };
+                const send = async (url, options) => {
+                    for (let attempt = 0; ; attempt += 1) {
+                        try {
+                            const response = await fetch(url, options);
+                            if (response.status < 500 || attempt >= 5) {
+                                return response;
+                            }
+                        } catch (error) {
+                            if (attempt >= 5) {
+                                throw error;
+                            }
+                        }
+                        label.textContent = "Connection lost, retrying\u2026";
+                        await new Promise((resolve) => {
+                            setTimeout(resolve, 1000 * 2 ** attempt);
+                        });
+                    }
+                };
+                form.querySelectorAll("button").forEach((button) => {
+                    button.disabled = true;
+                });
+                progress.classList.add("htmx-request");
+                let sent = 0;
+                let uploaded = 0;
+                let error = null;
+                try {
+                    for (const file of files) {
+                        const body = new FormData();
+                        body.append("name", file.name);
+                        body.append("size", String(file.size));
+                        body.append("key", await uploadContentKey(file));
+                        let response = await send(startUrl, { method: "POST", body });
+                        const upload = await response.json();
+                        if (!response.ok) {
+                            throw new Error(upload.error);
+                        }
+                        const uploadUrl = `${startUrl}/${upload.id}`;
+                        while (upload.offset < upload.size) {
+                            show(sent + upload.offset, `Uploading ${file.name}\u2026`);
+                            const end = Math.min(
+                                upload.offset + chunkSize,
+                                upload.size,
+                            );
+                            response = await send(
+                                `${uploadUrl}?offset=${upload.offset}`,
+                                { method: "PUT", body: file.slice(upload.offset, end) },
+                            );
+                            const result = await response.json();
+                            if (!response.ok && response.status !== 409) {
+                                throw new Error(result.error);
+                            }
+                            upload.offset = result.offset;
+                        }
+                        show(sent + file.size, `Checking ${file.name}\u2026`);
+                        response = await send(
+                            `${uploadUrl}/finish`,
+                            { method: "POST" },
+                        );
+                        if (!response.ok) {
+                            throw new Error((await response.json()).error);
+                        }
+                        sent += file.size;
+                        uploaded += 1;
+                    }
+                } catch (caught) {
+                    error = caught.message || "The files could not be uploaded.";
+                }
+                const params = new URLSearchParams({ uploaded: String(uploaded) });
+                if (error) {
+                    params.set("error", error);
+                }
+                htmx.ajax("GET", `${form.dataset.filesUrl}?${params}`, {
+                    target: form.dataset.target,
+                    swap: "outerHTML",
+                });
+            }, true);
+        }
+        """
+    )
+    return htpy.script[script]
+
+
 def _suggestion_file_category(path: str) -> str:
     normalized_path = path.casefold()
     if normalized_path.endswith(".mp3"):
@@ -246,6 +380,29 @@ def _suggestion_music_file_table(
     ]
 
 
+def suggestion_file_duplicates(duplicates: dict[str, tuple[str, ...]]) -> str:
+    if not duplicates:
+        return ""
+    return str(
+        htpy.div(".alert.alert-warning.mb-0.mt-3", role="alert")[
+            htpy.div(".fw-semibold")["Some staged files are already in the library"],
+            htpy.ul(".mb-0.small")[
+                (
+                    htpy.li[
+                        htpy.code(".text-break")[path],
+                        " has the same audio as ",
+                        [
+                            (", " if index else "", htpy.code(".text-break")[other])
+                            for index, other in enumerate(others)
+                        ],
+                    ]
+                    for path, others in duplicates.items()
+                )
+            ],
+        ]
+    )
+
+
 def suggestion_file_player(suggestion_id: str, path: str) -> str:
     metadata = htpy.strong[
         htpy.i(".bi-music-note-beamed"),
@@ -304,25 +461,6 @@ def _suggestion_files_card(
         "suggestion_files_upload",
         suggestion_id=suggestion_id,
     )
-    upload_before_request = (
-        "const bar=document.getElementById('suggestion-files-upload-bar');"
-        "const label=document.getElementById('suggestion-files-upload-label');"
-        "bar.style.width='0%';"
-        "bar.setAttribute('aria-valuenow','0');"
-        "bar.textContent='0%';"
-        "label.textContent='Uploading files\u2026';"
-    )
-    upload_progress = (
-        "if(!event.detail.total){return;}"
-        "const percent=Math.round(event.detail.loaded/event.detail.total*100);"
-        "const bar=document.getElementById('suggestion-files-upload-bar');"
-        "const label=document.getElementById('suggestion-files-upload-label');"
-        "bar.style.width=percent+'%';"
-        "bar.setAttribute('aria-valuenow',String(percent));"
-        "bar.textContent=percent+'%';"
-        "label.textContent=percent>=100"
-        "?'Processing files\u2026':'Uploading files\u2026';"
-    )
     file_sections = tuple(
         (
             section_id,
@@ -357,19 +495,20 @@ def _suggestion_files_card(
         ),
         htpy.div(f"#{collapse_id}.card-body.collapse.show")[
             result and htpy.div(f".alert.{result[0]}.py-2", role="alert")[result[1]],
+            # Browsers with JavaScript send each file in chunks that can be
+            # resumed; the form posts the whole upload at once otherwise
             htpy.form(
-                {
-                    "hx-on:htmx:before-request": upload_before_request,
-                    "hx-on:htmx:xhr:progress": upload_progress,
-                },
                 action=upload_url,
+                data_chunk_size=str(SUGGESTION_UPLOAD_CHUNK_BYTES),
+                data_chunked_upload=flask.url_for(
+                    "suggestion_upload_start", suggestion_id=suggestion_id
+                ),
+                data_files_url=flask.url_for(
+                    "suggestion_files_get", suggestion_id=suggestion_id
+                ),
+                data_progress="suggestion-files-upload-progress",
+                data_target="#suggestion-files-card",
                 enctype="multipart/form-data",
-                hx_disabled_elt="button",
-                hx_encoding="multipart/form-data",
-                hx_indicator="#suggestion-files-upload-progress",
-                hx_post=upload_url,
-                hx_swap="outerHTML",
-                hx_target="#suggestion-files-card",
                 method="post",
             )[
                 htpy.div(".align-items-end.g-2.row")[
@@ -377,7 +516,11 @@ def _suggestion_files_card(
                         htpy.label(".form-label", for_="suggestion-files")[
                             "Upload files"
                         ],
-                        htpy.div(".form-text")["The maximum upload size is 1 GB."],
+                        htpy.div(".form-text")[
+                            "Files can be up to 1 GB each. Interrupted uploads "
+                            "continue where they stopped when the same files are "
+                            "chosen again."
+                        ],
                         htpy.input(
                             "#suggestion-files.form-control",
                             multiple=True,
@@ -416,10 +559,21 @@ def _suggestion_files_card(
                     ],
                 ],
             ],
+            _suggestion_files_upload_script(),
             has_music
             and htpy.div(".mt-3")[
                 _suggestion_normalize_filenames_button(suggestion_id)
             ],
+            # Staged files are hashed on first view, so duplicates are looked up
+            # after the card has rendered
+            has_music
+            and htpy.div(
+                hx_get=flask.url_for(
+                    "suggestion_file_duplicates", suggestion_id=suggestion_id
+                ),
+                hx_swap="outerHTML",
+                hx_trigger="load",
+            ),
             [
                 _suggestion_file_section(
                     suggestion_id,
@@ -475,7 +475,11 @@ def suggestions_rows(suggestions: list[Suggestion], page: int) -> str:
                         ".py-3.text-center",
                         colspan=Suggestion.colspan,
                         hx_include="#suggestion-filters",
-                        hx_post=flask.url_for("suggestions_rows", page=page + 1),
+                        hx_post=flask.url_for(
+                            "suggestions_rows",
+                            page=page + 1,
+                            cursor=suggestions[index - 1].cursor,
+                        ),
                         hx_swap="outerHTML",
                         hx_target="closest tr",
                         hx_trigger="revealed",
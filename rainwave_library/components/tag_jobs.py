@@ -0,0 +1,69 @@
+import flask
+import htpy
+
+from rainwave_library.models.tag_jobs import TagJob, TagJobFailure
+
+
+def _tag_job_poller(job_id: str) -> htpy.Element:
+    return htpy.div(
+        hx_get=flask.url_for("tag_job_progress", job_id=job_id),
+        hx_swap="outerHTML",
+        hx_trigger="load",
+    )[htpy.span(".htmx-indicator.spinner-border.spinner-border-sm")]
+
+
+def tag_job_progress(
+    job: TagJob,
+    failures: list[TagJobFailure],
+    next_url: str | None,
+) -> str:
+    percent = (
+        100 if not job.files_total else 100 * job.files_processed // job.files_total
+    )
+    if not job.finished:
+        alert_class = ".alert-info"
+        summary = (
+            f"Working: {job.files_processed:,} of {job.files_total:,} files processed."
+            if job.status == "running"
+            else "Waiting for another job to finish."
+        )
+    elif job.status == "failed" or job.files_failed:
+        alert_class = ".alert-danger"
+        summary = (
+            f"Finished with errors: {job.files_done:,} files updated, "
+            f"{job.files_skipped:,} unchanged, {job.files_failed:,} failed."
+        )
+    else:
+        alert_class = ".alert-success"
+        summary = (
+            f"Finished: {job.files_done:,} files updated, "
+            f"{job.files_skipped:,} unchanged."
+        )
+    content = htpy.div(
+        f".alert{alert_class}",
+        hx_get=None
+        if job.finished
+        else flask.url_for("tag_job_progress", job_id=job.id),
+        hx_swap=None if job.finished else "outerHTML",
+        hx_trigger=None if job.finished else "every 1s",
+        role="alert",
+    )[
+        htpy.div(".fw-semibold")[job.label],
+        htpy.div[summary],
+        htpy.div(
+            ".mt-2.progress",
+            aria_label="Tag job progress",
+            aria_valuemax="100",
+            aria_valuemin="0",
+            aria_valuenow=str(percent),
+            role="progressbar",
+        )[htpy.div(".progress-bar", style=f"width: {percent}%")],
+        failures
+        and htpy.ul(".mb-0.mt-2.small")[
+            (htpy.li(".text-break")[htpy.code[f.path], ": ", f.error] for f in failures)
+        ],
+        job.finished
+        and next_url
+        and htpy.a(".btn.btn-primary.btn-sm.mt-2", href=next_url)["Continue"],
+    ]
+    return str(content)
@@ -55,13 +55,20 @@ def favicon() -> str:
     return str(content)
 
 
-def get_ocremix_download() -> str:
+def get_ocremix_download(duplicates: tuple[str, ...] = ()) -> str:
     content = htpy.tr[
         htpy.th["File saved"],
         htpy.td[
+            duplicates
+            and htpy.div(".alert.alert-warning.py-2", role="alert")[
+                "The same audio is already in the library:",
+                htpy.ul(".mb-0")[
+                    (htpy.li[htpy.code(".text-break")[path]] for path in duplicates)
+                ],
+            ],
             htpy.a(".btn.btn-success", href=flask.url_for("get_ocremix"))[
                 htpy.i(".bi-arrow-counterclockwise"), " Get another"
-            ]
+            ],
         ],
     ]
     return str(content)
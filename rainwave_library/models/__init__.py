@@ -1,7 +1,12 @@
+from . import audio_index as audio_index
 from . import bsky as bsky
+from . import cursors as cursors
 from . import discord as discord
 from . import mp3 as mp3
 from . import power_hour as power_hour
 from . import rainwave as rainwave
+from . import reconciliation as reconciliation
 from . import storage as storage
 from . import suggestions as suggestions
+from . import tag_jobs as tag_jobs
+from . import watcher as watcher
@@ -0,0 +1,225 @@
+import collections
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import typing
+
+from rainwave_library.models.mp3 import (
+    MP3_READ_MAX_WORKERS,
+    mp3_audio_hash_get_many,
+    yield_all_with_stat,
+)
+
+log = logging.getLogger(__name__)
+
+# Staged files are hashed when a suggestion is opened rather than by the walk
+AUDIO_INDEX_EXCLUDED_FOLDERS = ("staging",)
+# Hashes are committed in batches so an interrupted first run keeps its work
+AUDIO_INDEX_COMMIT_EVERY = 500
+
+_audio_index_lock = threading.Lock()
+
+
+@dataclasses.dataclass(frozen=True)
+class AudioIndexUpdate:
+    files_total: int
+    files_hashed: int
+    files_removed: int
+    duration_seconds: float
+
+
+def _audio_hashes_put(
+    con: sqlite3.Connection,
+    entries: typing.Iterable[tuple[pathlib.Path, int, int]],
+    max_workers: int,
+) -> dict[pathlib.Path, str | None]:
+    entries = list(entries)
+    hashes = mp3_audio_hash_get_many(
+        (path for path, _, _ in entries), max_workers=max_workers
+    )
+    con.executemany(
+        """
+        insert into library_audio_hashes (path, size, mtime_ns, audio_sha256)
+        values (?, ?, ?, ?)
+        on conflict (path) do update set
+            size = excluded.size,
+            mtime_ns = excluded.mtime_ns,
+            audio_sha256 = excluded.audio_sha256
+        """,
+        [(str(path), size, mtime_ns, hashes[path]) for path, size, mtime_ns in entries],
+    )
+    return hashes
+
+
+def audio_index_update(
+    con: sqlite3.Connection,
+    root: pathlib.Path,
+    exclude: typing.Iterable[str | pathlib.Path] = AUDIO_INDEX_EXCLUDED_FOLDERS,
+    max_workers: int = MP3_READ_MAX_WORKERS,
+) -> AudioIndexUpdate:
+    """Hash the audio of every MP3 under root whose size or mtime changed since
+    it was last hashed, and forget files that are gone"""
+    exclude = tuple(exclude)
+    started = time.monotonic()
+    with _audio_index_lock:
+        known = {
+            row["path"]: (row["size"], row["mtime_ns"])
+            for row in con.execute(
+                "select path, size, mtime_ns from library_audio_hashes"
+            )
+        }
+        seen = set()
+        hashed = 0
+        pending = []
+        try:
+            for entry in yield_all_with_stat(root, exclude=exclude):
+                path = str(entry.path)
+                seen.add(path)
+                if known.get(path) == (entry.size, entry.mtime_ns):
+                    continue
+                pending.append((entry.path, entry.size, entry.mtime_ns))
+                if len(pending) >= AUDIO_INDEX_COMMIT_EVERY:
+                    _audio_hashes_put(con, pending, max_workers)
+                    con.commit()
+                    hashed += len(pending)
+                    pending = []
+            _audio_hashes_put(con, pending, max_workers)
+            hashed += len(pending)
+
+            # Rows outside the walk, such as staged files, are kept while the
+            # file exists
+            root_prefix = os.path.join(os.path.normpath(root), "")
+            excluded = tuple(
+                os.path.join(os.path.normpath(root / path), "") for path in exclude
+            )
+            gone = [
+                (path,)
+                for path in known
+                if path not in seen
+                and path.startswith(root_prefix)
+                and (not path.startswith(excluded) or not os.path.exists(path))
+            ]
+            con.executemany("delete from library_audio_hashes where path = ?", gone)
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+    update = AudioIndexUpdate(
+        files_total=len(seen),
+        files_hashed=hashed,
+        files_removed=len(gone),
+        duration_seconds=time.monotonic() - started,
+    )
+    log.info(
+        "Indexed audio of %d files (%d hashed, %d removed) in %.1f seconds",
+        update.files_total,
+        update.files_hashed,
+        update.files_removed,
+        update.duration_seconds,
+    )
+    return update
+
+
+def audio_hashes_get(
+    con: sqlite3.Connection,
+    paths: typing.Iterable[str | pathlib.Path],
+) -> dict[pathlib.Path, str | None]:
+    """Audio hashes from the index, hashing and storing the files that are not
+    indexed or changed since"""
+    result = {}
+    misses = {}
+    for path in map(pathlib.Path, paths):
+        try:
+            stat = path.stat()
+        except OSError as error:
+            log.warning("Unable to read %s: %s", path, error)
+            result[path] = None
+            continue
+        row = con.execute(
+            """
+            select audio_sha256
+            from library_audio_hashes
+            where path = :path and size = :size and mtime_ns = :mtime_ns
+            """,
+            {
+                "path": str(path.absolute()),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            },
+        ).fetchone()
+        if row is None:
+            misses[path.absolute()] = (path, stat.st_size, stat.st_mtime_ns)
+        else:
+            result[path] = row["audio_sha256"]
+    if misses:
+        try:
+            hashes = _audio_hashes_put(
+                con,
+                (
+                    (absolute, size, mtime_ns)
+                    for absolute, (_, size, mtime_ns) in misses.items()
+                ),
+                MP3_READ_MAX_WORKERS,
+            )
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        for absolute, (path, _, _) in misses.items():
+            result[path] = hashes[absolute]
+    return result
+
+
+def audio_duplicates_get(
+    con: sqlite3.Connection,
+    paths: typing.Iterable[str | pathlib.Path],
+) -> dict[pathlib.Path, tuple[str, ...]]:
+    """Other indexed files with the same audio as each of paths; paths without
+    duplicates are left out"""
+    hashes = {
+        path: audio_hash
+        for path, audio_hash in audio_hashes_get(con, paths).items()
+        if audio_hash is not None
+    }
+    if not hashes:
+        return {}
+    matches = collections.defaultdict(list)
+    for row in con.execute(
+        """
+        select path, audio_sha256
+        from library_audio_hashes
+        where audio_sha256 in (select value from json_each(:hashes))
+        order by path
+        """,
+        {"hashes": json.dumps(sorted(set(hashes.values())))},
+    ):
+        matches[row["audio_sha256"]].append(row["path"])
+    duplicates = {}
+    for path, audio_hash in hashes.items():
+        others = tuple(
+            other for other in matches[audio_hash] if other != str(path.absolute())
+        )
+        if others:
+            duplicates[path] = others
+    return duplicates
+
+
+def audio_hash_paths_get(con: sqlite3.Connection, audio_hash: str) -> tuple[str, ...]:
+    """Every indexed file with this audio hash"""
+    return tuple(
+        row["path"]
+        for row in con.execute(
+            """
+            select path
+            from library_audio_hashes
+            where audio_sha256 = :audio_sha256
+            order by path
+            """,
+            {"audio_sha256": audio_hash},
+        )
+    )
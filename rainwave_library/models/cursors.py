@@ -0,0 +1,30 @@
+import base64
+import binascii
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def cursor_encode(cursor: str | None) -> str | None:
+    """Wrap the cursor column of a row so it can travel in a URL"""
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def cursor_decode(cursor: str | None, sort_col: str, sort_dir: str) -> list | None:
+    """Return the values after the sort column and direction in a cursor, or
+    None if the cursor is not usable with the current sort"""
+    if not cursor:
+        return None
+    try:
+        cursor_sort_col, cursor_sort_dir, *values = json.loads(
+            base64.urlsafe_b64decode(cursor.encode())
+        )
+    except (binascii.Error, TypeError, ValueError):
+        log.warning("Ignoring invalid cursor %r", cursor)
+        return None
+    if (cursor_sort_col, cursor_sort_dir) != (sort_col, sort_dir):
+        return None
+    return values
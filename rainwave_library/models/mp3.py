@@ -1,13 +1,43 @@
+import concurrent.futures
 import dataclasses
+import hashlib
 import logging
+import os
 import pathlib
+import shutil
+import tempfile
+import threading
 import typing
 
+import mutagen
 import mutagen.id3
 import mutagen.mp3
 
 log = logging.getLogger(__name__)
 
+MP3_READ_MAX_WORKERS = 8
+MP3_ESTIMATE_WINDOW_BYTES = 16 * 1024
+# Padding reserved after the frames whenever a tag has to grow, so later edits
+# fit in place instead of moving the audio again
+ID3_PADDING_BYTES = 8 * 1024
+
+# Bitrates in kbps by (MPEG version 1 or 2, layer); MPEG 2.5 uses the version 2
+# tables
+_MP3_BITRATES_KBPS = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates by the version bits of the frame header
+_MP3_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
 ID3_TAG_LABELS = {
     "album": "Album",
     "title": "Title",
@@ -36,6 +66,37 @@ class Mp3FileInfo:
     bitrate_bps: int | None = None
 
 
+@dataclasses.dataclass(frozen=True)
+class Mp3Inspection:
+    tag_values: Mp3TagValues
+    file_info: Mp3FileInfo
+
+
+@dataclasses.dataclass(frozen=True)
+class _Mp3FrameHeader:
+    version_bits: int
+    layer: int
+    bitrate_bps: int
+    sample_rate: int
+    mode: int
+    length: int
+
+    @property
+    def samples_per_frame(self) -> int:
+        if self.layer == 1:
+            return 384
+        if self.layer == 3 and self.version_bits != 3:
+            return 576
+        return 1152
+
+
+@dataclasses.dataclass(frozen=True)
+class Mp3FileEntry:
+    path: pathlib.Path
+    size: int
+    mtime_ns: int
+
+
 @dataclasses.dataclass(frozen=True)
 class Mp3FilenameNormalization:
     source_path: str
@@ -48,28 +109,254 @@ class Mp3FilenameNormalization:
         return self.target_path is not None and self.target_path != self.source_path
 
 
-def mp3_file_info_get(filename: str | pathlib.Path) -> Mp3FileInfo:
+def _id3_tag_values_from_tags(
+    tags: mutagen.id3.ID3, duration_seconds: float | None
+) -> Mp3TagValues:
+    www = tuple(
+        url
+        for frame in tags.getall("WXXX")
+        if (url := str(getattr(frame, "url", "")).strip())
+    )
+    return Mp3TagValues(
+        album=_text_frame_values(tags, "TALB"),
+        title=_text_frame_values(tags, "TIT2"),
+        artist=_text_frame_values(tags, "TPE1"),
+        genre=_text_frame_values(tags, "TCON"),
+        www=www,
+        comment=_text_frame_values(tags, "COMM"),
+        duration_seconds=duration_seconds,
+    )
+
+
+def mp3_inspect(filename: str | pathlib.Path) -> Mp3Inspection:
+    """Read tags, duration, bitrate and size with a single open and parse"""
     try:
-        file_size_bytes = pathlib.Path(filename).stat().st_size
+        f = pathlib.Path(filename).open("rb")
     except OSError as error:
-        log.warning("Unable to read MP3 file size from %s: %s", filename, error)
-        file_size_bytes = None
+        log.warning("Unable to read MP3 file %s: %s", filename, error)
+        return Mp3Inspection(
+            Mp3TagValues(error="Could not read ID3 tags."), Mp3FileInfo()
+        )
 
-    try:
-        mp3 = mutagen.mp3.MP3(filename)
-    except (mutagen.MutagenError, OSError) as error:
-        log.warning("Unable to read MP3 bitrate from %s: %s", filename, error)
-        bitrate_bps = None
-    else:
-        bitrate = getattr(mp3.info, "bitrate", None)
-        bitrate_bps = int(bitrate) if bitrate is not None else None
+    with f:
+        try:
+            file_size_bytes = os.fstat(f.fileno()).st_size
+        except OSError as error:
+            log.warning("Unable to read MP3 file size from %s: %s", filename, error)
+            file_size_bytes = None
+
+        try:
+            mp3 = mutagen.mp3.MP3(f)
+        except (mutagen.MutagenError, OSError) as error:
+            log.warning("Unable to read MP3 audio from %s: %s", filename, error)
+        else:
+            bitrate = getattr(mp3.info, "bitrate", None)
+            file_info = Mp3FileInfo(
+                file_size_bytes=file_size_bytes,
+                bitrate_bps=int(bitrate) if bitrate is not None else None,
+            )
+            duration_seconds = mp3.info.length if mp3.info is not None else None
+            if mp3.tags is None:
+                tag_values = Mp3TagValues(
+                    error="No ID3 tags found.",
+                    duration_seconds=duration_seconds,
+                )
+            else:
+                tag_values = _id3_tag_values_from_tags(mp3.tags, duration_seconds)
+            return Mp3Inspection(tag_values, file_info)
 
-    return Mp3FileInfo(
-        file_size_bytes=file_size_bytes,
-        bitrate_bps=bitrate_bps,
+        # Without readable audio frames the ID3 tags may still be intact
+        file_info = Mp3FileInfo(file_size_bytes=file_size_bytes)
+        try:
+            f.seek(0)
+            tags = mutagen.id3.ID3(f)
+        except mutagen.id3.ID3NoHeaderError:
+            tag_values = Mp3TagValues(error="No ID3 tags found.")
+        except (mutagen.MutagenError, OSError) as error:
+            log.warning("Unable to read ID3 tags from %s: %s", filename, error)
+            tag_values = Mp3TagValues(error="Could not read ID3 tags.")
+        else:
+            tag_values = _id3_tag_values_from_tags(tags, None)
+        return Mp3Inspection(tag_values, file_info)
+
+
+def _mp3_frame_header_parse(data: bytes) -> _Mp3FrameHeader | None:
+    if len(data) < 4 or data[0] != 0xFF or data[1] & 0xE0 != 0xE0:
+        return None
+    version_bits = (data[1] >> 3) & 0x03
+    layer_bits = (data[1] >> 1) & 0x03
+    bitrate_index = data[2] >> 4
+    sample_rate_index = (data[2] >> 2) & 0x03
+    # Reserved values, and free format bitrates that only a full parse can handle
+    if (
+        version_bits == 1
+        or layer_bits == 0
+        or bitrate_index in (0, 15)
+        or sample_rate_index == 3
+    ):
+        return None
+    layer = 4 - layer_bits
+    bitrate_bps = (
+        _MP3_BITRATES_KBPS[1 if version_bits == 3 else 2, layer][bitrate_index] * 1000
+    )
+    sample_rate = _MP3_SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (data[2] >> 1) & 0x01
+    if layer == 1:
+        length = (12 * bitrate_bps // sample_rate + padding) * 4
+    elif layer == 3 and version_bits != 3:
+        length = 72 * bitrate_bps // sample_rate + padding
+    else:
+        length = 144 * bitrate_bps // sample_rate + padding
+    return _Mp3FrameHeader(
+        version_bits, layer, bitrate_bps, sample_rate, data[3] >> 6, length
     )
 
 
+def _mp3_lame_tag_present(version: bytes) -> bool:
+    """Whether a LAME version string is followed by the extended tag that holds
+    the encoder delay and padding, following mutagen's version parsing"""
+    if len(version) < 20 or not version.startswith((b"LAME", b"L3.99")):
+        return False
+    rest = version.lstrip(b"EMAL")
+    major, rest = rest[:1], rest[1:].lstrip(b".")
+    minor = rest[: len(rest) - len(rest.lstrip(b"0123456789"))]
+    rest = rest[len(minor) :]
+    if not major.isdigit() or not minor:
+        return False
+    release = int(major), int(minor)
+    if release < (3, 90) or (release == (3, 90) and rest[-11:-10] == b"("):
+        return False
+    return len(rest) >= 11
+
+
+def _mp3_vbr_header_duration_get(
+    window: bytes, position: int, header: _Mp3FrameHeader
+) -> float | None:
+    """Duration from a Xing, Info or VBRI header in the first frame, computed the
+    way mutagen does"""
+    if header.layer != 3:
+        return None
+    if header.version_bits == 3:
+        xing_offset = 21 if header.mode == 3 else 36
+    else:
+        xing_offset = 13 if header.mode == 3 else 21
+    xing = position + xing_offset
+    if window[xing : xing + 4] in (b"Xing", b"Info"):
+        flags = int.from_bytes(window[xing + 4 : xing + 8])
+        if not flags & 0x01:
+            return None
+        samples = header.samples_per_frame * int.from_bytes(
+            window[xing + 8 : xing + 12]
+        )
+        lame = (
+            xing
+            + 8
+            + sum(
+                size
+                for flag, size in ((0x01, 4), (0x02, 4), (0x04, 100), (0x08, 4))
+                if flags & flag
+            )
+        )
+        if _mp3_lame_tag_present(window[lame : lame + 20]) and len(window) >= (
+            lame + 24
+        ):
+            delay_padding = int.from_bytes(window[lame + 21 : lame + 24])
+            samples -= (delay_padding >> 12) + (delay_padding & 0xFFF)
+        return max(samples, 0) / header.sample_rate
+    vbri = position + 36
+    # mutagen ignores a VBRI header whose table of contents it cannot read
+    toc_entry_size = int.from_bytes(window[vbri + 22 : vbri + 24])
+    toc_size = toc_entry_size * int.from_bytes(window[vbri + 18 : vbri + 20])
+    if (
+        window[vbri : vbri + 4] == b"VBRI"
+        and int.from_bytes(window[vbri + 4 : vbri + 6]) == 1
+        and toc_entry_size in (2, 4)
+        and len(window) >= vbri + 26 + toc_size
+    ):
+        frames = int.from_bytes(window[vbri + 14 : vbri + 18])
+        return header.samples_per_frame * frames / header.sample_rate
+    return None
+
+
+def _mp3_duration_from_window(
+    window: bytes, audio_offset: int, file_size: int
+) -> float | None:
+    at_end_of_file = audio_offset + len(window) >= file_size
+    position = window.find(b"\xff")
+    while position != -1:
+        header = _mp3_frame_header_parse(window[position : position + 4])
+        if header is not None:
+            duration_seconds = _mp3_vbr_header_duration_get(window, position, header)
+            if duration_seconds is not None:
+                return duration_seconds
+            bitrates = {header.bitrate_bps}
+            frame_count = 1
+            next_position = position + header.length
+            while frame_count < 4:
+                next_header = _mp3_frame_header_parse(
+                    window[next_position : next_position + 4]
+                )
+                if next_header is None or (
+                    next_header.version_bits,
+                    next_header.layer,
+                    next_header.sample_rate,
+                ) != (header.version_bits, header.layer, header.sample_rate):
+                    break
+                bitrates.add(next_header.bitrate_bps)
+                frame_count += 1
+                next_position += next_header.length
+            if frame_count == 4 or (
+                frame_count >= 2 and at_end_of_file and next_position >= len(window)
+            ):
+                # Frames of different sizes without a VBR header are ambiguous
+                if len(bitrates) > 1:
+                    return None
+                content_size = file_size - audio_offset - position
+                return 8 * content_size / header.bitrate_bps
+            if next_position + 4 > len(window) and not at_end_of_file:
+                return None
+        position = window.find(b"\xff", position + 1)
+    return None
+
+
+def mp3_duration_seconds_estimate(filename: str | pathlib.Path) -> float | None:
+    """Estimate the duration from the ID3 header size and the first few frames
+
+    Only MP3_ESTIMATE_WINDOW_BYTES of audio are read. A Xing, Info or VBRI frame
+    count is used when present, otherwise the duration is worked out from the
+    file size and the constant bitrate, which is what mutagen does too. Files
+    that cannot be settled from that window, such as free format streams or
+    VBR streams without a header, fall back to a full mutagen parse."""
+    try:
+        with pathlib.Path(filename).open("rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            audio_offset = 0
+            # Some encoders stack more than one ID3v2 tag
+            while True:
+                f.seek(audio_offset)
+                id3_header = f.read(10)
+                if len(id3_header) < 10 or id3_header[:3] != b"ID3":
+                    break
+                id3_size = 0
+                for byte in id3_header[6:10]:
+                    id3_size = (id3_size << 7) | (byte & 0x7F)
+                footer_size = 10 if id3_header[5] & 0x10 else 0
+                audio_offset += 10 + id3_size + footer_size
+            f.seek(audio_offset)
+            window = f.read(MP3_ESTIMATE_WINDOW_BYTES)
+    except OSError as error:
+        log.warning("Unable to read MP3 duration from %s: %s", filename, error)
+        return None
+    duration_seconds = _mp3_duration_from_window(window, audio_offset, file_size)
+    if duration_seconds is None:
+        return mp3_duration_seconds_get(filename)
+    return duration_seconds
+
+
+def mp3_file_info_get(filename: str | pathlib.Path) -> Mp3FileInfo:
+    return mp3_inspect(filename).file_info
+
+
 def most_common_genre_get(tag_values: typing.Iterable[Mp3TagValues]) -> str:
     genre_counts: dict[str, int] = {}
     genre_labels: dict[str, str] = {}
@@ -100,44 +387,97 @@ def _text_frame_values(tags: mutagen.id3.ID3, frame_id: str) -> tuple[str, ...]:
 
 
 def mp3_duration_seconds_get(filename: str | pathlib.Path) -> float | None:
-    try:
-        mp3 = mutagen.mp3.MP3(filename)
-    except (mutagen.MutagenError, OSError) as error:
-        log.warning("Unable to read MP3 duration from %s: %s", filename, error)
-        return None
-    return mp3.info.length if mp3.info is not None else None
+    return mp3_inspect(filename).tag_values.duration_seconds
 
 
 def id3_tag_values_get(filename: str | pathlib.Path) -> Mp3TagValues:
-    duration_seconds = mp3_duration_seconds_get(filename)
+    return mp3_inspect(filename).tag_values
+
+
+def mp3_metadata_read(
+    filename: str | pathlib.Path,
+) -> tuple[Mp3TagValues, Mp3FileInfo]:
+    inspection = mp3_inspect(filename)
+    return inspection.tag_values, inspection.file_info
+
+
+def _map_files[T](
+    read: typing.Callable[[pathlib.Path], T],
+    filenames: typing.Iterable[pathlib.Path],
+    max_workers: int,
+) -> dict[pathlib.Path, T]:
+    filenames = list(filenames)
+    if len(filenames) < 2:
+        return {filename: read(filename) for filename in filenames}
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(max_workers, len(filenames))
+    ) as executor:
+        return dict(zip(filenames, executor.map(read, filenames), strict=True))
+
+
+def mp3_metadata_read_many(
+    filenames: typing.Iterable[pathlib.Path],
+    max_workers: int = MP3_READ_MAX_WORKERS,
+) -> dict[pathlib.Path, tuple[Mp3TagValues, Mp3FileInfo]]:
+    """Read tags, duration and bitrate for many files, parsing up to max_workers
+    files at once; parsing is mostly waiting on disk or network storage"""
+    return _map_files(mp3_metadata_read, filenames, max_workers)
+
+
+def mp3_duration_seconds_estimate_many(
+    filenames: typing.Iterable[pathlib.Path],
+    max_workers: int = MP3_READ_MAX_WORKERS,
+) -> dict[pathlib.Path, float | None]:
+    return _map_files(mp3_duration_seconds_estimate, filenames, max_workers)
+
+
+def _id3v2_header_size(header: bytes) -> int:
+    """Size of the ID3v2 tag starting with header, header included but not any
+    footer; 0 when header does not start a tag"""
+    if len(header) < 10 or not header.startswith(b"ID3"):
+        return 0
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    return size + 10
+
+
+def mp3_audio_hash_read(f: typing.BinaryIO) -> str:
+    """SHA-256 of everything between the ID3v2 tag and any ID3v1 tag, so
+    copies of the same audio match however they are tagged"""
+    header = f.read(10)
+    start = _id3v2_header_size(header)
+    if start and header[5] & 0x10:
+        # A footer repeats the header after the frames
+        start += 10
+    end = f.seek(0, os.SEEK_END)
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b"TAG":
+            end -= 128
+    f.seek(start)
+    digest = hashlib.sha256()
+    remaining = max(end - start, 0)
+    while remaining and (chunk := f.read(min(remaining, 1024 * 1024))):
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def mp3_audio_hash_get(filename: str | pathlib.Path) -> str | None:
     try:
-        tags = mutagen.id3.ID3(filename)
-    except mutagen.id3.ID3NoHeaderError:
-        return Mp3TagValues(
-            error="No ID3 tags found.",
-            duration_seconds=duration_seconds,
-        )
-    except (mutagen.MutagenError, OSError) as error:
-        log.warning("Unable to read ID3 tags from %s: %s", filename, error)
-        return Mp3TagValues(
-            error="Could not read ID3 tags.",
-            duration_seconds=duration_seconds,
-        )
+        with open(filename, "rb") as f:
+            return mp3_audio_hash_read(f)
+    except OSError as error:
+        log.warning("Unable to hash %s: %s", filename, error)
+        return None
 
-    www = tuple(
-        url
-        for frame in tags.getall("WXXX")
-        if (url := str(getattr(frame, "url", "")).strip())
-    )
-    return Mp3TagValues(
-        album=_text_frame_values(tags, "TALB"),
-        title=_text_frame_values(tags, "TIT2"),
-        artist=_text_frame_values(tags, "TPE1"),
-        genre=_text_frame_values(tags, "TCON"),
-        www=www,
-        comment=_text_frame_values(tags, "COMM"),
-        duration_seconds=duration_seconds,
-    )
+
+def mp3_audio_hash_get_many(
+    filenames: typing.Iterable[pathlib.Path],
+    max_workers: int = MP3_READ_MAX_WORKERS,
+) -> dict[pathlib.Path, str | None]:
+    return _map_files(mp3_audio_hash_get, filenames, max_workers)
 
 
 def _id3_tag_value_set(tags: mutagen.id3.ID3, tag_name: str, value: str) -> None:
@@ -167,6 +507,127 @@ def _id3_tag_value_set(tags: mutagen.id3.ID3, tag_name: str, value: str) -> None
             tags.add(mutagen.id3.COMM(encoding=3, text=[value]))
 
 
+def _id3_tag_value_matches(tags: mutagen.id3.ID3, tag_name: str, value: str) -> bool:
+    """Whether the raw frames are exactly what _id3_tag_value_set would write,
+    so whitespace or blank duplicate frames still count as a change"""
+    frame_id = {
+        "album": "TALB",
+        "title": "TIT2",
+        "artist": "TPE1",
+        "genre": "TCON",
+        "www": "WXXX",
+        "comment": "COMM",
+    }[tag_name]
+    frames = tags.getall(frame_id)
+    if not value:
+        return not frames
+    if len(frames) != 1:
+        return False
+    if frame_id == "WXXX":
+        return frames[0].url == value
+    return [str(text) for text in frames[0].text] == [value]
+
+
+@dataclasses.dataclass(frozen=True)
+class Id3SaveStats:
+    """Totals for tag saves since the app started. bytes_total is the size of
+    every saved file, what the saves would have cost as full rewrites."""
+
+    saves: int = 0
+    saves_in_place: int = 0
+    bytes_written: int = 0
+    bytes_total: int = 0
+
+
+_id3_save_stats = Id3SaveStats()
+_id3_save_stats_lock = threading.Lock()
+
+
+def id3_save_stats_get() -> Id3SaveStats:
+    return _id3_save_stats
+
+
+class _Id3TagGrowsError(Exception):
+    def __init__(self, shortfall: int) -> None:
+        super().__init__(shortfall)
+        self.shortfall = shortfall
+
+
+def _id3_padding_in_place(info: mutagen.PaddingInfo) -> int:
+    """Padding callback that keeps the tag at its current size, so mutagen
+    overwrites it without moving the audio that follows"""
+    if info.padding < 0:
+        raise _Id3TagGrowsError(-info.padding)
+    return info.padding
+
+
+def _id3v2_size_get(filename: pathlib.Path) -> int:
+    """Size of the ID3v2 tag at the start of filename, header included"""
+    with filename.open("rb") as f:
+        return _id3v2_header_size(f.read(10))
+
+
+def _id3_tags_rewrite(
+    tags: mutagen.id3.ID3, filename: pathlib.Path, tag_size: int, shortfall: int
+) -> int:
+    """Write a copy of filename whose tag has room for the frames plus
+    ID3_PADDING_BYTES, then rename it over the original so readers never see a
+    half-written file"""
+    size = tag_size + shortfall + ID3_PADDING_BYTES - 10
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    with tempfile.NamedTemporaryFile(
+        dir=filename.parent, prefix=f".{filename.name}.", suffix=".tmp", delete=False
+    ) as temp:
+        temp_path = pathlib.Path(temp.name)
+    try:
+        with filename.open("rb") as source, temp_path.open("r+b") as target:
+            # An empty tag of the final size, which the save below fills in place
+            target.write(b"ID3\x04\x00\x00" + syncsafe + bytes(size))
+            source.seek(tag_size)
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        tags.save(temp_path, padding=_id3_padding_in_place)
+        shutil.copymode(filename, temp_path)
+        with temp_path.open("rb") as target:
+            os.fsync(target.fileno())
+        temp_path.replace(filename)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return filename.stat().st_size
+
+
+def _id3_tags_save(tags: mutagen.id3.ID3, filename: str | pathlib.Path) -> int:
+    """Save tags to filename, rewriting the file only when the frames no longer
+    fit in the existing tag; returns the number of bytes written"""
+    global _id3_save_stats
+    filename = pathlib.Path(filename)
+    tag_size = _id3v2_size_get(filename)
+    try:
+        tags.save(filename, padding=_id3_padding_in_place)
+    except _Id3TagGrowsError as grows:
+        written = _id3_tags_rewrite(tags, filename, tag_size, grows.shortfall)
+        in_place = False
+    else:
+        written = tag_size
+        in_place = True
+    file_size = filename.stat().st_size
+    log.debug(
+        "Saved ID3 tags in %s %s: %d of %d bytes written",
+        filename,
+        "in place" if in_place else "by rewriting the file",
+        written,
+        file_size,
+    )
+    with _id3_save_stats_lock:
+        _id3_save_stats = Id3SaveStats(
+            saves=_id3_save_stats.saves + 1,
+            saves_in_place=_id3_save_stats.saves_in_place + in_place,
+            bytes_written=_id3_save_stats.bytes_written + written,
+            bytes_total=_id3_save_stats.bytes_total + file_size,
+        )
+    return written
+
+
 def _id3_tag_values_set(
     filename: str | pathlib.Path,
     values: typing.Mapping[str, str],
@@ -183,7 +644,7 @@ def _id3_tag_values_set(
 
         for tag_name, value in values.items():
             _id3_tag_value_set(tags, tag_name, value)
-        tags.save(filename)
+        _id3_tags_save(tags, filename)
     except (mutagen.MutagenError, OSError) as error:
         log.error("Unable to update ID3 tags in %s: %s", filename, error)
         raise ValueError(error_message) from error
@@ -204,6 +665,90 @@ def id3_tag_values_set(
     _id3_tag_values_set(filename, {tag_name: value}, "Could not update the ID3 tag.")
 
 
+@dataclasses.dataclass(frozen=True)
+class Id3TagBatchResult:
+    """Outcome of id3_tag_values_set_many; metadata holds the tags and file info
+    after the batch for every file that did not fail"""
+
+    metadata: dict[pathlib.Path, tuple[Mp3TagValues, Mp3FileInfo]]
+    written: tuple[pathlib.Path, ...]
+    unchanged: tuple[pathlib.Path, ...]
+    errors: dict[pathlib.Path, str]
+
+
+def _id3_tag_values_update(
+    filename: pathlib.Path, values: typing.Mapping[str, str]
+) -> tuple[tuple[Mp3TagValues, Mp3FileInfo], bool]:
+    try:
+        audio = mutagen.mp3.MP3(filename)
+    except mutagen.mp3.HeaderNotFoundError:
+        audio = None
+    if audio is not None:
+        if audio.tags is None:
+            audio.add_tags()
+        tags = audio.tags
+        duration_seconds = audio.info.length
+        bitrate = getattr(audio.info, "bitrate", None)
+        bitrate_bps = int(bitrate) if bitrate is not None else None
+    else:
+        # Without readable audio frames the ID3 tags can still be written
+        try:
+            tags = mutagen.id3.ID3(filename)
+        except mutagen.id3.ID3NoHeaderError:
+            tags = mutagen.id3.ID3()
+        duration_seconds = None
+        bitrate_bps = None
+
+    current = _id3_tag_values_from_tags(tags, duration_seconds)
+    changes = {
+        tag_name: value
+        for tag_name, value in values.items()
+        if not _id3_tag_value_matches(tags, tag_name, value)
+    }
+    if changes:
+        for tag_name, value in changes.items():
+            _id3_tag_value_set(tags, tag_name, value)
+        _id3_tags_save(tags, filename)
+        current = _id3_tag_values_from_tags(tags, duration_seconds)
+    file_info = Mp3FileInfo(
+        file_size_bytes=filename.stat().st_size, bitrate_bps=bitrate_bps
+    )
+    return (current, file_info), bool(changes)
+
+
+def id3_tag_values_set_many(
+    changes: typing.Mapping[pathlib.Path, typing.Mapping[str, str]],
+    max_workers: int = MP3_READ_MAX_WORKERS,
+) -> Id3TagBatchResult:
+    """Apply tag changes to many files in parallel, each with one parse and at
+    most one save. Files whose tags already match are not written."""
+    for values in changes.values():
+        if any(tag_name not in ID3_TAG_LABELS for tag_name in values):
+            msg = "Choose a valid ID3 tag."
+            raise ValueError(msg)
+
+    def update(
+        filename: pathlib.Path,
+    ) -> tuple[tuple[Mp3TagValues, Mp3FileInfo], bool] | str:
+        try:
+            return _id3_tag_values_update(filename, changes[filename])
+        except (mutagen.MutagenError, OSError) as error:
+            log.error("Unable to update ID3 tags in %s: %s", filename, error)
+            return str(error)
+
+    metadata = {}
+    written = []
+    unchanged = []
+    errors = {}
+    for filename, outcome in _map_files(update, changes, max_workers).items():
+        if isinstance(outcome, str):
+            errors[filename] = outcome
+            continue
+        metadata[filename], was_written = outcome
+        (written if was_written else unchanged).append(filename)
+    return Id3TagBatchResult(metadata, tuple(written), tuple(unchanged), errors)
+
+
 # Special characters sorted by results of ord()
 # {
 #  '²': 178,
@@ -335,28 +880,37 @@ def filename_normalizations_get(
     )
 
 
+def rename_artist_in_file(
+    filename: str | pathlib.Path, old_name: str, new_name: str
+) -> bool:
+    """Replace old_name in the comma-separated artist tag; returns False when the
+    file does not credit old_name"""
+    tags = mutagen.id3.ID3(filename)
+    artist_frames = tags.getall("TPE1")
+    if not artist_frames or not artist_frames[0].text:
+        return False
+    artists = [artist.strip() for artist in artist_frames[0].text[0].split(",")]
+    changed = False
+    for index, artist in enumerate(artists):
+        if artist == old_name:
+            artists[index] = new_name
+            changed = True
+    if not changed:
+        return False
+    tags.delall("TPE1")
+    tags.add(mutagen.id3.TPE1(encoding=3, text=[", ".join(artists)]))
+    _id3_tags_save(tags, filename)
+    log.info(f"Renamed artist {old_name!r} to {new_name!r} in {filename}")
+    return True
+
+
 def rename_artist(
     mp3s: typing.Iterable[str | pathlib.Path], old_name: str, new_name: str
 ) -> list[Exception]:
     errors: list[Exception] = []
     for mp3 in mp3s:
         try:
-            tags = mutagen.id3.ID3(mp3)
-            artist_frames = tags.getall("TPE1")
-            if not artist_frames or not artist_frames[0].text:
-                continue
-            artists = [artist.strip() for artist in artist_frames[0].text[0].split(",")]
-            changed = False
-            for index, artist in enumerate(artists):
-                if artist == old_name:
-                    artists[index] = new_name
-                    changed = True
-            if not changed:
-                continue
-            tags.delall("TPE1")
-            tags.add(mutagen.id3.TPE1(encoding=3, text=[", ".join(artists)]))
-            tags.save(mp3)
-            log.info(f"Renamed artist {old_name!r} to {new_name!r} in {mp3}")
+            rename_artist_in_file(mp3, old_name, new_name)
         except (mutagen.MutagenError, OSError) as e:
             log.error(f"Unable to rename artist in {mp3}: {e}")
             errors.append(e)
@@ -398,17 +952,69 @@ def set_tags(filename: str, **kwargs: str) -> str:
             if tag_value:
                 md.add(mutagen.id3.WXXX(encoding=0, url=tag_value))
     try:
-        md.save(filename)
+        _id3_tags_save(md, filename)
         log.info(f"Updated tags for {filename}")
-    except mutagen.MutagenError as e:
+    except (mutagen.MutagenError, OSError) as e:
         log.error(e)
         result = str(e)
     return result
 
 
-def yield_all(starting_dir: pathlib.Path) -> typing.Iterator[pathlib.Path]:
-    for child in starting_dir.iterdir():
-        if child.is_dir():
-            yield from yield_all(child)
-        elif child.suffix.lower() == ".mp3":
-            yield child
+def _scan_mp3_files(
+    starting_dir: pathlib.Path,
+    include: typing.Iterable[str | pathlib.Path] | None,
+    exclude: typing.Iterable[str | pathlib.Path],
+) -> typing.Iterator[os.DirEntry]:
+    """Walk the tree without recursion, pruning excluded folders before they are
+    opened; include and exclude paths are relative to starting_dir unless they
+    are absolute"""
+    excluded = {os.path.normpath(starting_dir / path) for path in exclude}
+    if include is None:
+        pending = [os.path.normpath(starting_dir)]
+    else:
+        pending = [os.path.normpath(starting_dir / path) for path in include]
+    pending = [directory for directory in pending if directory not in excluded]
+    pending.reverse()
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirectories = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if entry.path not in excluded:
+                                subdirectories.append(entry.path)
+                        elif entry.name.lower().endswith(".mp3"):
+                            yield entry
+                    except OSError as error:
+                        log.warning("Unable to read %s: %s", entry.path, error)
+        except OSError as error:
+            log.warning("Unable to read folder %s: %s", directory, error)
+            continue
+        pending.extend(reversed(subdirectories))
+
+
+def yield_all(
+    starting_dir: pathlib.Path,
+    *,
+    include: typing.Iterable[str | pathlib.Path] | None = None,
+    exclude: typing.Iterable[str | pathlib.Path] = (),
+) -> typing.Iterator[pathlib.Path]:
+    for entry in _scan_mp3_files(starting_dir, include, exclude):
+        yield pathlib.Path(entry.path)
+
+
+def yield_all_with_stat(
+    starting_dir: pathlib.Path,
+    *,
+    include: typing.Iterable[str | pathlib.Path] | None = None,
+    exclude: typing.Iterable[str | pathlib.Path] = (),
+) -> typing.Iterator[Mp3FileEntry]:
+    for entry in _scan_mp3_files(starting_dir, include, exclude):
+        try:
+            stat = entry.stat()
+        except OSError as error:
+            log.warning("Unable to read %s: %s", entry.path, error)
+            continue
+        yield Mp3FileEntry(pathlib.Path(entry.path), stat.st_size, stat.st_mtime_ns)
@@ -1,15 +1,51 @@
 import datetime
 import enum
+import logging
 import os
 import pathlib
+import threading
+import time
+from collections.abc import Iterator
 from typing import TypedDict, cast
 
 import flask
 import fort
 import htpy
 
+from rainwave_library.models import cursors
+from rainwave_library.models.watcher import library_watcher
+
+log = logging.getLogger(__name__)
+
 art_dir = pathlib.Path("/var/www/rainwave.cc/album_art")
 
+RATING_AGGREGATE_MAX_AGE_SECONDS_DEFAULT = 300
+RATING_AGGREGATE_FULL_REFRESH_SECONDS = 24 * 60 * 60
+# Ratings can commit after ratings with a later song_rated_at, so incremental
+# refreshes look back at least this far past the previous watermark
+RATING_AGGREGATE_WATERMARK_OVERLAP_SECONDS = 60
+# How long a read waits for the first build once the refresh thread is started
+RATING_AGGREGATE_LOAD_WAIT_SECONDS = 60
+SEARCH_INDEX_CHECK_SECONDS = 300
+# Trigram indexes on the lowercased search text of each table, by index name.
+# Songs are searched with the song index and the album name index together.
+SEARCH_INDEXES: dict[str, tuple[str, tuple[str, ...]]] = {
+    "library_search_albums": ("r4_albums", ("album_name", "album_name_searchable")),
+    "library_search_album_names": ("r4_albums", ("album_name",)),
+    "library_search_artists": (
+        "r4_artists",
+        ("artist_name", "artist_name_searchable"),
+    ),
+    "library_search_songs": (
+        "r4_songs",
+        ("song_title", "song_artist_tag", "song_filename", "song_url"),
+    ),
+    "library_search_listeners": (
+        "phpbb_users",
+        ("radio_username", "username", "discord_user_id::text"),
+    ),
+}
+
 
 class UserGroup(enum.IntEnum):
     ANONYMOUS = 1
@@ -97,6 +133,466 @@ def connection_get(dsn: str) -> fort.PostgresDatabase:
     return fort.PostgresDatabase(dsn, maxconn=5)
 
 
+class RatingAggregates:
+    """Per-song raw rating count and average, kept in process.
+
+    Once started, a background thread builds the aggregate from r4_song_ratings
+    and refreshes it every max_age_seconds, recomputing only songs with a
+    rating cast since the last refresh, less an overlap of max_age_seconds (at
+    least RATING_AGGREGATE_WATERMARK_OVERLAP_SECONDS) for ratings that commit
+    late. A full rebuild runs every full_refresh_seconds so deleted ratings are
+    eventually dropped. Reads only look up the last values, also while a
+    refresh runs; only reads made before the first build has finished wait
+    for it, and if that build failed they refresh the aggregate themselves.
+
+    Without start(), such as in scripts, reads refresh the aggregate themselves
+    when it is older than max_age_seconds."""
+
+    def __init__(
+        self,
+        max_age_seconds: float = RATING_AGGREGATE_MAX_AGE_SECONDS_DEFAULT,
+        full_refresh_seconds: float = RATING_AGGREGATE_FULL_REFRESH_SECONDS,
+    ) -> None:
+        self.max_age_seconds = max_age_seconds
+        self.full_refresh_seconds = full_refresh_seconds
+        self._aggregates: dict[int, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._refreshed_at: float | None = None
+        self._rebuilt_at: float | None = None
+        self._watermark: int | None = None
+
+    def get(self, db: fort.PostgresDatabase, song_id: int) -> tuple[int, float]:
+        if self._thread is not None:
+            self._loaded.wait(RATING_AGGREGATE_LOAD_WAIT_SECONDS)
+        if self._thread is None or self._refreshed_at is None:
+            # Not started, or the first build failed
+            self.refresh_if_stale(db)
+        return self._aggregates.get(song_id, (0, 0))
+
+    def start(self, db: fort.PostgresDatabase) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(db,), name="rating-aggregates", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, db: fort.PostgresDatabase) -> None:
+        while True:
+            with self._lock:
+                try:
+                    self._refresh(db)
+                except Exception:
+                    log.exception("Unable to refresh song rating aggregates")
+            self._loaded.set()
+            if self._stop.wait(self.max_age_seconds):
+                return
+
+    def refresh_if_stale(self, db: fort.PostgresDatabase) -> None:
+        refreshed_at = self._refreshed_at
+        if (
+            refreshed_at is not None
+            and time.monotonic() - refreshed_at < self.max_age_seconds
+        ):
+            return
+        with self._lock:
+            refreshed_at = self._refreshed_at
+            if (
+                refreshed_at is not None
+                and time.monotonic() - refreshed_at < self.max_age_seconds
+            ):
+                return
+            try:
+                self._refresh(db)
+            except Exception:
+                if self._refreshed_at is None:
+                    raise
+                log.exception("Unable to refresh song rating aggregates")
+                self._refreshed_at = time.monotonic()
+
+    def _refresh(self, db: fort.PostgresDatabase) -> None:
+        """Rebuild or update the aggregate. The watermark is the latest
+        song_rated_at among the rows read, so no query scans the table only to
+        find it."""
+        now = time.monotonic()
+        if (
+            self._watermark is None
+            or self._rebuilt_at is None
+            or now - self._rebuilt_at >= self.full_refresh_seconds
+        ):
+            sql = """
+                select
+                    song_id,
+                    count(*) raw_rating_count,
+                    avg(song_rating_user) raw_rating_avg,
+                    max(song_rated_at) rated_at
+                from r4_song_ratings
+                where song_rating_user is not null
+                group by song_id
+            """
+            rows = db.q(sql)
+            # Built aside and swapped in, so reads see the old values until then
+            self._aggregates = {
+                row["song_id"]: (row["raw_rating_count"], row["raw_rating_avg"])
+                for row in rows
+            }
+            watermark = max((row["rated_at"] or 0 for row in rows), default=0)
+            self._rebuilt_at = now
+            log.info("Rebuilt rating aggregates for %d songs", len(self._aggregates))
+        else:
+            # Served by an index on r4_song_ratings (song_rated_at), see README
+            sql = """
+                with changed as (
+                    select song_id, max(song_rated_at) rated_at
+                    from r4_song_ratings
+                    where song_rated_at >= %(since)s
+                    group by song_id
+                )
+                select
+                    c.song_id,
+                    c.rated_at,
+                    count(r.song_rating_user) raw_rating_count,
+                    coalesce(avg(r.song_rating_user), 0) raw_rating_avg
+                from changed c
+                left join r4_song_ratings r
+                    on r.song_id = c.song_id and r.song_rating_user is not null
+                group by c.song_id, c.rated_at
+            """
+            overlap = max(
+                self.max_age_seconds, RATING_AGGREGATE_WATERMARK_OVERLAP_SECONDS
+            )
+            rows = db.q(sql, {"since": self._watermark - int(overlap)})
+            for row in rows:
+                if row["raw_rating_count"]:
+                    self._aggregates[row["song_id"]] = (
+                        row["raw_rating_count"],
+                        row["raw_rating_avg"],
+                    )
+                else:
+                    self._aggregates.pop(row["song_id"], None)
+            watermark = max(
+                (row["rated_at"] or 0 for row in rows), default=self._watermark
+            )
+            watermark = max(watermark, self._watermark)
+            log.debug("Refreshed rating aggregates for %d songs", len(rows))
+        self._watermark = watermark
+        self._refreshed_at = now
+
+
+rating_aggregates = RatingAggregates()
+
+
+class ArtIndex:
+    """Names in the album art directory, grouped by album id.
+
+    Art files are named like a_123_320.jpg. The directory is scanned once and
+    scanned again only when its mtime changes, which happens whenever a file is
+    added, removed or renamed. While the library watcher covers the directory
+    the mtime is not checked at all; the watcher calls invalidate() instead."""
+
+    def __init__(self, directory: pathlib.Path) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._mtime_ns: int | None = None
+        self._names: frozenset[str] = frozenset()
+        self._by_album: dict[str, list[str]] = {}
+
+    def exists(self, name: str) -> bool:
+        self.refresh_if_changed()
+        return name in self._names
+
+    def files(self, album_id: int) -> list[pathlib.Path]:
+        self.refresh_if_changed()
+        return [self.directory / n for n in self._by_album.get(str(album_id), [])]
+
+    def invalidate(self, changed: frozenset[pathlib.Path]) -> None:
+        directory = self.directory.resolve()
+        if any(directory.is_relative_to(path) for path in changed):
+            with self._lock:
+                self._mtime_ns = None
+
+    def refresh_if_changed(self) -> None:
+        if self._mtime_ns is not None and library_watcher.covers(self.directory):
+            return
+        try:
+            mtime_ns = self.directory.stat().st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if mtime_ns == self._mtime_ns and self._mtime_ns is not None:
+            return
+        with self._lock:
+            if mtime_ns == self._mtime_ns and self._mtime_ns is not None:
+                return
+            names = set()
+            by_album: dict[str, list[str]] = {}
+            if mtime_ns is not None:
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        names.add(entry.name)
+                        # Same files as glob(f"*_{album_id}_*")
+                        for token in set(entry.name.split("_")[1:-1]):
+                            by_album.setdefault(token, []).append(entry.name)
+            for album_names in by_album.values():
+                album_names.sort()
+            self._names = frozenset(names)
+            self._by_album = by_album
+            self._mtime_ns = mtime_ns
+            log.debug("Indexed %d album art files", len(names))
+
+
+art_index = ArtIndex(art_dir)
+library_watcher.subscribe(art_index.invalidate)
+
+
+def _search_text(columns: tuple[str, ...], alias: str | None = None) -> str:
+    """The lowercased concat_ws(' ', columns) of a row, written with operators
+    that postgres allows in an index expression"""
+    prefix = f"{alias}." if alias else ""
+    parts = " || ".join(f"coalesce(' ' || {prefix}{c}, '')" for c in columns)
+    return f"lower(substr({parts}, 2))"
+
+
+class SearchIndexes:
+    """Detects and creates the trigram indexes in SEARCH_INDEXES.
+
+    Searches use an index when it exists and is valid, and fall back to a
+    position() test over the same text otherwise, so both forms match the same
+    rows. The list of valid indexes is read again every
+    SEARCH_INDEX_CHECK_SECONDS."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._checked_at: float | None = None
+        self._valid: frozenset[str] = frozenset()
+
+    def present(self, db: fort.PostgresDatabase, name: str) -> bool:
+        checked_at = self._checked_at
+        if checked_at is None or time.monotonic() - checked_at >= (
+            SEARCH_INDEX_CHECK_SECONDS
+        ):
+            with self._lock:
+                checked_at = self._checked_at
+                if checked_at is None or time.monotonic() - checked_at >= (
+                    SEARCH_INDEX_CHECK_SECONDS
+                ):
+                    try:
+                        self._valid = frozenset(self._get(db)[0])
+                    except Exception:
+                        log.exception("Unable to check search indexes")
+                    self._checked_at = time.monotonic()
+        return name in self._valid
+
+    def _get(self, db: fort.PostgresDatabase) -> tuple[set[str], set[str]]:
+        """The names of valid and invalid search indexes"""
+        rows = db.q(
+            """
+            select c.relname, i.indisvalid
+            from pg_index i
+            join pg_class c on c.oid = i.indexrelid
+            where c.relname = any(%(names)s)
+            """,
+            {"names": list(SEARCH_INDEXES)},
+        )
+        valid = {row["relname"] for row in rows if row["indisvalid"]}
+        invalid = {row["relname"] for row in rows if not row["indisvalid"]}
+        return valid, invalid
+
+    def ensure(self, db: fort.PostgresDatabase) -> None:
+        """Create pg_trgm and every missing index without blocking writes to
+        the tables. An index left invalid by an earlier failed build is dropped
+        and built again."""
+        valid, invalid = self._get(db)
+        statements = ["create extension if not exists pg_trgm"]
+        for name, (table, columns) in SEARCH_INDEXES.items():
+            if name in valid:
+                continue
+            if name in invalid:
+                statements.append(f"drop index concurrently if exists {name}")
+            statements.append(
+                f"create index concurrently if not exists {name} on {table} "
+                f"using gin ({_search_text(columns)} gin_trgm_ops)"
+            )
+        # Concurrent index builds cannot run inside a transaction
+        cnx = db.p.getconn()
+        try:
+            cnx.autocommit = True
+            with cnx.cursor() as c:
+                for statement in statements:
+                    log.info("Search indexes: %s", statement)
+                    c.execute(statement)
+        finally:
+            cnx.autocommit = False
+            db.p.putconn(cnx)
+        with self._lock:
+            self._checked_at = None
+
+    def start(self, db: fort.PostgresDatabase) -> None:
+        """Run ensure() in a background thread, since building the indexes can
+        take a while on a large library"""
+        threading.Thread(
+            target=self._ensure_logged, args=(db,), name="search-indexes", daemon=True
+        ).start()
+
+    def _ensure_logged(self, db: fort.PostgresDatabase) -> None:
+        try:
+            self.ensure(db)
+        except Exception:
+            log.exception("Unable to create search indexes")
+        else:
+            log.info("Search indexes are ready")
+
+
+search_indexes = SearchIndexes()
+
+
+def _search_clause(db: fort.PostgresDatabase, index: str, alias: str) -> str:
+    """Return a where condition for rows of the aliased table whose search text
+    contains the query, using the trigram index when it is there"""
+    _, columns = SEARCH_INDEXES[index]
+    if search_indexes.present(db, index):
+        return f"{_search_text(columns, alias)} like lower(%(query_like)s)"
+    text_sql = ", ".join(f"{alias}.{c}" for c in columns)
+    return f"position(lower(%(query)s) in lower(concat_ws(' ', {text_sql}))) > 0"
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _search_params(query: str | None) -> dict:
+    if not query:
+        return {}
+    return {"query_like": f"%{_like_escape(query)}%"}
+
+
+def _songs_search_clause(db: fort.PostgresDatabase, query: str) -> str:
+    """Return a where condition for songs whose album name, title, artist tag,
+    filename or URL, joined with spaces, contain the query.
+
+    The text spans two tables, so with the indexes it is tested in parts: the
+    album name, the song columns, and for each space in the query the album
+    name ending before it with the song columns starting after it."""
+    _, song_columns = SEARCH_INDEXES["library_search_songs"]
+    if not (
+        search_indexes.present(db, "library_search_songs")
+        and search_indexes.present(db, "library_search_album_names")
+    ):
+        text_sql = ", ".join(
+            ["a.album_name", *(f"s.{column}" for column in song_columns)]
+        )
+        return f"position(lower(%(query)s) in lower(concat_ws(' ', {text_sql}))) > 0"
+    album_text = _search_text(("album_name",), "sa")
+    song_text = _search_text(song_columns, "ss")
+    song_present = " or ".join(f"ss.{column} is not null" for column in song_columns)
+    selects = [
+        f"""
+        select ss.song_id
+        from r4_songs ss
+        where {song_text} like lower(%(query_like)s)
+        """,  # noqa: S608
+        f"""
+        select ss.song_id
+        from r4_albums sa
+        join r4_songs ss on ss.album_id = sa.album_id
+        where {album_text} like lower(%(query_like)s)
+        """,  # noqa: S608
+    ]
+    selects.extend(
+        f"""
+        select ss.song_id
+        from r4_albums sa
+        join r4_songs ss on ss.album_id = sa.album_id
+        where sa.album_name is not null
+            and ({song_present})
+            and {album_text} like lower(%(query_album_{i})s)
+            and {song_text} like lower(%(query_song_{i})s)
+        """  # noqa: S608
+        for i in range(query.count(" "))
+    )
+    return f"s.song_id in ({' union all '.join(selects)})"
+
+
+def _songs_search_params(query: str | None) -> dict:
+    """The album name ending and song text beginning for each way the query can
+    span the space between them"""
+    if not query:
+        return {}
+    params = {}
+    spaces = [i for i, character in enumerate(query) if character == " "]
+    for i, space in enumerate(spaces):
+        params[f"query_album_{i}"] = f"%{_like_escape(query[:space])}"
+        params[f"query_song_{i}"] = f"{_like_escape(query[space + 1 :])}%"
+    return params
+
+
+def _song_from_row(db: fort.PostgresDatabase, row: dict) -> "Song":
+    song_data = dict(row)
+    raw_rating_count, raw_rating_avg = rating_aggregates.get(db, song_data["song_id"])
+    song_data["raw_rating_count"] = raw_rating_count
+    song_data["raw_rating_avg"] = raw_rating_avg
+    return Song(cast(SongDict, cast(object, song_data)))
+
+
+def cursor_decode(
+    cursor: str | None, sort_col: str, sort_dir: str
+) -> tuple[str | int | float | None, int] | None:
+    """Return the (sort value, id) a page ended on, or None if the cursor is not
+    usable with the current sort"""
+    values = cursors.cursor_decode(cursor, sort_col, sort_dir)
+    if values is None or len(values) != 2:
+        return None
+    sort_value, row_id = values
+    if not isinstance(row_id, int):
+        return None
+    return sort_value, row_id
+
+
+def _keyset_clause(
+    sort_key: str,
+    sort_dir: str,
+    id_col: str,
+    sort_value: str | int | float | None,
+    sort_type: str | None = None,
+) -> str:
+    """Build a where clause that seeks past the row a page ended on
+
+    The clause matches an order by of sort_key sort_dir, id_col asc, with nulls
+    sorting last for asc and first for desc like postgres does by default. The
+    caller supplies %(cursor_value)s and %(cursor_id)s. Pass the column type as
+    sort_type for real columns: the cursor holds the shortest decimal for the
+    value, which only compares equal once it is cast back to real."""
+    value = (
+        "%(cursor_value)s" if sort_type is None else f"%(cursor_value)s::{sort_type}"
+    )
+    if sort_key == id_col:
+        op = ">" if sort_dir == "asc" else "<"
+        return f"{id_col} {op} %(cursor_id)s"
+    if sort_dir == "asc":
+        if sort_value is None:
+            return f"{sort_key} is null and {id_col} > %(cursor_id)s"
+        return f"""(
+            {sort_key} > {value}
+            or ({sort_key} = {value} and {id_col} > %(cursor_id)s)
+            or {sort_key} is null
+        )"""
+    if sort_value is None:
+        return f"({sort_key} is not null or {id_col} > %(cursor_id)s)"
+    return f"""(
+        {sort_key} < {value}
+        or ({sort_key} = {value} and {id_col} > %(cursor_id)s)
+    )"""
+
+
 def length_display(length: int) -> str:
     """Convert number of seconds to mm:ss format"""
     minutes, seconds = divmod(length, 60)
@@ -106,6 +602,7 @@ def length_display(length: int) -> str:
 class AlbumDict(TypedDict):
     album_id: int
     album_name: str
+    cursor: str
     song_count: int
 
 
@@ -122,8 +619,7 @@ class Album:
 
     @property
     def art_files(self) -> list[pathlib.Path]:
-        pattern = f"*_{self.id}_*"
-        return sorted(pathlib.Path(art_dir).glob(pattern))
+        return art_index.files(self.id)
 
     @property
     def art_table(self) -> htpy.Element:
@@ -148,6 +644,10 @@ class Album:
             ],
         ]
 
+    @property
+    def cursor(self) -> str | None:
+        return cursors.cursor_encode(self.data.get("cursor"))
+
     @property
     def detail_table(self) -> htpy.Element:
         return htpy.table(".align-middle.d-block.table")[
@@ -195,6 +695,7 @@ class Album:
 class ArtistDict(TypedDict):
     artist_id: int
     artist_name: str
+    cursor: str
     song_count: int
 
 
@@ -209,6 +710,10 @@ class Artist:
     def __init__(self, artist_data: ArtistDict) -> None:
         self.data = artist_data
 
+    @property
+    def cursor(self) -> str | None:
+        return cursors.cursor_encode(self.data.get("cursor"))
+
     @property
     def id(self) -> int:
         return self.data.get("artist_id")
@@ -255,6 +760,7 @@ class Artist:
 
 
 class ListenerDict(TypedDict):
+    cursor: str
     discord_user_id: int
     group_name: str
     is_discord_user: bool
@@ -283,6 +789,10 @@ class Listener:
     def __init__(self, listener_data: ListenerDict) -> None:
         self.data = listener_data
 
+    @property
+    def cursor(self) -> str | None:
+        return cursors.cursor_encode(self.data.get("cursor"))
+
     @property
     def detail_table(self) -> htpy.Element:
         return htpy.table(".align-middle.d-block.table")[
@@ -401,6 +911,7 @@ class Listener:
 class SongDict(TypedDict):
     album_name: str
     channels: list[int]
+    cursor: str
     raw_rating_avg: float
     raw_rating_count: int
     song_added_on: int
@@ -469,6 +980,10 @@ class Song:
     def channel_ids(self) -> list[int]:
         return self.data.get("channels")
 
+    @property
+    def cursor(self) -> str | None:
+        return cursors.cursor_encode(self.data.get("cursor"))
+
     @property
     def details_hint(self) -> str:
         return f"Details: {self.album_name} / {self.title}"
@@ -769,6 +1284,26 @@ def get_album(db: fort.PostgresDatabase, album_id: int) -> Album:
     return Album(cast(AlbumDict, cast(object, row)))
 
 
+def get_album_by_name(db: fort.PostgresDatabase, album_name: str) -> Album | None:
+    sql = """
+        select a.album_id, a.album_name
+        from r4_albums a
+        where a.album_name = %(album_name)s
+        order by
+            exists (
+                select 1
+                from r4_songs s
+                where s.album_id = a.album_id and s.song_verified is true
+            ) desc,
+            a.album_id
+        limit 1
+    """
+    row = db.q_one(sql, {"album_name": album_name})
+    if row is None:
+        return None
+    return Album(cast(AlbumDict, cast(object, row)))
+
+
 def album_name_exists(
     db: fort.PostgresDatabase,
     album_name: str,
@@ -792,19 +1327,8 @@ def album_name_exists(
 
 def get_album_songs(db: fort.PostgresDatabase, album_id: int) -> list[Song]:
     sql = """
-        with r as (
-            select
-                song_id,
-                count(*) raw_rating_count,
-                avg(song_rating_user) raw_rating_avg
-            from r4_song_ratings
-            where song_rating_user is not null
-            group by song_id
-        )
         select
             a.album_name,
-            coalesce(r.raw_rating_avg, 0) as raw_rating_avg,
-            coalesce(r.raw_rating_count, 0) as raw_rating_count,
             s.song_artist_tag,
             s.song_filename,
             s.song_id,
@@ -817,13 +1341,12 @@ def get_album_songs(db: fort.PostgresDatabase, album_id: int) -> list[Song]:
             s.song_url
         from r4_songs s
         join r4_albums a on a.album_id = s.album_id and s.album_id = %(album_id)s
-        left join r on r.song_id = s.song_id
         where song_verified is true
         order by song_id asc
     """
     params = {"album_id": album_id}
     rows = db.q(sql, params)
-    return [Song(r) for r in cast(list[SongDict], cast(object, rows))]
+    return [_song_from_row(db, r) for r in rows]
 
 
 def get_albums(
@@ -832,47 +1355,64 @@ def get_albums(
     page: int = 1,
     sort_col: str = "album_id",
     sort_dir: str = "asc",
+    cursor: str | None = None,
 ) -> list[Album]:
     where_clause = "s.song_verified is true"
     if query:
+        search_clause = _search_clause(db, "library_search_albums", "a")
         where_clause = f"""
             {where_clause}
-            and position(
-                lower(%(query)s) in concat_ws(
-                    ' ',
-                    lower(a.album_name),
-                    lower(a.album_name_searchable)
-                )
-            ) > 0
+            and {search_clause}
         """
 
     if sort_dir not in ("asc", "desc"):
         sort_dir = "asc"
     if sort_col not in ("album_id", "album_name", "song_count"):
         sort_col = "album_id"
+    sort_key = sort_col
     if sort_col == "album_name":
-        sort_clause = f'{sort_col} collate "C" {sort_dir}'
-    else:
-        sort_clause = f"{sort_col} {sort_dir}"
+        sort_key = f'{sort_col} collate "C"'
+    sort_clause = f"{sort_key} {sort_dir}"
     if sort_col != "album_id":
         sort_clause = f"{sort_clause}, album_id asc"
 
+    keyset_clause = "true"
+    cursor_value, cursor_id = None, None
+    seek = cursor_decode(cursor, sort_col, sort_dir)
+    if seek is not None:
+        cursor_value, cursor_id = seek
+        keyset_clause = _keyset_clause(sort_key, sort_dir, "album_id", cursor_value)
+        page = 1
+
     limit_clause = ""
     if page > 0:
         limit_clause = "limit 101 offset %(offset)s"
 
     sql = f"""
-        select a.album_id, a.album_name collate "C", count(*) song_count
-        from r4_songs s
-        join r4_albums a on a.album_id = s.album_id
-        where {where_clause}
-        group by a.album_id, a.album_name
+        select
+            t.*,
+            json_build_array(
+                %(sort_col)s, %(sort_dir)s, t.{sort_col}, t.album_id
+            )::text as cursor
+        from (
+            select a.album_id, a.album_name collate "C", count(*) song_count
+            from r4_songs s
+            join r4_albums a on a.album_id = s.album_id
+            where {where_clause}
+            group by a.album_id, a.album_name
+        ) t
+        where {keyset_clause}
         order by {sort_clause}
         {limit_clause}
     """  # noqa: S608
     params = {
+        "cursor_id": cursor_id,
+        "cursor_value": cursor_value,
         "offset": 100 * (page - 1),
         "query": query,
+        "sort_col": sort_col,
+        "sort_dir": sort_dir,
+        **_search_params(query),
     }
     rows = db.q(sql, params)
     return [Album(r) for r in cast(list[AlbumDict], cast(object, rows))]
@@ -889,21 +1429,21 @@ def song_count(db: fort.PostgresDatabase) -> int:
 
 def get_albums_missing_art(db: fort.PostgresDatabase) -> list[Album]:
     sql = """
-        select album_id, album_name
-        from r4_songs
-            join r4_albums using (album_id)
-            where song_verified is true
-            order by album_name
+        select a.album_id, a.album_name
+        from r4_albums a
+        where exists (
+            select 1
+            from r4_songs s
+            where s.album_id = a.album_id and s.song_verified is true
+        )
+        order by a.album_name
     """
     rows = db.q(sql)
-    result = []
-    for row in rows:
-        row = cast(AlbumDict, cast(object, row))
-        album_id = row.get("album_id")
-        album_fn = f"a_{album_id}_120.jpg"
-        if not art_dir.joinpath(album_fn).exists():
-            result.append(Album(row))
-    return result
+    return [
+        Album(row)
+        for row in cast(list[AlbumDict], cast(object, rows))
+        if not art_index.exists(f"a_{row.get('album_id')}_120.jpg")
+    ]
 
 
 def get_artists(
@@ -912,47 +1452,61 @@ def get_artists(
     page: int = 1,
     sort_col: str = "artist_id",
     sort_dir: str = "asc",
+    cursor: str | None = None,
 ) -> list[Artist]:
     where_clause = "true"
     if query:
-        where_clause = """
-            position(
-                lower(%(query)s) in concat_ws(
-                    ' ',
-                    lower(a.artist_name),
-                    lower(a.artist_name_searchable)
-                )
-            ) > 0
-        """
+        where_clause = _search_clause(db, "library_search_artists", "a")
 
     if sort_dir not in ("asc", "desc"):
         sort_dir = "asc"
     if sort_col not in ("artist_id", "artist_name", "song_count"):
         sort_col = "artist_id"
+    sort_key = sort_col
     if sort_col == "artist_name":
-        sort_clause = f'{sort_col} collate "C" {sort_dir}'
-    else:
-        sort_clause = f"{sort_col} {sort_dir}"
+        sort_key = f'{sort_col} collate "C"'
+    sort_clause = f"{sort_key} {sort_dir}"
     if sort_col != "artist_id":
         sort_clause = f"{sort_clause}, artist_id asc"
 
+    keyset_clause = "true"
+    cursor_value, cursor_id = None, None
+    seek = cursor_decode(cursor, sort_col, sort_dir)
+    if seek is not None:
+        cursor_value, cursor_id = seek
+        keyset_clause = _keyset_clause(sort_key, sort_dir, "artist_id", cursor_value)
+        page = 1
+
     sql = f"""
         select
-            a.artist_id,
-            a.artist_name collate "C",
-            count(s.song_id) song_count
-        from r4_artists a
-        join r4_song_artist sa on sa.artist_id = a.artist_id
-        join r4_songs s
-            on s.song_id = sa.song_id and s.song_verified is true
-        where {where_clause}
-        group by a.artist_id, a.artist_name
+            t.*,
+            json_build_array(
+                %(sort_col)s, %(sort_dir)s, t.{sort_col}, t.artist_id
+            )::text as cursor
+        from (
+            select
+                a.artist_id,
+                a.artist_name collate "C",
+                count(s.song_id) song_count
+            from r4_artists a
+            join r4_song_artist sa on sa.artist_id = a.artist_id
+            join r4_songs s
+                on s.song_id = sa.song_id and s.song_verified is true
+            where {where_clause}
+            group by a.artist_id, a.artist_name
+        ) t
+        where {keyset_clause}
         order by {sort_clause}
         limit 101 offset %(offset)s
     """  # noqa: S608
     params = {
+        "cursor_id": cursor_id,
+        "cursor_value": cursor_value,
         "offset": 100 * (page - 1),
         "query": query,
+        "sort_col": sort_col,
+        "sort_dir": sort_dir,
+        **_search_params(query),
     }
     rows = db.q(sql, params)
     return [Artist(row) for row in cast(list[ArtistDict], cast(object, rows))]
@@ -998,19 +1552,8 @@ def get_artist_by_name(db: fort.PostgresDatabase, artist_name: str) -> Artist |
 
 def get_artist_songs(db: fort.PostgresDatabase, artist_id: int) -> list[Song]:
     sql = """
-        with r as (
-            select
-                song_id,
-                count(*) raw_rating_count,
-                avg(song_rating_user) raw_rating_avg
-            from r4_song_ratings
-            where song_rating_user is not null
-            group by song_id
-        )
         select
             a.album_name,
-            coalesce(r.raw_rating_avg, 0) as raw_rating_avg,
-            coalesce(r.raw_rating_count, 0) as raw_rating_count,
             s.song_artist_tag,
             s.song_filename,
             s.song_id,
@@ -1025,12 +1568,11 @@ def get_artist_songs(db: fort.PostgresDatabase, artist_id: int) -> list[Song]:
         join r4_songs s
             on s.song_id = sa.song_id and s.song_verified is true
         join r4_albums a on a.album_id = s.album_id
-        left join r on r.song_id = s.song_id
         where sa.artist_id = %(artist_id)s
         order by a.album_name collate "C", s.song_title collate "C", s.song_id
     """
     rows = db.q(sql, {"artist_id": artist_id})
-    return [Song(row) for row in cast(list[SongDict], cast(object, rows))]
+    return [_song_from_row(db, row) for row in rows]
 
 
 def get_category_for_album(db: fort.PostgresDatabase, album_name: str) -> str | None:
@@ -1144,15 +1686,14 @@ def get_listeners(
     ranks: list[int] | None = None,
     sort_col: str = "user_id",
     sort_dir: str = "asc",
+    cursor: str | None = None,
 ) -> list[Listener]:
     where_clause = "u.user_type <> 2 and u.user_id > 1"
     if query:
+        search_clause = _search_clause(db, "library_search_listeners", "u")
         where_clause = f"""
             {where_clause}
-            and position(
-                lower(%(query)s) in
-                lower(concat_ws(' ', u.radio_username, u.username, u.discord_user_id))
-            ) > 0
+            and {search_clause}
         """
     if ranks:
         where_clause = f"""
@@ -1173,6 +1714,13 @@ def get_listeners(
     sort_clause = f"{sort_col} {sort_dir}"
     if sort_col != "user_id":
         sort_clause = f"{sort_clause}, user_id asc"
+    keyset_clause = "true"
+    cursor_value, cursor_id = None, None
+    seek = cursor_decode(cursor, sort_col, sort_dir)
+    if seek is not None:
+        cursor_value, cursor_id = seek
+        keyset_clause = _keyset_clause(sort_col, sort_dir, "user_id", cursor_value)
+        page = 1
     sql = f"""
         with c as (
             select user_id, count(*) rating_count
@@ -1209,13 +1757,27 @@ def get_listeners(
         left join phpbb_ranks r on r.rank_id = u.user_rank
         left join c on c.user_id = u.user_id
         where {where_clause}
+    """  # noqa: S608
+    sql = f"""
+        select
+            t.*,
+            json_build_array(
+                %(sort_col)s, %(sort_dir)s, t.{sort_col}, t.user_id
+            )::text as cursor
+        from ({sql}) t
+        where {keyset_clause}
         order by {sort_clause}
         limit 101 offset %(offset)s
     """  # noqa: S608
     params = {
+        "cursor_id": cursor_id,
+        "cursor_value": cursor_value,
         "offset": 100 * (page - 1),
         "query": query,
         "ranks": ranks,
+        "sort_col": sort_col,
+        "sort_dir": sort_dir,
+        **_search_params(query),
     }
     rows = db.q(sql, params)
     return [Listener(r) for r in cast(list[ListenerDict], cast(object, rows))]
@@ -1249,20 +1811,9 @@ def get_song(db: fort.PostgresDatabase, song_id: int) -> Song:
             from r4_song_group s
             join r4_groups g on g.group_id = s.group_id
             group by s.song_id
-        ),
-        r as (
-            select
-                song_id,
-                count(*) raw_rating_count,
-                avg(song_rating_user) raw_rating_avg
-            from r4_song_ratings
-            where song_rating_user is not null
-            group by song_id
         )
         select
             a.album_name,
-            coalesce(r.raw_rating_avg, 0) as raw_rating_avg,
-            coalesce(r.raw_rating_count, 0) as raw_rating_count,
             s.song_added_on,
             s.song_artist_tag,
             s.song_fave_count,
@@ -1281,14 +1832,15 @@ def get_song(db: fort.PostgresDatabase, song_id: int) -> Song:
         from r4_songs s
         join r4_albums a on a.album_id = s.album_id
         left join g on g.song_id = s.song_id
-        left join r on r.song_id = s.song_id
         where s.song_id = %(song_id)s
     """
     params = {
         "song_id": song_id,
     }
     row = db.q_one(sql, params)
-    return Song(cast(SongDict, cast(object, row)))
+    if row is None:
+        return Song(cast(SongDict, cast(object, row)))
+    return _song_from_row(db, row)
 
 
 def get_song_filenames(db: fort.PostgresDatabase) -> dict:
@@ -1300,32 +1852,24 @@ def get_song_filenames(db: fort.PostgresDatabase) -> dict:
     return {r.get("song_filename"): r.get("song_verified") for r in db.q(sql)}
 
 
-def get_songs(
+def _songs_query(
     db: fort.PostgresDatabase,
-    query: str | None = None,
-    page: int = 1,
-    sort_col: str = "song_id",
-    sort_dir: str = "asc",
-    channels: list[int] | None = None,
-    include_unrated: bool = True,
-    verified: bool = True,
-) -> list[Song]:
+    query: str | None,
+    page: int,
+    sort_col: str,
+    sort_dir: str,
+    channels: list[int] | None,
+    include_unrated: bool,
+    verified: bool,
+    cursor: str | None,
+) -> tuple[str, dict]:
     where_clause = "s.song_verified = %(verified)s"
 
     if query:
+        search_clause = _songs_search_clause(db, query)
         where_clause = f"""
             {where_clause}
-            and position(
-                lower(%(query)s) in
-                lower(concat_ws(
-                    ' ',
-                    a.album_name,
-                    s.song_title,
-                    s.song_artist_tag,
-                    s.song_filename,
-                    s.song_url
-                ))
-            ) > 0
+            and {search_clause}
         """
 
     if not include_unrated:
@@ -1353,13 +1897,27 @@ def get_songs(
         "song_url",
     ):
         sort_col = "song_id"
+    sort_key = sort_col
     if sort_col in ("album_name", "song_filename", "song_title"):
-        sort_clause = f'{sort_col} collate "C" {sort_dir}'
-    else:
-        sort_clause = f"{sort_col} {sort_dir}"
+        sort_key = f'{sort_col} collate "C"'
+    sort_clause = f"{sort_key} {sort_dir}"
     if sort_col != "song_id":
         sort_clause = f"{sort_clause}, song_id asc"
 
+    keyset_clause = "true"
+    cursor_value, cursor_id = None, None
+    seek = cursor_decode(cursor, sort_col, sort_dir)
+    if seek is not None:
+        cursor_value, cursor_id = seek
+        keyset_clause = _keyset_clause(
+            sort_key,
+            sort_dir,
+            "song_id",
+            cursor_value,
+            "real" if sort_col == "song_rating" else None,
+        )
+        page = 1
+
     limit_clause = ""
     if page > 0:
         limit_clause = "limit 101 offset %(offset)s"
@@ -1376,21 +1934,10 @@ def get_songs(
             from r4_song_group s
             join r4_groups g on g.group_id = s.group_id
             group by s.song_id
-        ),
-        r as (
-            select
-                song_id,
-                count(*) raw_rating_count,
-                avg(song_rating_user) raw_rating_avg
-            from r4_song_ratings
-            where song_rating_user is not null
-            group by song_id
         )
         select
             a.album_name,
             c.channels,
-            coalesce(r.raw_rating_avg, 0) as raw_rating_avg,
-            coalesce(r.raw_rating_count, 0) as raw_rating_count,
             to_timestamp(s.song_added_on) as song_added_on,
             s.song_artist_tag,
             s.song_filename,
@@ -1408,19 +1955,79 @@ def get_songs(
         join r4_albums a on a.album_id = s.album_id
         left join c on c.song_id = s.song_id
         left join g on g.song_id = s.song_id
-        left join r on r.song_id = s.song_id
         where {where_clause}
+    """  # noqa: S608
+    sql = f"""
+        select
+            t.*,
+            json_build_array(
+                %(sort_col)s, %(sort_dir)s, t.{sort_col}, t.song_id
+            )::text as cursor
+        from ({sql}) t
+        where {keyset_clause}
         order by {sort_clause}
         {limit_clause}
     """  # noqa: S608
     params = {
         "channels": channels,
+        "cursor_id": cursor_id,
+        "cursor_value": cursor_value,
         "offset": 100 * (page - 1),
         "query": query,
+        "sort_col": sort_col,
+        "sort_dir": sort_dir,
         "verified": verified,
+        **_search_params(query),
+        **_songs_search_params(query),
     }
+    return sql, params
+
+
+def get_songs(
+    db: fort.PostgresDatabase,
+    query: str | None = None,
+    page: int = 1,
+    sort_col: str = "song_id",
+    sort_dir: str = "asc",
+    channels: list[int] | None = None,
+    include_unrated: bool = True,
+    verified: bool = True,
+    cursor: str | None = None,
+) -> list[Song]:
+    sql, params = _songs_query(
+        db, query, page, sort_col, sort_dir, channels, include_unrated, verified, cursor
+    )
     rows = db.q(sql, params)
-    return [Song(r) for r in cast(list[SongDict], cast(object, rows))]
+    return [_song_from_row(db, r) for r in rows]
+
+
+def iter_songs(
+    db: fort.PostgresDatabase,
+    query: str | None = None,
+    sort_col: str = "song_id",
+    sort_dir: str = "asc",
+    channels: list[int] | None = None,
+    include_unrated: bool = True,
+    verified: bool = True,
+    batch_size: int = 1000,
+) -> Iterator[Song]:
+    """Yield every matching song without holding the whole result in memory
+
+    Rows come from a server-side cursor, batch_size rows at a time. The
+    connection stays checked out of the pool until the iterator is exhausted or
+    closed."""
+    sql, params = _songs_query(
+        db, query, 0, sort_col, sort_dir, channels, include_unrated, verified, None
+    )
+    cnx = db.p.getconn()
+    try:
+        with cnx, cnx.cursor(name="iter_songs") as c:
+            c.itersize = batch_size
+            c.execute(sql, params)
+            for row in c:
+                yield _song_from_row(db, row)
+    finally:
+        db.p.putconn(cnx)
 
 
 def set_discord_user_id(
@@ -0,0 +1,532 @@
+import collections
+import dataclasses
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import typing
+
+from rainwave_library.models.storage import connection_get
+
+log = logging.getLogger(__name__)
+
+# Folders under the library root that hold files Rainwave is not expected to
+# know about
+RECONCILIATION_EXCLUDED_FOLDERS = (
+    "xmas",
+    "podcast",
+    "~autoremoved",
+    "removed",
+    "~upcoming",
+    "metalgear",
+    "V-Wave Theme",
+    "staging",
+    "~misc",
+    "silence",
+)
+
+# Rescanned folders are written in short transactions, so a long scan does not
+# hold the storage write lock from other writers
+LIBRARY_SCAN_COMMIT_EVERY = 200
+LIBRARY_SCAN_COMMIT_SECONDS = 0.25
+
+_reconcile_lock = threading.Lock()
+
+
+@dataclasses.dataclass(frozen=True)
+class LibraryFileMove:
+    old_path: str
+    new_path: str
+
+
+@dataclasses.dataclass(frozen=True)
+class LibraryReconciliation:
+    scanned_at: str
+    duration_seconds: float
+    directories_total: int
+    directories_rescanned: int
+    files_total: int
+    orphans: tuple[str, ...]
+    disabled: tuple[str, ...]
+    missing: tuple[str, ...]
+    moved: tuple[LibraryFileMove, ...]
+
+
+@dataclasses.dataclass(frozen=True)
+class LibraryReconciliationRun:
+    status: str
+    full: bool
+    started_at: str
+    finished_at: str | None
+    error: str | None
+
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+
+
+@dataclasses.dataclass(frozen=True)
+class _LibraryScanStats:
+    directories_total: int
+    directories_rescanned: int
+
+
+@dataclasses.dataclass(frozen=True)
+class _LibraryScanDirectory:
+    path: str
+    parent: str | None
+    mtime_ns: int
+    files: tuple[tuple[str, str, int, int], ...]
+
+
+def _directory_list(
+    directory: str, parent: str | None, mtime_ns: int
+) -> tuple[_LibraryScanDirectory, list[str]]:
+    subdirectories = []
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    subdirectories.append(entry.path)
+                elif entry.name.lower().endswith(".mp3"):
+                    stat = entry.stat()
+                    files.append(
+                        (entry.path, directory, stat.st_size, stat.st_mtime_ns)
+                    )
+            except OSError as error:
+                log.warning("Unable to read %s: %s", entry.path, error)
+    scanned = _LibraryScanDirectory(directory, parent, mtime_ns, tuple(files))
+    return scanned, subdirectories
+
+
+def _library_scan_directories_put(
+    con: sqlite3.Connection, directories: list[_LibraryScanDirectory]
+) -> None:
+    try:
+        con.executemany(
+            "delete from library_scan_files where directory = ?",
+            [(directory.path,) for directory in directories],
+        )
+        con.executemany(
+            """
+            insert into library_scan_files (path, directory, size, mtime_ns)
+            values (?, ?, ?, ?)
+            """,
+            [file for directory in directories for file in directory.files],
+        )
+        con.executemany(
+            """
+            insert into library_scan_directories (path, parent, mtime_ns)
+            values (:path, :parent, :mtime_ns)
+            on conflict (path) do update set
+                parent = excluded.parent,
+                mtime_ns = excluded.mtime_ns
+            """,
+            [
+                {
+                    "path": directory.path,
+                    "parent": directory.parent,
+                    "mtime_ns": directory.mtime_ns,
+                }
+                for directory in directories
+            ],
+        )
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+
+def _library_scan(
+    con: sqlite3.Connection,
+    root: pathlib.Path,
+    exclude: typing.Iterable[str | pathlib.Path],
+    *,
+    full: bool,
+) -> _LibraryScanStats:
+    """Update the stored scan, listing only folders whose mtime changed
+
+    Adding, removing or renaming a file changes the mtime of its folder, so an
+    unchanged folder keeps its stored file list and only its subfolders are
+    visited. Rewriting a file in place does not change the folder mtime; use
+    full to refresh every stored size and mtime.
+
+    A folder that exists but cannot be read keeps its stored files and
+    subfolders, so a permission or I/O error does not report its songs as
+    missing.
+
+    Folders are listed without holding a transaction and written every
+    LIBRARY_SCAN_COMMIT_EVERY folders or LIBRARY_SCAN_COMMIT_SECONDS. Each
+    folder is written together with its files, so a scan that stops early
+    leaves the stored folders it did write correct and the next scan picks up
+    the rest."""
+    root_path = os.path.normpath(root)
+    excluded = {os.path.normpath(root / path) for path in exclude}
+    known = {
+        row["path"]: row["mtime_ns"]
+        for row in con.execute("select path, mtime_ns from library_scan_directories")
+    }
+    children = collections.defaultdict(list)
+    for row in con.execute(
+        "select path, parent from library_scan_directories where parent is not null"
+    ):
+        children[row["parent"]].append(row["path"])
+    # End the read transaction, so the scan holds no snapshot while it walks
+    con.commit()
+
+    seen = set()
+    rescanned = 0
+    listed: list[_LibraryScanDirectory] = []
+    flushed_at = time.monotonic()
+    pending: list[tuple[str, str | None]] = [(root_path, None)]
+    while pending:
+        directory, parent = pending.pop()
+        if directory in excluded or directory in seen:
+            continue
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        except OSError as error:
+            log.warning("Unable to read folder %s: %s", directory, error)
+            if directory in known:
+                seen.add(directory)
+                pending.extend((child, directory) for child in children[directory])
+            continue
+        seen.add(directory)
+        if not full and known.get(directory) == mtime_ns:
+            subdirectories = children[directory]
+        else:
+            try:
+                scanned, subdirectories = _directory_list(directory, parent, mtime_ns)
+            except (FileNotFoundError, NotADirectoryError):
+                seen.discard(directory)
+                continue
+            except OSError as error:
+                log.warning("Unable to read folder %s: %s", directory, error)
+                subdirectories = children[directory]
+            else:
+                rescanned += 1
+                listed.append(scanned)
+                if (
+                    len(listed) >= LIBRARY_SCAN_COMMIT_EVERY
+                    or time.monotonic() - flushed_at >= LIBRARY_SCAN_COMMIT_SECONDS
+                ):
+                    _library_scan_directories_put(con, listed)
+                    listed = []
+                    flushed_at = time.monotonic()
+        pending.extend((subdirectory, directory) for subdirectory in subdirectories)
+    _library_scan_directories_put(con, listed)
+
+    gone = [(path,) for path in known if path not in seen]
+    try:
+        con.executemany("delete from library_scan_files where directory = ?", gone)
+        con.executemany("delete from library_scan_directories where path = ?", gone)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return _LibraryScanStats(len(seen), rescanned)
+
+
+def _library_reconciliation_report(
+    con: sqlite3.Connection,
+    root: pathlib.Path,
+    known_filenames: dict[str, bool],
+    exclude: typing.Iterable[str | pathlib.Path],
+) -> tuple[
+    tuple[str, ...], tuple[str, ...], tuple[str, ...], tuple[tuple[str, str], ...]
+]:
+    on_disk = {
+        row["path"] for row in con.execute("select path from library_scan_files")
+    }
+    excluded = tuple(
+        os.path.join(os.path.normpath(root / path), "") for path in exclude
+    )
+    root_prefix = os.path.join(os.path.normpath(root), "")
+    orphans = sorted(on_disk.difference(known_filenames))
+    disabled = sorted(
+        path
+        for path in on_disk
+        if path in known_filenames and not known_filenames[path]
+    )
+    missing = sorted(
+        path
+        for path, verified in known_filenames.items()
+        if verified
+        and path not in on_disk
+        and path.startswith(root_prefix)
+        and not path.startswith(excluded)
+    )
+
+    # A missing song is taken to have moved when no other missing song and only
+    # one orphan share its file name; the pair is then only reported as a move
+    orphans_by_name = collections.defaultdict(list)
+    for path in orphans:
+        orphans_by_name[os.path.basename(path)].append(path)
+    missing_names = collections.Counter(os.path.basename(path) for path in missing)
+    moved = []
+    for path in missing:
+        name = os.path.basename(path)
+        candidates = orphans_by_name.get(name, [])
+        if missing_names[name] == 1 and len(candidates) == 1:
+            moved.append((path, candidates[0]))
+    moved_paths = {path for move in moved for path in move}
+    return (
+        tuple(path for path in orphans if path not in moved_paths),
+        tuple(disabled),
+        tuple(path for path in missing if path not in moved_paths),
+        tuple(moved),
+    )
+
+
+def library_reconcile(
+    con: sqlite3.Connection,
+    root: pathlib.Path,
+    known_filenames: dict[str, bool],
+    exclude: typing.Iterable[str | pathlib.Path] = RECONCILIATION_EXCLUDED_FOLDERS,
+    *,
+    full: bool = False,
+) -> LibraryReconciliation:
+    """Rescan changed folders under root and compare the files on disk with
+    known_filenames, a map of every Rainwave song filename to its verified flag"""
+    exclude = tuple(exclude)
+    with _reconcile_lock:
+        started = con.execute(
+            "select strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), unixepoch('subsec')"
+        ).fetchone()
+        stats = _library_scan(con, root, exclude, full=full)
+        orphans, disabled, missing, moved = _library_reconciliation_report(
+            con, root, known_filenames, exclude
+        )
+        # Only the findings and the summary are written in this transaction
+        con.commit()
+        try:
+            con.execute("delete from library_scan_findings")
+            con.executemany(
+                """
+                insert into library_scan_findings (kind, path, new_path)
+                values (?, ?, ?)
+                """,
+                [
+                    *(("orphan", path, None) for path in orphans),
+                    *(("disabled", path, None) for path in disabled),
+                    *(("missing", path, None) for path in missing),
+                    *(("moved", old_path, new_path) for old_path, new_path in moved),
+                ],
+            )
+            con.execute(
+                """
+                insert into library_scans (
+                    id, scanned_at, duration_seconds, directories_total,
+                    directories_rescanned, files_total
+                )
+                values (
+                    1, :scanned_at, unixepoch('subsec') - :started,
+                    :directories_total, :directories_rescanned,
+                    (select count(*) from library_scan_files)
+                )
+                on conflict (id) do update set
+                    scanned_at = excluded.scanned_at,
+                    duration_seconds = excluded.duration_seconds,
+                    directories_total = excluded.directories_total,
+                    directories_rescanned = excluded.directories_rescanned,
+                    files_total = excluded.files_total
+                """,
+                {
+                    "scanned_at": started[0],
+                    "started": started[1],
+                    "directories_total": stats.directories_total,
+                    "directories_rescanned": stats.directories_rescanned,
+                },
+            )
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+    reconciliation = library_reconciliation_get(con)
+    if reconciliation is None:
+        msg = "Library reconciliation was not saved"
+        raise RuntimeError(msg)
+    log.info(
+        "Reconciled %d files in %d folders (%d rescanned) in %.1f seconds",
+        reconciliation.files_total,
+        reconciliation.directories_total,
+        reconciliation.directories_rescanned,
+        reconciliation.duration_seconds,
+    )
+    return reconciliation
+
+
+def library_reconciliation_get(
+    con: sqlite3.Connection,
+) -> LibraryReconciliation | None:
+    """The result of the last reconciliation, without scanning anything"""
+    scan = con.execute(
+        """
+        select
+            scanned_at, duration_seconds, directories_total, directories_rescanned,
+            files_total
+        from library_scans
+        where id = 1
+        """
+    ).fetchone()
+    if scan is None:
+        return None
+    findings = collections.defaultdict(list)
+    for row in con.execute(
+        "select kind, path, new_path from library_scan_findings order by path"
+    ):
+        findings[row["kind"]].append(row)
+    return LibraryReconciliation(
+        scanned_at=scan["scanned_at"],
+        duration_seconds=scan["duration_seconds"],
+        directories_total=scan["directories_total"],
+        directories_rescanned=scan["directories_rescanned"],
+        files_total=scan["files_total"],
+        orphans=tuple(row["path"] for row in findings["orphan"]),
+        disabled=tuple(row["path"] for row in findings["disabled"]),
+        missing=tuple(row["path"] for row in findings["missing"]),
+        moved=tuple(
+            LibraryFileMove(row["path"], row["new_path"]) for row in findings["moved"]
+        ),
+    )
+
+
+def library_reconciliation_run_get(
+    con: sqlite3.Connection,
+) -> LibraryReconciliationRun | None:
+    """The state of the last reconciliation started from the web page"""
+    row = con.execute(
+        """
+        select status, full_scan, started_at, finished_at, error
+        from library_scan_runs
+        where id = 1
+        """
+    ).fetchone()
+    if row is None:
+        return None
+    return LibraryReconciliationRun(
+        status=row["status"],
+        full=bool(row["full_scan"]),
+        started_at=row["started_at"],
+        finished_at=row["finished_at"],
+        error=row["error"],
+    )
+
+
+def _library_reconciliation_run_finish(
+    con: sqlite3.Connection, status: str, error: str | None
+) -> None:
+    try:
+        con.execute(
+            """
+            update library_scan_runs
+            set
+                status = :status,
+                finished_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now'),
+                error = :error
+            where id = 1 and status = 'running'
+            """,
+            {"status": status, "error": error},
+        )
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+
+class LibraryReconciliationRunner:
+    """Runs library_reconcile() from a background thread, one run at a time, so
+    a scan of the whole library does not hold up a request.
+
+    The state of the run is kept in library_scan_runs for the page to poll. A
+    run that was still going when the app stopped is marked failed by start()."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._storage_path: str | None = None
+
+    def start(self, storage_path: str) -> None:
+        self._storage_path = storage_path
+        con = connection_get(storage_path)
+        try:
+            _library_reconciliation_run_finish(
+                con, "failed", "The app stopped before the scan finished."
+            )
+        finally:
+            con.close()
+
+    def submit(
+        self,
+        root: pathlib.Path,
+        known_filenames_get: typing.Callable[[], dict[str, bool]],
+        *,
+        full: bool = False,
+    ) -> bool:
+        """Start a run unless one is already going; known_filenames_get is called
+        from the background thread. Return whether a run was started."""
+        if self._storage_path is None:
+            msg = "LibraryReconciliationRunner.start() was not called"
+            raise RuntimeError(msg)
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            con = connection_get(self._storage_path)
+            try:
+                con.execute(
+                    """
+                    insert into library_scan_runs (id, status, full_scan, started_at)
+                    values (
+                        1, 'running', :full_scan,
+                        strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+                    )
+                    on conflict (id) do update set
+                        status = excluded.status,
+                        full_scan = excluded.full_scan,
+                        started_at = excluded.started_at,
+                        finished_at = null,
+                        error = null
+                    """,
+                    {"full_scan": int(full)},
+                )
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            finally:
+                con.close()
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(self._storage_path, root, known_filenames_get, full),
+                name="library-reconciliation",
+                daemon=True,
+            )
+            self._thread.start()
+        return True
+
+    def _run(
+        self,
+        storage_path: str,
+        root: pathlib.Path,
+        known_filenames_get: typing.Callable[[], dict[str, bool]],
+        full: bool,
+    ) -> None:
+        con = connection_get(storage_path)
+        try:
+            try:
+                library_reconcile(con, root, known_filenames_get(), full=full)
+            except Exception as e:
+                log.exception("Library reconciliation failed")
+                _library_reconciliation_run_finish(con, "failed", str(e))
+            else:
+                _library_reconciliation_run_finish(con, "completed", None)
+        finally:
+            con.close()
+
+
+library_reconciliation_runner = LibraryReconciliationRunner()
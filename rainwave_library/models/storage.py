@@ -1,6 +1,12 @@
+import collections
+import concurrent.futures
+import contextlib
 import dataclasses
 import datetime
 import enum
+import errno
+import fcntl
+import hashlib
 import json
 import logging
 import os
@@ -8,12 +14,19 @@ import pathlib
 import secrets
 import shutil
 import sqlite3
+import threading
+import time
 import typing
 
-import mutagen
-import mutagen.mp3
-
+from rainwave_library.models.mp3 import (
+    ID3_TAG_LABELS,
+    Mp3FileInfo,
+    Mp3TagValues,
+    mp3_duration_seconds_estimate_many,
+    mp3_metadata_read_many,
+)
 from rainwave_library.models.rainwave import ChannelRootFolder
+from rainwave_library.models.watcher import library_watcher
 
 log = logging.getLogger(__name__)
 
@@ -21,7 +34,20 @@ USER_COLOR_MODE_SETTING_KEY = "color-mode"
 USER_COLOR_MODES = ("light", "dark")
 USER_COLOR_MODE_DEFAULT = "light"
 USER_SUGGESTION_FILTERS_SETTING_KEY = "suggestion-filters"
+# Users whose settings are kept in memory for the per-request color mode
+USER_SETTINGS_CACHE_SIZE = 1024
+# Folders whose MP3 durations are kept in memory for the library browser
+MP3_DIRECTORY_DURATIONS_CACHE_SIZE = 4096
 LIBRARY_BROWSER_TEXT_PREVIEW_MAX_BYTES = 512 * 1024
+SUGGESTION_RELEASE_COPY_MAX_WORKERS = 4
+# Idle connections kept for each database and mode; extra ones are closed
+STORAGE_POOL_MAX_IDLE = 8
+STORAGE_READONLY_MMAP_BYTES = 256 * 1024 * 1024
+STORAGE_READONLY_CACHE_KIB = 64 * 1024
+SUGGESTION_UPLOAD_MAX_BYTES = 1024 * 1024 * 1024
+SUGGESTION_UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+# Partial uploads that have not grown for this long are removed
+SUGGESTION_UPLOAD_EXPIRE_SECONDS = 7 * 24 * 60 * 60
 _LIBRARY_BROWSER_AUDIO_TYPES = {".mp3": "audio/mpeg"}
 _LIBRARY_BROWSER_IMAGE_TYPES = {
     ".gif": "image/gif",
@@ -68,6 +94,16 @@ _LIBRARY_BROWSER_TEXT_SUFFIXES = frozenset(
 )
 
 
+@dataclasses.dataclass(frozen=True)
+class StoragePoolStats:
+    path: str
+    readonly: bool
+    opened: int
+    reused: int
+    idle: int
+    in_use: int
+
+
 @dataclasses.dataclass(frozen=True)
 class User:
     discord_id: str
@@ -121,6 +157,25 @@ class LibraryBrowserDirectory:
     entries: tuple[LibraryBrowserEntry, ...]
 
 
+@dataclasses.dataclass(frozen=True)
+class _Mp3DirectoryDuration:
+    """Total duration of the MP3s directly inside one folder, valid while the
+    folder mtime and the size and mtime of each MP3 in it are unchanged"""
+
+    mtime_ns: int
+    files_seconds: float
+    subdirectories: tuple[pathlib.Path, ...]
+    files: tuple[tuple[pathlib.Path, int, int], ...] = ()
+
+
+# Keyed by (root, directory); subtree totals are summed from these entries, so
+# a change deep in the tree only rescans the folder that changed
+_mp3_directory_durations: collections.OrderedDict[
+    tuple[pathlib.Path, pathlib.Path], _Mp3DirectoryDuration
+] = collections.OrderedDict()
+_mp3_directory_durations_lock = threading.Lock()
+
+
 def _library_browser_path_parts(relative_path: str) -> tuple[str, ...]:
     normalized_path = relative_path.replace("\\", "/").strip()
     path = pathlib.PurePosixPath(normalized_path)
@@ -177,48 +232,130 @@ def _library_browser_path_get(
     return root, resolved_candidate, parts
 
 
+def _mp3_directory_duration_get(
+    con: sqlite3.Connection,
+    directory: pathlib.Path,
+    root: pathlib.Path,
+) -> _Mp3DirectoryDuration:
+    with _mp3_directory_durations_lock:
+        cached = _mp3_directory_durations.get((root, directory))
+        if cached is not None:
+            _mp3_directory_durations.move_to_end((root, directory))
+    if cached is not None and library_watcher.covers(directory):
+        return cached
+    try:
+        mtime_ns = directory.stat().st_mtime_ns
+    except OSError as error:
+        log.warning(
+            "Unable to read folder %s while calculating MP3 duration: %s",
+            directory,
+            error,
+        )
+        return _Mp3DirectoryDuration(0, 0.0, ())
+    if cached is not None and _mp3_directory_duration_current(cached, mtime_ns):
+        return cached
+
+    mp3_files = []
+    subdirectories = []
+    try:
+        children = directory.iterdir()
+        for child in children:
+            try:
+                if child.is_symlink():
+                    continue
+                resolved_child = child.resolve(strict=True)
+                if not resolved_child.is_relative_to(root):
+                    continue
+                if resolved_child.is_dir():
+                    subdirectories.append(resolved_child)
+                elif (
+                    resolved_child.is_file()
+                    and resolved_child.suffix.casefold() == ".mp3"
+                ):
+                    stat = resolved_child.stat()
+                    mp3_files.append((resolved_child, stat.st_size, stat.st_mtime_ns))
+            except OSError as error:
+                log.warning(
+                    "Unable to read MP3 file %s: %s",
+                    child,
+                    error,
+                )
+    except OSError as error:
+        log.warning(
+            "Unable to read folder %s while calculating MP3 duration: %s",
+            directory,
+            error,
+        )
+        return _Mp3DirectoryDuration(mtime_ns, 0.0, ())
+    directory_duration = _Mp3DirectoryDuration(
+        mtime_ns,
+        sum(
+            duration_seconds or 0.0
+            for duration_seconds in mp3_durations_get(
+                con, [path for path, _, _ in mp3_files]
+            ).values()
+        ),
+        tuple(subdirectories),
+        tuple(mp3_files),
+    )
+    with _mp3_directory_durations_lock:
+        _mp3_directory_durations[root, directory] = directory_duration
+        _mp3_directory_durations.move_to_end((root, directory))
+        while len(_mp3_directory_durations) > MP3_DIRECTORY_DURATIONS_CACHE_SIZE:
+            _mp3_directory_durations.popitem(last=False)
+    return directory_duration
+
+
+def _mp3_directory_duration_current(
+    cached: _Mp3DirectoryDuration, mtime_ns: int
+) -> bool:
+    # Files rewritten in place keep the folder mtime, so each MP3 is checked too
+    if cached.mtime_ns != mtime_ns:
+        return False
+    for path, size, file_mtime_ns in cached.files:
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) != (size, file_mtime_ns):
+            return False
+    return True
+
+
+def _mp3_directory_durations_forget(directory: pathlib.Path) -> None:
+    with _mp3_directory_durations_lock:
+        for key in list(_mp3_directory_durations):
+            if key[1].is_relative_to(directory):
+                _mp3_directory_durations.pop(key, None)
+
+
+def _mp3_directory_durations_changed(changed: frozenset[pathlib.Path]) -> None:
+    # Folder mtimes miss files rewritten in place, so this also catches retags
+    for directory in changed:
+        _mp3_directory_durations_forget(directory)
+
+
+library_watcher.subscribe(_mp3_directory_durations_changed)
+
+
 def _mp3_duration_get(
+    con: sqlite3.Connection,
     directory: pathlib.Path,
     root: pathlib.Path,
 ) -> float:
     duration_seconds = 0.0
     pending_directories = [directory]
     while pending_directories:
-        current_directory = pending_directories.pop()
-        try:
-            children = current_directory.iterdir()
-            for child in children:
-                try:
-                    if child.is_symlink():
-                        continue
-                    resolved_child = child.resolve(strict=True)
-                    if not resolved_child.is_relative_to(root):
-                        continue
-                    if resolved_child.is_dir():
-                        pending_directories.append(resolved_child)
-                    elif (
-                        resolved_child.is_file()
-                        and resolved_child.suffix.casefold() == ".mp3"
-                    ):
-                        mp3 = mutagen.mp3.MP3(resolved_child)
-                        if mp3.info is not None:
-                            duration_seconds += mp3.info.length
-                except (mutagen.MutagenError, OSError) as error:
-                    log.warning(
-                        "Unable to read MP3 file %s: %s",
-                        child,
-                        error,
-                    )
-        except OSError as error:
-            log.warning(
-                "Unable to read folder %s while calculating MP3 duration: %s",
-                current_directory,
-                error,
-            )
+        directory_duration = _mp3_directory_duration_get(
+            con, pending_directories.pop(), root
+        )
+        duration_seconds += directory_duration.files_seconds
+        pending_directories.extend(directory_duration.subdirectories)
     return duration_seconds
 
 
 def upcoming_music_date_mp3_duration_get(
+    con: sqlite3.Connection,
     library_root: pathlib.Path,
     release_date: str,
 ) -> float:
@@ -243,10 +380,11 @@ def upcoming_music_date_mp3_duration_get(
     ):
         msg = "The upcoming music date path is not a folder."
         raise ValueError(msg)
-    return _mp3_duration_get(resolved_date_directory, root)
+    return _mp3_duration_get(con, resolved_date_directory, root)
 
 
 def library_browser_directory_get(
+    con: sqlite3.Connection,
     library_root: pathlib.Path,
     browser_root: LibraryBrowserRoot,
     relative_path: str = "",
@@ -297,7 +435,7 @@ def library_browser_directory_get(
                     is_text=(not is_directory and _library_browser_file_is_text(child)),
                     size=None if is_directory else resolved_child.stat().st_size,
                     duration_seconds=(
-                        _mp3_duration_get(resolved_child, root)
+                        _mp3_duration_get(con, resolved_child, root)
                         if is_directory and browser_root.calculate_mp3_duration
                         else None
                     ),
@@ -499,6 +637,194 @@ def suggestion_release_target_get(
     return destination
 
 
+@dataclasses.dataclass(frozen=True)
+class SuggestionRelease:
+    destination: str
+    # Relative path and SHA-256 of every copied file; empty when the staging
+    # folder was moved instead
+    manifest: tuple[tuple[str, str], ...]
+    duration_seconds: float
+
+
+def _file_data_copy(source_fd: int, target_fd: int, size: int) -> None:
+    """Copy without passing the data through Python: share the blocks when the
+    filesystem supports reflinks, otherwise copy inside the kernel"""
+    try:
+        fcntl.ioctl(target_fd, fcntl.FICLONE, source_fd)
+    except OSError:
+        pass
+    else:
+        return
+    offset = 0
+    # Not every platform build has copy_file_range
+    copy_file_range = getattr(os, "copy_file_range", None)
+    try:
+        while copy_file_range is not None and offset < size:
+            copied = copy_file_range(
+                source_fd, target_fd, size - offset, offset, offset
+            )
+            if not copied:
+                break
+            offset += copied
+    except OSError as error:
+        # Older kernels cannot copy between filesystems, and some filesystems
+        # such as FUSE and overlayfs refuse copy_file_range
+        if error.errno not in (
+            errno.EXDEV,
+            errno.ENOSYS,
+            errno.EOPNOTSUPP,
+            errno.EINVAL,
+            errno.ETXTBSY,
+        ):
+            raise
+    os.lseek(target_fd, offset, os.SEEK_SET)
+    while offset < size:
+        copied = os.sendfile(target_fd, source_fd, offset, size - offset)
+        if not copied:
+            break
+        offset += copied
+    if offset != size:
+        msg = f"Copied {offset} of {size} bytes"
+        raise OSError(errno.EIO, msg)
+
+
+def _path_fsync(path: pathlib.Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _suggestion_release_file_copy(source: pathlib.Path, target: pathlib.Path) -> str:
+    """Copy source to target and return the SHA-256 of source.
+
+    The copy is not read back; the kernel copy reports its length, the size of
+    the copy is checked, and the caller flushes it to disk before using it."""
+    with source.open("rb") as source_file, target.open("xb") as target_file:
+        size = os.fstat(source_file.fileno()).st_size
+        _file_data_copy(source_file.fileno(), target_file.fileno(), size)
+        if os.fstat(target_file.fileno()).st_size != size:
+            msg = f"The copy of {source} is not {size} bytes"
+            raise OSError(errno.EIO, msg)
+        sha256 = hashlib.file_digest(source_file, "sha256").hexdigest()
+    shutil.copystat(source, target)
+    return sha256
+
+
+def _suggestion_release_copy(
+    source: pathlib.Path, destination: pathlib.Path
+) -> tuple[tuple[str, str], ...]:
+    """Copy source into destination like copytree with dirs_exist_ok, several
+    files at a time.
+
+    Files are copied to temporary names and only renamed into place once every
+    copy has been flushed to disk. Files already in destination are moved aside
+    before they are replaced and put back if any rename fails, so a failed
+    release leaves no partial files and replaces nothing. Staging is kept after
+    the release, so the copies do not share inodes with it; otherwise tag edits
+    on either side would change both."""
+    directories = []
+    files = []
+    for directory, subdirectories, filenames in source.walk():
+        subdirectories.sort()
+        relative = directory.relative_to(source)
+        directories.append(relative)
+        files.extend(relative / filename for filename in sorted(filenames))
+    bytes_total = sum((source / path).stat().st_size for path in files)
+
+    created_directories = []
+    temporary_paths: dict[pathlib.PurePath, pathlib.Path] = {}
+    # Files that were in destination before, moved aside until the release is
+    # in place, and the files renamed into place so far
+    backup_paths: dict[pathlib.PurePath, pathlib.Path] = {}
+    replaced: list[pathlib.PurePath] = []
+    try:
+        for relative in directories:
+            target_directory = destination / relative
+            if not target_directory.is_dir():
+                target_directory.mkdir()
+                created_directories.append(target_directory)
+        for path in files:
+            target = destination / path
+            temporary_paths[path] = target.with_name(
+                f".{target.name}.{secrets.token_hex(4)}.tmp"
+            )
+
+        manifest = {}
+        bytes_done = 0
+        reported = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(
+            SUGGESTION_RELEASE_COPY_MAX_WORKERS
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _suggestion_release_file_copy, source / path, temporary_paths[path]
+                ): path
+                for path in files
+            }
+            for future in concurrent.futures.as_completed(futures):
+                path = futures[future]
+                manifest[path.as_posix()] = future.result()
+                bytes_done += (source / path).stat().st_size
+                if time.monotonic() - reported >= 1:
+                    reported = time.monotonic()
+                    log.info(
+                        "Copied %d of %d files (%d of %d bytes) to %s",
+                        len(manifest),
+                        len(files),
+                        bytes_done,
+                        bytes_total,
+                        destination,
+                    )
+            # One flush for the whole release rather than one per file as it
+            # is written
+            list(executor.map(_path_fsync, temporary_paths.values()))
+        for path in files:
+            target = destination / path
+            if target.exists() or target.is_symlink():
+                backup_path = target.with_name(
+                    f".{target.name}.{secrets.token_hex(4)}.bak"
+                )
+                target.rename(backup_path)
+                backup_paths[path] = backup_path
+            temporary_paths[path].replace(target)
+            replaced.append(path)
+        for relative in reversed(directories):
+            _path_fsync(destination / relative)
+    except BaseException:
+        for path in reversed(replaced):
+            (destination / path).unlink(missing_ok=True)
+        for path, backup_path in backup_paths.items():
+            try:
+                backup_path.replace(destination / path)
+            except OSError as error:
+                log.error(
+                    "Unable to restore %s from %s: %s",
+                    destination / path,
+                    backup_path,
+                    error,
+                )
+        for temporary_path in temporary_paths.values():
+            temporary_path.unlink(missing_ok=True)
+        for directory in reversed(created_directories):
+            try:
+                directory.rmdir()
+            except OSError:
+                pass
+        raise
+    for backup_path in backup_paths.values():
+        backup_path.unlink(missing_ok=True)
+    log.info(
+        "Copied %d files (%d bytes) from %s to %s",
+        len(files),
+        bytes_total,
+        source,
+        destination,
+    )
+    return tuple(sorted(manifest.items()))
+
+
 def suggestion_release_schedule(
     library_root: pathlib.Path,
     suggestion_id: str,
@@ -507,7 +833,8 @@ def suggestion_release_schedule(
     folder_path: str,
     *,
     release_immediately: bool = False,
-) -> str:
+) -> SuggestionRelease:
+    started = time.monotonic()
     destination_root = (
         library_root.resolve()
         if release_immediately
@@ -549,6 +876,7 @@ def suggestion_release_schedule(
         directory.mkdir()
         created_directories.append(directory)
     immediate_destination_created = False
+    manifest: tuple[tuple[str, str], ...] = ()
     try:
         if release_immediately:
             if not destination.exists():
@@ -559,7 +887,7 @@ def suggestion_release_schedule(
                         raise
                 else:
                     immediate_destination_created = True
-            shutil.copytree(source, destination, dirs_exist_ok=True)
+            manifest = _suggestion_release_copy(source, destination)
         else:
             source.rename(destination)
     except OSError:
@@ -571,7 +899,11 @@ def suggestion_release_schedule(
             except OSError:
                 pass
         raise
-    return destination.relative_to(destination_root).as_posix()
+    return SuggestionRelease(
+        destination=destination.relative_to(destination_root).as_posix(),
+        manifest=manifest,
+        duration_seconds=time.monotonic() - started,
+    )
 
 
 def suggestion_staging_folder_get(
@@ -589,13 +921,14 @@ def suggestion_staging_folder_get(
 
 
 def suggestion_staging_mp3_duration_get(
+    con: sqlite3.Connection,
     library_root: pathlib.Path,
     suggestion_id: str,
 ) -> float:
     suggestion_root = suggestion_staging_folder_get(library_root, suggestion_id)
     if not suggestion_root.is_dir():
         return 0.0
-    return _mp3_duration_get(suggestion_root, suggestion_root)
+    return _mp3_duration_get(con, suggestion_root, suggestion_root)
 
 
 def suggestion_staging_files_get(
@@ -622,25 +955,67 @@ def suggestion_staging_files_get(
     return tuple(sorted(files, key=lambda file: file[0].casefold()))
 
 
+def suggestion_staging_mp3_files_get(
+    library_root: pathlib.Path,
+    suggestion_id: str,
+) -> dict[str, pathlib.Path]:
+    """Every staged MP3 by relative path, checked to stay inside the suggestion
+    folder in the same pass that lists them"""
+    suggestion_root = suggestion_staging_folder_get(library_root, suggestion_id)
+    if not suggestion_root.is_dir():
+        return {}
+    files = {}
+    for path in suggestion_root.rglob("*"):
+        if path.suffix.casefold() != ".mp3":
+            continue
+        try:
+            if not path.is_file() or not path.resolve(strict=True).is_relative_to(
+                suggestion_root
+            ):
+                continue
+        except OSError:
+            continue
+        files[path.relative_to(suggestion_root).as_posix()] = path
+    return dict(sorted(files.items(), key=lambda file: file[0].casefold()))
+
+
+def _suggestion_staging_filename_normalize(original_name: str) -> str:
+    filename = pathlib.PurePosixPath(original_name.replace("\\", "/")).name.strip()
+    if (
+        not filename
+        or filename in {".", ".."}
+        or any(ord(character) < 32 for character in filename)
+    ):
+        msg = "Every uploaded file must have a valid filename."
+        raise ValueError(msg)
+    if len(filename.encode()) > 255:
+        msg = f"The filename {filename!r} is too long."
+        raise ValueError(msg)
+    return filename
+
+
+def _suggestion_staging_names_available_check(
+    suggestion_root: pathlib.Path, filenames: typing.Iterable[str]
+) -> None:
+    existing_names = (
+        {path.name.casefold() for path in suggestion_root.iterdir()}
+        if suggestion_root.is_dir()
+        else set()
+    )
+    if any(filename.casefold() in existing_names for filename in filenames):
+        msg = "A file with that name already exists in the suggestion folder."
+        raise ValueError(msg)
+
+
 def suggestion_staging_files_upload(
     library_root: pathlib.Path,
     suggestion_id: str,
     uploads: typing.Iterable[tuple[str, typing.IO[bytes]]],
 ) -> tuple[str, ...]:
-    normalized_uploads = []
-    for original_name, stream in uploads:
-        filename = pathlib.PurePosixPath(original_name.replace("\\", "/")).name.strip()
-        if (
-            not filename
-            or filename in {".", ".."}
-            or any(ord(character) < 32 for character in filename)
-        ):
-            msg = "Every uploaded file must have a valid filename."
-            raise ValueError(msg)
-        if len(filename.encode()) > 255:
-            msg = f"The filename {filename!r} is too long."
-            raise ValueError(msg)
-        normalized_uploads.append((filename, stream))
+    normalized_uploads = [
+        (_suggestion_staging_filename_normalize(original_name), stream)
+        for original_name, stream in uploads
+    ]
     if not normalized_uploads:
         msg = "Choose at least one file to upload."
         raise ValueError(msg)
@@ -654,12 +1029,9 @@ def suggestion_staging_files_upload(
     suggestion_root.mkdir(parents=True, exist_ok=True)
 
     destinations = [suggestion_root / filename for filename, _ in normalized_uploads]
-    existing_names = {path.name.casefold() for path in suggestion_root.iterdir()}
-    if any(
-        destination.name.casefold() in existing_names for destination in destinations
-    ):
-        msg = "A file with that name already exists in the suggestion folder."
-        raise ValueError(msg)
+    _suggestion_staging_names_available_check(
+        suggestion_root, [destination.name for destination in destinations]
+    )
 
     created: list[pathlib.Path] = []
     try:
@@ -673,9 +1045,277 @@ def suggestion_staging_files_upload(
         for destination in created:
             destination.unlink(missing_ok=True)
         raise
+    finally:
+        # The folder mtime changed when each file was created, before its
+        # contents were written
+        _mp3_directory_durations_forget(suggestion_root)
     return tuple(destination.name for destination in destinations)
 
 
+@dataclasses.dataclass(frozen=True)
+class SuggestionStagingUpload:
+    id: str
+    filename: str
+    size: int
+    offset: int
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == self.size
+
+
+# SHA-256 state of each partial upload by path, with the offset it covers.
+# After a restart the digest is rebuilt from the partial file once.
+_suggestion_upload_digests: dict[pathlib.Path, tuple[int, "hashlib._Hash"]] = {}
+# Lock for each partial upload by path, with the number of threads holding or
+# waiting for it; an entry is removed once nobody uses it
+_suggestion_upload_locks: dict[pathlib.Path, tuple[threading.Lock, int]] = {}
+_suggestion_upload_locks_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _suggestion_upload_locked(part_path: pathlib.Path) -> typing.Iterator[None]:
+    with _suggestion_upload_locks_lock:
+        lock, users = _suggestion_upload_locks.get(part_path, (threading.Lock(), 0))
+        _suggestion_upload_locks[part_path] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _suggestion_upload_locks_lock:
+            lock, users = _suggestion_upload_locks[part_path]
+            if users == 1:
+                del _suggestion_upload_locks[part_path]
+            else:
+                _suggestion_upload_locks[part_path] = (lock, users - 1)
+
+
+def _suggestion_upload_forget(part_path: pathlib.Path) -> None:
+    """Drop the digest of an upload whose partial file is gone; call it while
+    holding the upload's lock"""
+    _suggestion_upload_digests.pop(part_path, None)
+
+
+def _suggestion_uploads_folder_get(
+    library_root: pathlib.Path, suggestion_id: str
+) -> pathlib.Path:
+    """Partial uploads live beside the suggestion folders, so they never show
+    up as staged files or in folder durations"""
+    suggestion_root = suggestion_staging_folder_get(library_root, suggestion_id)
+    if suggestion_root.name.startswith("."):
+        msg = "Invalid suggestion staging directory."
+        raise ValueError(msg)
+    return suggestion_root.parent / ".uploads" / suggestion_root.name
+
+
+def _sha256_hex_valid(value: str) -> bool:
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+def _suggestion_upload_paths_get(
+    library_root: pathlib.Path, suggestion_id: str, upload_id: str
+) -> tuple[pathlib.Path, pathlib.Path]:
+    if not _sha256_hex_valid(upload_id):
+        msg = "Invalid upload."
+        raise ValueError(msg)
+    uploads_root = _suggestion_uploads_folder_get(library_root, suggestion_id)
+    return uploads_root / f"{upload_id}.part", uploads_root / f"{upload_id}.json"
+
+
+def _suggestion_upload_get(
+    part_path: pathlib.Path, info_path: pathlib.Path
+) -> SuggestionStagingUpload:
+    try:
+        info = json.loads(info_path.read_text())
+        offset = part_path.stat().st_size
+    except FileNotFoundError:
+        msg = "That upload no longer exists. Start it again."
+        raise ValueError(msg) from None
+    return SuggestionStagingUpload(
+        part_path.stem, info["filename"], info["size"], offset
+    )
+
+
+def _suggestion_uploads_expire(uploads_root: pathlib.Path) -> None:
+    if not uploads_root.is_dir():
+        return
+    cutoff = time.time() - SUGGESTION_UPLOAD_EXPIRE_SECONDS
+    for info_path in uploads_root.glob("*.json"):
+        part_path = info_path.with_suffix(".part")
+        with _suggestion_upload_locked(part_path):
+            try:
+                if part_path.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                pass
+            log.info("Removing abandoned upload %s", part_path)
+            part_path.unlink(missing_ok=True)
+            info_path.unlink(missing_ok=True)
+            _suggestion_upload_forget(part_path)
+
+
+def suggestion_staging_upload_start(
+    library_root: pathlib.Path,
+    suggestion_id: str,
+    original_name: str,
+    size: int,
+    content_key: str,
+) -> SuggestionStagingUpload:
+    """Start a chunked upload, or return the one already in progress for the
+    same file so the client can resume from its offset.
+
+    content_key is a SHA-256 the client derives from the file's contents, such
+    as its first and last bytes and modification time. It is part of the
+    upload id, so a different file with the same name and size starts over
+    instead of resuming someone else's partial file."""
+    filename = _suggestion_staging_filename_normalize(original_name)
+    if size < 0:
+        msg = "Invalid file size."
+        raise ValueError(msg)
+    content_key = content_key.lower()
+    if not _sha256_hex_valid(content_key):
+        msg = "Invalid upload key."
+        raise ValueError(msg)
+    if size > SUGGESTION_UPLOAD_MAX_BYTES:
+        msg = f"The file {filename!r} is larger than 1 GB."
+        raise ValueError(msg)
+    suggestion_root = suggestion_staging_folder_get(library_root, suggestion_id)
+    _suggestion_staging_names_available_check(suggestion_root, [filename])
+
+    uploads_root = _suggestion_uploads_folder_get(library_root, suggestion_id)
+    _suggestion_uploads_expire(uploads_root)
+    uploads_root.mkdir(parents=True, exist_ok=True)
+    upload_id = hashlib.sha256(
+        json.dumps([suggestion_id, filename.casefold(), size, content_key]).encode()
+    ).hexdigest()
+    part_path, info_path = _suggestion_upload_paths_get(
+        library_root, suggestion_id, upload_id
+    )
+    with _suggestion_upload_locked(part_path):
+        if not info_path.exists():
+            part_path.touch()
+            info_path.write_text(json.dumps({"filename": filename, "size": size}))
+        return _suggestion_upload_get(part_path, info_path)
+
+
+def _suggestion_upload_digest_get(
+    part_path: pathlib.Path, offset: int
+) -> "hashlib._Hash":
+    state = _suggestion_upload_digests.get(part_path)
+    if state is not None and state[0] == offset:
+        return state[1]
+    with part_path.open("rb") as part:
+        return hashlib.file_digest(part, "sha256")
+
+
+def suggestion_staging_upload_append(
+    library_root: pathlib.Path,
+    suggestion_id: str,
+    upload_id: str,
+    offset: int,
+    stream: typing.IO[bytes],
+) -> SuggestionStagingUpload:
+    """Append the chunk in stream at offset, which has to be where the partial
+    file ends; a chunk the server already has is acknowledged without writing.
+    Raises LookupError with the current upload when offset is past the end."""
+    part_path, info_path = _suggestion_upload_paths_get(
+        library_root, suggestion_id, upload_id
+    )
+    with _suggestion_upload_locked(part_path):
+        upload = _suggestion_upload_get(part_path, info_path)
+        if offset < upload.offset:
+            # A retried chunk whose earlier attempt was written after all
+            return upload
+        if offset > upload.offset:
+            raise LookupError(upload)
+        digest = _suggestion_upload_digest_get(part_path, upload.offset)
+        written = 0
+        with part_path.open("ab") as part:
+            try:
+                while chunk := stream.read(1024 * 1024):
+                    written += len(chunk)
+                    if (
+                        written > SUGGESTION_UPLOAD_CHUNK_BYTES
+                        or upload.offset + written > upload.size
+                    ):
+                        msg = "The upload chunk is larger than expected."
+                        raise ValueError(msg)
+                    part.write(chunk)
+                    digest.update(chunk)
+            except Exception:
+                # Drop whatever part of the chunk was written so the offset
+                # still lands on a chunk boundary
+                part.truncate(upload.offset)
+                _suggestion_upload_digests.pop(part_path, None)
+                raise
+        _suggestion_upload_digests[part_path] = (upload.offset + written, digest)
+        return dataclasses.replace(upload, offset=upload.offset + written)
+
+
+def suggestion_staging_upload_finish(
+    library_root: pathlib.Path,
+    suggestion_id: str,
+    upload_id: str,
+    sha256: str | None = None,
+) -> tuple[str, str]:
+    """Move a complete upload into the suggestion folder and return its filename
+    and the SHA-256 computed while it was received. A client that sends its own
+    digest of the file as sha256 has it checked against that."""
+    part_path, info_path = _suggestion_upload_paths_get(
+        library_root, suggestion_id, upload_id
+    )
+    with _suggestion_upload_locked(part_path):
+        upload = _suggestion_upload_get(part_path, info_path)
+        if not upload.complete:
+            msg = f"The upload of {upload.filename!r} is not complete."
+            raise ValueError(msg)
+        hexdigest = _suggestion_upload_digest_get(part_path, upload.offset).hexdigest()
+        if sha256 and sha256.lower() != hexdigest:
+            part_path.unlink(missing_ok=True)
+            info_path.unlink(missing_ok=True)
+            _suggestion_upload_forget(part_path)
+            msg = (
+                f"The file {upload.filename!r} was damaged in transfer. "
+                "Upload it again."
+            )
+            raise ValueError(msg)
+
+        suggestion_root = suggestion_staging_folder_get(library_root, suggestion_id)
+        suggestion_root.mkdir(parents=True, exist_ok=True)
+        _suggestion_staging_names_available_check(suggestion_root, [upload.filename])
+        destination = suggestion_root / upload.filename
+        try:
+            # Unlike a rename, a hard link never replaces an existing file
+            os.link(part_path, destination)
+        except FileExistsError:
+            msg = "A file with that name already exists in the suggestion folder."
+            raise ValueError(msg) from None
+        finally:
+            _mp3_directory_durations_forget(suggestion_root)
+        part_path.unlink()
+        info_path.unlink(missing_ok=True)
+        _suggestion_upload_forget(part_path)
+    log.info(
+        "Uploaded %s for suggestion %s, SHA-256 %s",
+        destination,
+        suggestion_id,
+        hexdigest,
+    )
+    return upload.filename, hexdigest
+
+
+def suggestion_staging_upload_cancel(
+    library_root: pathlib.Path, suggestion_id: str, upload_id: str
+) -> None:
+    part_path, info_path = _suggestion_upload_paths_get(
+        library_root, suggestion_id, upload_id
+    )
+    with _suggestion_upload_locked(part_path):
+        part_path.unlink(missing_ok=True)
+        info_path.unlink(missing_ok=True)
+        _suggestion_upload_forget(part_path)
+
+
 def _suggestion_staging_file_get(
     library_root: pathlib.Path,
     suggestion_id: str,
@@ -846,23 +1486,164 @@ def connection_init(path: str) -> None:
     con.close()
 
 
+class _PooledConnection(sqlite3.Connection):
+    """A connection that goes back to its pool when closed, with anything not
+    committed rolled back"""
+
+    _pool: "_ConnectionPool | None" = None
+    _leased = False
+
+    def close(self) -> None:
+        if self._pool is None:
+            super().close()
+        elif self._leased:
+            self._pool.put(self)
+
+
+class _ConnectionPool:
+    """Idle connections to one database, most recently used first.
+
+    Pragmas are applied once when a connection is opened. Connections may be
+    handed to a different thread each time, but only one thread uses a
+    connection while it is out of the pool."""
+
+    def __init__(self, path: str, *, readonly: bool) -> None:
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._idle: list[_PooledConnection] = []
+        self.opened = 0
+        self.reused = 0
+        self.in_use = 0
+
+    def _open(self) -> _PooledConnection:
+        con = sqlite3.connect(
+            self.path,
+            autocommit=True,
+            check_same_thread=False,
+            factory=_PooledConnection,
+        )
+        con.row_factory = sqlite3.Row
+        con.execute("pragma busy_timeout=5000")
+        con.execute("pragma foreign_keys=on")
+        if self.readonly:
+            con.execute("pragma query_only=on")
+            con.execute(f"pragma mmap_size={STORAGE_READONLY_MMAP_BYTES}")
+            con.execute(f"pragma cache_size=-{STORAGE_READONLY_CACHE_KIB}")
+        con.autocommit = False
+        con._pool = self
+        return con
+
+    def get(self) -> _PooledConnection:
+        with self._lock:
+            con = self._idle.pop() if self._idle else None
+            if con is None:
+                self.opened += 1
+            else:
+                self.reused += 1
+            self.in_use += 1
+        if con is None:
+            try:
+                con = self._open()
+            except Exception:
+                with self._lock:
+                    self.opened -= 1
+                    self.in_use -= 1
+                raise
+        con._leased = True
+        return con
+
+    def put(self, con: _PooledConnection) -> None:
+        con._leased = False
+        try:
+            # Ends the read snapshot as well as any uncommitted writes
+            con.rollback()
+            keep = True
+        except sqlite3.Error as error:
+            log.warning("Discarding storage connection to %s: %s", self.path, error)
+            keep = False
+        with self._lock:
+            self.in_use -= 1
+            keep = keep and len(self._idle) < STORAGE_POOL_MAX_IDLE
+            if keep:
+                self._idle.append(con)
+        if not keep:
+            con._pool = None
+            con.close()
+
+    def stats(self) -> StoragePoolStats:
+        with self._lock:
+            return StoragePoolStats(
+                path=self.path,
+                readonly=self.readonly,
+                opened=self.opened,
+                reused=self.reused,
+                idle=len(self._idle),
+                in_use=self.in_use,
+            )
+
+
+_connection_pools: dict[tuple[str, bool], _ConnectionPool] = {}
+_connection_pools_lock = threading.Lock()
+
+
+def _connection_pool_get(path: str, *, readonly: bool) -> _ConnectionPool:
+    with _connection_pools_lock:
+        pool = _connection_pools.get((path, readonly))
+        if pool is None:
+            pool = _connection_pools[path, readonly] = _ConnectionPool(
+                path, readonly=readonly
+            )
+        return pool
+
+
 def connection_get(path: str) -> sqlite3.Connection:
-    con = sqlite3.connect(path, autocommit=True)
-    con.row_factory = sqlite3.Row
-    con.execute("pragma busy_timeout=5000")
-    con.execute("pragma foreign_keys=on")
-    con.autocommit = False
-    return con
+    """A pooled connection; close() returns it to the pool"""
+    return _connection_pool_get(path, readonly=False).get()
+
+
+def connection_get_readonly(path: str) -> sqlite3.Connection:
+    """A pooled connection that refuses writes and reads through a larger page
+    cache and a memory map of the database file"""
+    return _connection_pool_get(path, readonly=True).get()
+
+
+def connection_pool_stats_get() -> list[StoragePoolStats]:
+    with _connection_pools_lock:
+        pools = list(_connection_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+_settings_cache: dict[str, tuple[str, bool]] = {}
+_settings_cache_generation: int | None = None
+_settings_cache_lock = threading.Lock()
+
+
+def _settings_cached(con: sqlite3.Connection) -> dict[str, tuple[str, bool]]:
+    """Every setting as key: (value, protected), read again only when the
+    generation that triggers bump on each change to the table has moved on"""
+    global _settings_cache, _settings_cache_generation
+    row = con.execute("select generation from settings_generation").fetchone()
+    generation = row["generation"]
+    with _settings_cache_lock:
+        if generation == _settings_cache_generation:
+            return _settings_cache
+    # Read in the same transaction as the generation, so they match
+    settings = {
+        row["key"]: (row["value"], bool(row["protected"]))
+        for row in con.execute("select key, value, protected from settings")
+    }
+    with _settings_cache_lock:
+        _settings_cache = settings
+        _settings_cache_generation = generation
+    return settings
 
 
 def setting_get(con: sqlite3.Connection, key: str) -> str | None:
-    row = con.execute(
-        "select value from settings where key = :key",
-        {"key": key},
-    ).fetchone()
-    if row is None:
+    setting = _settings_cached(con).get(key)
+    if setting is None:
         return None
-    return row["value"]
+    return setting[0]
 
 
 def setting_set(
@@ -904,10 +1685,10 @@ def setting_set(
 
 
 def settings_get(con: sqlite3.Connection) -> list[tuple[str, str, bool]]:
-    rows = con.execute(
-        "select key, value, protected from settings order by key"
-    ).fetchall()
-    return [(row["key"], row["value"], bool(row["protected"])) for row in rows]
+    return [
+        (key, value, protected)
+        for key, (value, protected) in sorted(_settings_cached(con).items())
+    ]
 
 
 def user_get(con: sqlite3.Connection, discord_id: str) -> User | None:
@@ -1042,6 +1823,7 @@ def user_setting_set(
     except Exception:
         con.rollback()
         raise
+    _user_settings_cache_update(discord_id, key, value)
     return created
 
 
@@ -1075,6 +1857,7 @@ def user_setting_delete(
     except Exception:
         con.rollback()
         raise
+    _user_settings_cache_update(discord_id, key, None)
     return cursor.rowcount > 0
 
 
@@ -1082,7 +1865,14 @@ def user_color_mode_get(
     con: sqlite3.Connection,
     discord_id: str,
 ) -> str:
-    value = user_setting_get(con, discord_id, USER_COLOR_MODE_SETTING_KEY)
+    settings = user_settings_cache_get(discord_id)
+    if settings is None:
+        settings = user_settings_cache_load(con, discord_id)
+    return user_color_mode_from_settings(settings)
+
+
+def user_color_mode_from_settings(settings: dict[str, str]) -> str:
+    value = settings.get(USER_COLOR_MODE_SETTING_KEY)
     return value if value in USER_COLOR_MODES else USER_COLOR_MODE_DEFAULT
 
 
@@ -1102,6 +1892,257 @@ def user_settings_get(
     return [(str(row["key"]), str(row["value"])) for row in rows]
 
 
+_user_settings_cache: collections.OrderedDict[str, dict[str, str]] = (
+    collections.OrderedDict()
+)
+_user_settings_cache_lock = threading.Lock()
+# Counts setting writes, so a load that raced with one does not cache what it
+# read before the write
+_user_settings_cache_generation = 0
+
+
+def user_settings_cache_get(discord_id: str) -> dict[str, str] | None:
+    """A copy of the user's settings if they are cached, without touching the
+    database"""
+    discord_id = discord_id.strip()
+    with _user_settings_cache_lock:
+        settings = _user_settings_cache.get(discord_id)
+        if settings is None:
+            return None
+        _user_settings_cache.move_to_end(discord_id)
+        return dict(settings)
+
+
+def user_settings_cache_load(
+    con: sqlite3.Connection,
+    discord_id: str,
+) -> dict[str, str]:
+    """Read the user's settings into the cache, such as at sign-in"""
+    discord_id = discord_id.strip()
+    with _user_settings_cache_lock:
+        generation = _user_settings_cache_generation
+    settings = dict(user_settings_get(con, discord_id))
+    with _user_settings_cache_lock:
+        if generation != _user_settings_cache_generation:
+            # A write landed while reading; an entry cached since then already
+            # has it, and otherwise the next request reads the settings again
+            cached = _user_settings_cache.get(discord_id)
+            return dict(settings if cached is None else cached)
+        _user_settings_cache[discord_id] = settings
+        _user_settings_cache.move_to_end(discord_id)
+        while len(_user_settings_cache) > USER_SETTINGS_CACHE_SIZE:
+            _user_settings_cache.popitem(last=False)
+    return dict(settings)
+
+
+def _user_settings_cache_update(discord_id: str, key: str, value: str | None) -> None:
+    global _user_settings_cache_generation
+    # Users who are not cached are read in full on their next request
+    with _user_settings_cache_lock:
+        _user_settings_cache_generation += 1
+        settings = _user_settings_cache.get(discord_id)
+        if settings is None:
+            return
+        if value is None:
+            settings.pop(key, None)
+        else:
+            settings[key] = value
+
+
+def mp3_metadata_get(
+    con: sqlite3.Connection,
+    path: str | pathlib.Path,
+) -> tuple[Mp3TagValues, Mp3FileInfo]:
+    return mp3_metadata_get_many(con, [path])[pathlib.Path(path)]
+
+
+def mp3_metadata_get_many(
+    con: sqlite3.Connection,
+    paths: typing.Iterable[str | pathlib.Path],
+) -> dict[pathlib.Path, tuple[Mp3TagValues, Mp3FileInfo]]:
+    """Read ID3 tags, duration and bitrate, parsing only files whose size or
+    modification time changed since they were last cached"""
+    result = {}
+    misses: dict[pathlib.Path, os.stat_result | None] = {}
+    for path in map(pathlib.Path, paths):
+        try:
+            stat = path.stat()
+        except OSError:
+            misses[path] = None
+            continue
+        row = con.execute(
+            """
+            select duration_seconds, bitrate_bps, tag_values, tag_error
+            from mp3_metadata
+            where path = :path and size = :size and mtime_ns = :mtime_ns
+            """,
+            {
+                "path": str(path.absolute()),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            },
+        ).fetchone()
+        if row is None:
+            misses[path] = stat
+            continue
+        stored_tag_values = json.loads(row["tag_values"])
+        result[path] = (
+            Mp3TagValues(
+                **{
+                    tag_name: tuple(stored_tag_values.get(tag_name, ()))
+                    for tag_name in ID3_TAG_LABELS
+                },
+                error=row["tag_error"],
+                duration_seconds=row["duration_seconds"],
+            ),
+            Mp3FileInfo(file_size_bytes=stat.st_size, bitrate_bps=row["bitrate_bps"]),
+        )
+    if not misses:
+        return result
+    parsed = mp3_metadata_read_many(misses)
+    result.update(parsed)
+    _mp3_metadata_store(
+        con,
+        [
+            (path, stat, tag_values, file_info)
+            for path, (tag_values, file_info) in parsed.items()
+            if (stat := misses[path]) is not None
+        ],
+    )
+    return result
+
+
+def mp3_metadata_put_many(
+    con: sqlite3.Connection,
+    metadata: typing.Mapping[pathlib.Path, tuple[Mp3TagValues, Mp3FileInfo]],
+) -> None:
+    """Cache metadata that is already known, such as the tags just written by
+    id3_tag_values_set_many, so the next read does not parse the files"""
+    entries = []
+    for path, (tag_values, file_info) in metadata.items():
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((path, stat, tag_values, file_info))
+    _mp3_metadata_store(con, entries)
+
+
+def _mp3_metadata_store(
+    con: sqlite3.Connection,
+    entries: list[tuple[pathlib.Path, os.stat_result, Mp3TagValues, Mp3FileInfo]],
+) -> None:
+    cacheable = [entry for entry in entries if entry[2].duration_seconds is not None]
+    if not cacheable:
+        return
+    try:
+        con.executemany(
+            """
+            insert into mp3_metadata (
+                path, size, mtime_ns, duration_seconds, bitrate_bps, tag_values,
+                tag_error
+            )
+            values (
+                :path, :size, :mtime_ns, :duration_seconds, :bitrate_bps,
+                :tag_values, :tag_error
+            )
+            on conflict (path) do update set
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                duration_seconds = excluded.duration_seconds,
+                bitrate_bps = excluded.bitrate_bps,
+                tag_values = excluded.tag_values,
+                tag_error = excluded.tag_error,
+                cached_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+            """,
+            [
+                {
+                    "path": str(path.absolute()),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "duration_seconds": tag_values.duration_seconds,
+                    "bitrate_bps": file_info.bitrate_bps,
+                    "tag_values": json.dumps(
+                        {
+                            tag_name: getattr(tag_values, tag_name)
+                            for tag_name in ID3_TAG_LABELS
+                        }
+                    ),
+                    "tag_error": tag_values.error,
+                }
+                for path, stat, tag_values, file_info in cacheable
+            ],
+        )
+        con.commit()
+    except sqlite3.Error as error:
+        con.rollback()
+        log.warning("Unable to cache MP3 metadata: %s", error)
+
+
+def mp3_durations_get(
+    con: sqlite3.Connection,
+    paths: typing.Iterable[str | pathlib.Path],
+) -> dict[pathlib.Path, float | None]:
+    """Read durations from the metadata cache, estimating the files that are not
+    cached from their first few frames instead of parsing them in full"""
+    result = {}
+    misses = []
+    for path in map(pathlib.Path, paths):
+        try:
+            stat = path.stat()
+        except OSError:
+            misses.append(path)
+            continue
+        row = con.execute(
+            """
+            select duration_seconds
+            from mp3_metadata
+            where path = :path and size = :size and mtime_ns = :mtime_ns
+            """,
+            {
+                "path": str(path.absolute()),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            },
+        ).fetchone()
+        if row is None:
+            misses.append(path)
+        else:
+            result[path] = row["duration_seconds"]
+    result.update(mp3_duration_seconds_estimate_many(misses))
+    return result
+
+
+def mp3_metadata_delete(
+    con: sqlite3.Connection,
+    paths: typing.Iterable[str | pathlib.Path],
+) -> None:
+    try:
+        con.executemany(
+            "delete from mp3_metadata where path = ?",
+            [(str(pathlib.Path(path).absolute()),) for path in paths],
+        )
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+
+def mp3_metadata_prune(con: sqlite3.Connection) -> int:
+    """Forget cached metadata for files that no longer exist, such as files that
+    were deleted or moved outside the app, and return how many were removed"""
+    paths = [row["path"] for row in con.execute("select path from mp3_metadata")]
+    gone = [(path,) for path in paths if not os.path.exists(path)]
+    try:
+        con.executemany("delete from mp3_metadata where path = ?", gone)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    log.info("Removed cached metadata for %d missing files", len(gone))
+    return len(gone)
+
+
 def user_version_get(con: sqlite3.Connection) -> int:
     return con.execute("pragma user_version").fetchone()[0]
 
@@ -2342,6 +3383,376 @@ def _migration_19(con: sqlite3.Connection) -> None:
     )
 
 
+def _migration_20(con: sqlite3.Connection) -> None:
+    con.execute(
+        """
+        create table mp3_metadata (
+            path text primary key,
+            size integer not null,
+            mtime_ns integer not null,
+            duration_seconds real,
+            bitrate_bps integer,
+            tag_values text not null,
+            tag_error text,
+            cached_at text not null
+                default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+        ) without rowid
+        """
+    )
+
+
+def _migration_21(con: sqlite3.Connection) -> None:
+    con.execute(
+        """
+        create table library_scan_directories (
+            path text primary key,
+            parent text,
+            mtime_ns integer not null
+        ) without rowid
+        """
+    )
+    con.execute(
+        """
+        create index library_scan_directories_parent_idx
+        on library_scan_directories (parent)
+        """
+    )
+    con.execute(
+        """
+        create table library_scan_files (
+            path text primary key,
+            directory text not null,
+            size integer not null,
+            mtime_ns integer not null
+        ) without rowid
+        """
+    )
+    con.execute(
+        """
+        create index library_scan_files_directory_idx
+        on library_scan_files (directory)
+        """
+    )
+    con.execute(
+        """
+        create table library_scan_findings (
+            kind text not null
+                check (kind in ('orphan', 'disabled', 'missing', 'moved')),
+            path text not null,
+            new_path text,
+            primary key (kind, path)
+        ) without rowid
+        """
+    )
+    con.execute(
+        """
+        create table library_scans (
+            id integer primary key check (id = 1),
+            scanned_at text not null,
+            duration_seconds real not null,
+            directories_total integer not null,
+            directories_rescanned integer not null,
+            files_total integer not null
+        )
+        """
+    )
+
+
+def _migration_22(con: sqlite3.Connection) -> None:
+    con.execute(
+        """
+        create table tag_jobs (
+            id text primary key,
+            kind text not null
+                check (kind in ('artist-rename', 'album-rename', 'genre-set')),
+            params text not null,
+            status text not null default 'queued'
+                check (status in ('queued', 'running', 'completed', 'failed')),
+            created_by text,
+            created_at text not null
+                default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+            started_at text,
+            finished_at text
+        ) without rowid
+        """
+    )
+    con.execute(
+        """
+        create table tag_job_files (
+            job_id text not null references tag_jobs (id) on delete cascade,
+            path text not null,
+            status text not null default 'pending'
+                check (status in ('pending', 'done', 'skipped', 'failed')),
+            error text,
+            finished_at text,
+            primary key (job_id, path)
+        ) without rowid
+        """
+    )
+
+
+def _migration_23(con: sqlite3.Connection) -> None:
+    con.execute(
+        """
+        create table library_audio_hashes (
+            path text primary key,
+            size integer not null,
+            mtime_ns integer not null,
+            audio_sha256 text
+        ) without rowid
+        """
+    )
+    con.execute(
+        """
+        create index library_audio_hashes_audio_sha256_idx
+        on library_audio_hashes (audio_sha256)
+        """
+    )
+
+
+def _migration_24(con: sqlite3.Connection) -> None:
+    con.executescript(
+        """
+        create table settings_generation (
+            id integer primary key check (id = 1),
+            generation integer not null
+        );
+
+        insert into settings_generation (id, generation) values (1, 0);
+
+        create trigger settings_generation_insert after insert on settings
+        begin
+            update settings_generation set generation = generation + 1;
+        end;
+
+        create trigger settings_generation_update after update on settings
+        begin
+            update settings_generation set generation = generation + 1;
+        end;
+
+        create trigger settings_generation_delete after delete on settings
+        begin
+            update settings_generation set generation = generation + 1;
+        end;
+        """
+    )
+
+
+def _migration_25(con: sqlite3.Connection) -> None:
+    # suggestions has no rowid, so each suggestion is given the integer id of
+    # its document in the full-text index
+    con.executescript(
+        """
+        create table suggestion_search_rowids (
+            search_rowid integer primary key,
+            suggestion_id text unique not null
+        );
+
+        create virtual table suggestion_search using fts5 (
+            title,
+            description,
+            people,
+            links,
+            comments,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        );
+
+        create view suggestion_search_documents as
+        select
+            r.search_rowid,
+            r.suggestion_id,
+            s.title,
+            s.description,
+            coalesce(s.requester_name, '') || ' '
+                || coalesce(s.claimed_by_name, '') people,
+            (
+                select group_concat(l.label, ' ')
+                from suggestion_links l
+                where l.suggestion_id = s.suggestion_id
+            ) links,
+            (
+                select group_concat(a.body, ' ')
+                from suggestion_activity a
+                where a.suggestion_id = s.suggestion_id
+                    and a.activity_type = 'comment'
+            ) comments
+        from suggestions s
+        join suggestion_search_rowids r on r.suggestion_id = s.suggestion_id;
+
+        create trigger suggestion_search_suggestions_insert
+        after insert on suggestions
+        begin
+            insert into suggestion_search_rowids (suggestion_id)
+            values (new.suggestion_id);
+            insert into suggestion_search (
+                rowid, title, description, people, links, comments
+            )
+            select search_rowid, title, description, people, links, comments
+            from suggestion_search_documents
+            where suggestion_id = new.suggestion_id;
+        end;
+
+        create trigger suggestion_search_suggestions_delete
+        after delete on suggestions
+        begin
+            delete from suggestion_search
+            where rowid = (
+                select search_rowid
+                from suggestion_search_rowids
+                where suggestion_id = old.suggestion_id
+            );
+            delete from suggestion_search_rowids
+            where suggestion_id = old.suggestion_id;
+        end;
+        """
+    )
+    # The document of a suggestion is rebuilt whenever anything in it changes.
+    # A suggestion being deleted has no document, so the links and comments
+    # removed along with it do not add one back.
+    for name, event, row in (
+        (
+            "suggestions_update",
+            "update of title, description, requester_name, claimed_by_name "
+            "on suggestions",
+            "new",
+        ),
+        ("suggestion_links_insert", "insert on suggestion_links", "new"),
+        ("suggestion_links_update", "update on suggestion_links", "new"),
+        ("suggestion_links_delete", "delete on suggestion_links", "old"),
+        (
+            "suggestion_activity_insert",
+            "insert on suggestion_activity when new.activity_type = 'comment'",
+            "new",
+        ),
+        (
+            "suggestion_activity_update",
+            "update on suggestion_activity "
+            "when old.activity_type = 'comment' or new.activity_type = 'comment'",
+            "new",
+        ),
+        (
+            "suggestion_activity_delete",
+            "delete on suggestion_activity when old.activity_type = 'comment'",
+            "old",
+        ),
+    ):
+        con.execute(
+            f"""
+            create trigger suggestion_search_{name}
+            after {event}
+            begin
+                delete from suggestion_search
+                where rowid = (
+                    select search_rowid
+                    from suggestion_search_rowids
+                    where suggestion_id = {row}.suggestion_id
+                );
+                insert into suggestion_search (
+                    rowid, title, description, people, links, comments
+                )
+                select search_rowid, title, description, people, links, comments
+                from suggestion_search_documents
+                where suggestion_id = {row}.suggestion_id;
+            end
+            """  # noqa: S608
+        )
+    con.executescript(
+        """
+        insert into suggestion_search_rowids (suggestion_id)
+        select suggestion_id from suggestions;
+
+        insert into suggestion_search (
+            rowid, title, description, people, links, comments
+        )
+        select search_rowid, title, description, people, links, comments
+        from suggestion_search_documents;
+        """
+    )
+
+
+def _migration_26(con: sqlite3.Connection) -> None:
+    # Bit n of channel_mask is set when the suggestion is for channel n, so
+    # listing and filtering suggestions does not read suggestion_channels
+    con.executescript(
+        """
+        alter table suggestions
+            add column channel_mask integer not null default 0;
+
+        update suggestions
+        set channel_mask = (
+            select coalesce(sum(1 << sc.channel_id), 0)
+            from suggestion_channels sc
+            where sc.suggestion_id = suggestions.suggestion_id
+        );
+
+        create trigger suggestion_channels_mask_insert
+        after insert on suggestion_channels
+        begin
+            update suggestions
+            set channel_mask = channel_mask | (1 << new.channel_id)
+            where suggestion_id = new.suggestion_id;
+        end;
+
+        create trigger suggestion_channels_mask_update
+        after update of suggestion_id, channel_id on suggestion_channels
+        begin
+            update suggestions
+            set channel_mask = (
+                select coalesce(sum(1 << sc.channel_id), 0)
+                from suggestion_channels sc
+                where sc.suggestion_id = suggestions.suggestion_id
+            )
+            where suggestion_id in (old.suggestion_id, new.suggestion_id);
+        end;
+
+        create trigger suggestion_channels_mask_delete
+        after delete on suggestion_channels
+        begin
+            update suggestions
+            set channel_mask = channel_mask & ~(1 << old.channel_id)
+            where suggestion_id = old.suggestion_id;
+        end;
+
+        create index suggestions_requested_at_idx
+            on suggestions (
+                coalesce(requested_at, ''),
+                suggestion_id,
+                status,
+                kind,
+                channel_mask,
+                claimed_by_name
+            );
+        create index suggestions_title_idx
+            on suggestions (
+                title collate nocase,
+                suggestion_id,
+                status,
+                kind,
+                channel_mask,
+                claimed_by_name
+            );
+        """
+    )
+
+
+def _migration_27(con: sqlite3.Connection) -> None:
+    # State of the reconciliation started from the web page, which runs in a
+    # background thread
+    con.execute(
+        """
+        create table library_scan_runs (
+            id integer primary key check (id = 1),
+            status text not null check (status in ('running', 'completed', 'failed')),
+            full_scan integer not null,
+            started_at text not null,
+            finished_at text,
+            error text
+        )
+        """
+    )
+
+
 MIGRATIONS = (
     _migration_1,
     _migration_2,
@@ -2362,6 +3773,14 @@ MIGRATIONS = (
     _migration_17,
     _migration_18,
     _migration_19,
+    _migration_20,
+    _migration_21,
+    _migration_22,
+    _migration_23,
+    _migration_24,
+    _migration_25,
+    _migration_26,
+    _migration_27,
 )
 
 
@@ -1,9 +1,12 @@
 import json
 import logging
+import re
 import secrets
 import sqlite3
 import typing
-from dataclasses import asdict, dataclass
+from dataclasses import asdict, dataclass, field
+
+from rainwave_library.models.cursors import cursor_decode, cursor_encode
 
 log = logging.getLogger(__name__)
 
@@ -31,6 +34,7 @@ class Suggestion:
         ("requester_name", "Suggested by"),
         ("requested_at", "Suggested at"),
         ("claimed_by_name", "Claimed by"),
+        ("relevance", "Best match"),
     )
     statuses: typing.ClassVar[tuple[str, ...]] = (
         "new",
@@ -59,6 +63,7 @@ class Suggestion:
     claimed_by_discord_id: str | None
     claimed_by_avatar_url: str | None
     channel_ids: tuple[int, ...]
+    cursor: str | None = field(default=None, kw_only=True)
 
 
 @dataclass(frozen=True)
@@ -400,7 +405,7 @@ def _activity_insert(
     )
 
 
-def _suggestion_from_row(row: sqlite3.Row) -> Suggestion:
+def _suggestion_from_row(row: sqlite3.Row, cursor: str | None = None) -> Suggestion:
     return Suggestion(
         id=row["suggestion_id"],
         title=row["title"],
@@ -415,15 +420,37 @@ def _suggestion_from_row(row: sqlite3.Row) -> Suggestion:
         claimed_by_discord_id=row["claimed_by_discord_id"],
         claimed_by_avatar_url=row["claimed_by_avatar_url"],
         channel_ids=tuple(
-            sorted(
-                int(channel_id)
-                for channel_id in (row["channel_ids"] or "").split(",")
-                if channel_id
-            )
+            channel_id
+            for channel_id in range(1, 7)
+            if row["channel_mask"] >> channel_id & 1
         ),
+        cursor=cursor_encode(cursor),
     )
 
 
+def _suggestion_search_query(query: str) -> str | None:
+    """An FTS5 query for suggestions containing every word of query, each
+    matched as a prefix so results show up while a word is being typed"""
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _suggestion_cursor_decode(
+    cursor: str | None, sort_col: str, sort_dir: str, sort_values_count: int
+) -> tuple[list[str | int | float | None], str] | None:
+    """Return the sort values and suggestion ID a page ended on, or None if the
+    cursor is not usable with the current sort"""
+    values = cursor_decode(cursor, sort_col, sort_dir)
+    if values is None or len(values) != sort_values_count + 1:
+        return None
+    *sort_values, suggestion_id = values
+    if not isinstance(suggestion_id, str):
+        return None
+    return sort_values, suggestion_id
+
+
 def suggestions_get(
     con: sqlite3.Connection,
     query: str | None,
@@ -437,8 +464,9 @@ def suggestions_get(
     channel_ids: typing.Iterable[int] | None = None,
     kinds: typing.Iterable[str] | None = None,
     include_unassigned_channel: bool = False,
+    cursor: str | None = None,
 ) -> list[Suggestion]:
-    query = query.strip() if query else None
+    search_query = _suggestion_search_query(query) if query else None
     valid_statuses = tuple(
         dict.fromkeys(
             status for status in statuses or () if status in Suggestion.statuses
@@ -458,8 +486,7 @@ def suggestions_get(
             if channel_id in {1, 2, 3, 4, 6}
         )
     )
-    channel_parameters: list[int | None] = [*valid_channel_ids]
-    channel_parameters.extend([None] * (5 - len(valid_channel_ids)))
+    channel_mask = sum(1 << channel_id for channel_id in valid_channel_ids)
     claimed_by_filters = tuple(name.strip() for name in claimed_by_names or ())
     include_unclaimed = "" in claimed_by_filters
     valid_claimed_by_names = tuple(
@@ -493,24 +520,68 @@ def suggestions_get(
                 when 'declined' then 5
             end
             """,
-            "s.requested_at",
+            "coalesce(s.requested_at, '')",
             "s.title collate nocase",
         ),
         "title": ("s.title collate nocase",),
         "requester_name": (
-            "s.requester_name collate nocase",
+            "coalesce(s.requester_name, '') collate nocase",
             "s.title collate nocase",
         ),
-        "requested_at": ("s.requested_at", "s.title collate nocase"),
+        "requested_at": ("coalesce(s.requested_at, '')",),
         "claimed_by_name": (
-            "s.claimed_by_name collate nocase",
+            "coalesce(s.claimed_by_name, '') collate nocase",
             "s.title collate nocase",
         ),
     }
+    if search_query:
+        # A lower rank is a better match, so descending puts the best first
+        sort_expressions["relevance"] = (
+            "-suggestion_search.rank",
+            "coalesce(s.requested_at, '')",
+        )
     expressions = sort_expressions.get(sort_col, sort_expressions["requested_at"])
+    search_join = (
+        """
+        join suggestion_search_rowids search_rowid
+            on search_rowid.suggestion_id = s.suggestion_id
+        join suggestion_search
+            on suggestion_search.rowid = search_rowid.search_rowid
+            and suggestion_search match :query
+        """
+        if search_query
+        else ""
+    )
+    # Sort values are never null, so a page can end on any row and the next
+    # one seeks past it by comparing (sort values, suggestion_id)
+    expressions = tuple(expression.strip() for expression in expressions)
     sort_clause = ", ".join(
-        f"{expression.strip()} {sort_dir}" for expression in expressions
+        f"{expression} {sort_dir}" for expression in (*expressions, "s.suggestion_id")
     )
+    sort_values_clause = ", ".join(
+        f"{expression} sort_value_{index}"
+        for index, expression in enumerate(expressions)
+    )
+    cursor_parameters: dict[str, str | int | float | None] = {}
+    keyset_clause = ""
+    seek = _suggestion_cursor_decode(cursor, sort_col, sort_dir, len(expressions))
+    if seek is not None:
+        sort_values, cursor_parameters["cursor_id"] = seek
+        cursor_parameters.update(
+            (f"cursor_{index}", value) for index, value in enumerate(sort_values)
+        )
+        placeholders = ", ".join(
+            f":cursor_{index}" for index in range(len(expressions))
+        )
+        # The bound on the first sort value alone is implied by the row value
+        # comparison, but it lets SQLite seek an index on an expression
+        keyset_clause = f"""
+            and {expressions[0]} {"<=" if sort_dir == "desc" else ">="} :cursor_0
+            and ({", ".join(expressions)}, s.suggestion_id)
+                {"<" if sort_dir == "desc" else ">"}
+                ({placeholders}, :cursor_id)
+        """
+        page = 1
     page = max(page, 1)
     sql = f"""
         select
@@ -532,12 +603,10 @@ def suggestions_get(
             ) claimed_by_display_name,
             s.claimed_by_discord_id,
             claimant.avatar_url claimed_by_avatar_url,
-            (
-                select group_concat(channel_id, ',')
-                from suggestion_channels sc
-                where sc.suggestion_id = s.suggestion_id
-            ) channel_ids
+            s.channel_mask,
+            {sort_values_clause}
         from suggestions s
+        {search_join}
         left join users requester
             on requester.discord_id = s.requester_discord_id
         left join users claimant
@@ -563,54 +632,27 @@ def suggestions_get(
             {claimed_by_clause}
             and (
                 (
-                    :channel_0 is null
+                    :channel_mask = 0
                     and :include_unassigned_channel = 0
                 )
-                or exists (
-                    select 1
-                    from suggestion_channels filtered_channel
-                    where filtered_channel.suggestion_id = s.suggestion_id
-                        and filtered_channel.channel_id in (
-                            :channel_0,
-                            :channel_1,
-                            :channel_2,
-                            :channel_3,
-                            :channel_4
-                        )
-                )
+                or s.channel_mask & :channel_mask != 0
                 or (
                     :include_unassigned_channel = 1
-                    and not exists (
-                        select 1
-                        from suggestion_channels any_channel
-                        where any_channel.suggestion_id = s.suggestion_id
-                    )
+                    and s.channel_mask = 0
                 )
             )
-            and (
-                :query is null
-                or s.title like :query
-                or s.description like :query
-                or coalesce(s.requester_name, '') like :query
-                or coalesce(s.claimed_by_name, '') like :query
-            )
-        order by
-            {sort_clause},
-            s.suggestion_id
+            {keyset_clause}
+        order by {sort_clause}
         limit 101 offset :offset
         """  # noqa: S608
     rows = con.execute(
         sql,
         {
-            "channel_0": channel_parameters[0],
-            "channel_1": channel_parameters[1],
-            "channel_2": channel_parameters[2],
-            "channel_3": channel_parameters[3],
-            "channel_4": channel_parameters[4],
+            "channel_mask": channel_mask,
             "include_unassigned_channel": int(include_unassigned_channel),
             "claimed_by_discord_id": claimed_by_discord_id,
             "offset": 100 * (page - 1),
-            "query": f"%{query}%" if query else None,
+            "query": search_query,
             "requester_discord_id": requester_discord_id,
             "status_0": status_parameters[0],
             "status_1": status_parameters[1],
@@ -622,9 +664,25 @@ def suggestions_get(
             "kind_2": kind_parameters[2],
             "kind_3": kind_parameters[3],
             **claimed_by_parameters,
+            **cursor_parameters,
         },
     ).fetchall()
-    return [_suggestion_from_row(row) for row in rows]
+    # The cursor is built here rather than with json_array, which rounds the
+    # relevance rank and would make the next page seek from the wrong place
+    return [
+        _suggestion_from_row(
+            row,
+            cursor=json.dumps(
+                [
+                    sort_col,
+                    sort_dir,
+                    *(row[f"sort_value_{index}"] for index in range(len(expressions))),
+                    row["suggestion_id"],
+                ]
+            ),
+        )
+        for row in rows
+    ]
 
 
 def suggestion_claimants_get(con: sqlite3.Connection) -> list[str]:
@@ -784,11 +842,6 @@ def suggestion_get(
             ) claimed_by_display_name,
             requester.avatar_url requester_avatar_url,
             claimant.avatar_url claimed_by_avatar_url,
-            (
-                select group_concat(channel_id, ',')
-                from suggestion_channels sc
-                where sc.suggestion_id = s.suggestion_id
-            ) channel_ids,
             (
                 select channel_id
                 from suggestion_channels sc
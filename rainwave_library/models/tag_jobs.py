@@ -0,0 +1,331 @@
+import concurrent.futures
+import dataclasses
+import json
+import logging
+import queue
+import secrets
+import sqlite3
+import threading
+import typing
+
+import mutagen
+
+from rainwave_library.models.mp3 import id3_tag_values_set, rename_artist_in_file
+from rainwave_library.models.storage import connection_get, mp3_metadata_delete
+
+log = logging.getLogger(__name__)
+
+TAG_JOB_MAX_WORKERS = 4
+# Per-file results are written in batches so a restart loses little work
+TAG_JOB_COMMIT_EVERY = 25
+TAG_JOB_KIND_LABELS = {
+    "artist-rename": "Rename artist",
+    "album-rename": "Rename album",
+    "genre-set": "Set category",
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class TagJob:
+    id: str
+    kind: str
+    params: dict[str, str]
+    status: str
+    created_by: str | None
+    created_at: str
+    started_at: str | None
+    finished_at: str | None
+    files_total: int
+    files_done: int
+    files_skipped: int
+    files_failed: int
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    @property
+    def files_processed(self) -> int:
+        return self.files_done + self.files_skipped + self.files_failed
+
+    @property
+    def label(self) -> str:
+        if self.kind == "genre-set":
+            return f"{TAG_JOB_KIND_LABELS[self.kind]} to {self.params['genre']!r}"
+        return (
+            f"{TAG_JOB_KIND_LABELS[self.kind]} {self.params['old_name']!r} to "
+            f"{self.params['new_name']!r}"
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class TagJobFailure:
+    path: str
+    error: str
+
+
+def _tag_job_file_run(kind: str, params: dict[str, str], path: str) -> str:
+    if kind == "artist-rename":
+        changed = rename_artist_in_file(path, params["old_name"], params["new_name"])
+        return "done" if changed else "skipped"
+    if kind == "album-rename":
+        id3_tag_values_set(path, "album", params["new_name"])
+        return "done"
+    if kind == "genre-set":
+        id3_tag_values_set(path, "genre", params["genre"])
+        return "done"
+    msg = f"Unknown tag job kind: {kind}"
+    raise ValueError(msg)
+
+
+def tag_job_create(
+    con: sqlite3.Connection,
+    kind: str,
+    params: dict[str, str],
+    paths: typing.Iterable[str],
+    created_by: str | None,
+) -> str:
+    if kind not in TAG_JOB_KIND_LABELS:
+        msg = f"Unknown tag job kind: {kind}"
+        raise ValueError(msg)
+    job_id = secrets.token_urlsafe(16)
+    try:
+        con.execute(
+            """
+            insert into tag_jobs (id, kind, params, created_by)
+            values (:id, :kind, :params, :created_by)
+            """,
+            {
+                "id": job_id,
+                "kind": kind,
+                "params": json.dumps(params),
+                "created_by": created_by,
+            },
+        )
+        con.executemany(
+            """
+            insert into tag_job_files (job_id, path)
+            values (?, ?)
+            on conflict (job_id, path) do nothing
+            """,
+            [(job_id, str(path)) for path in paths],
+        )
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return job_id
+
+
+def tag_job_get(con: sqlite3.Connection, job_id: str) -> TagJob | None:
+    row = con.execute(
+        """
+        select
+            j.id, j.kind, j.params, j.status, j.created_by, j.created_at,
+            j.started_at, j.finished_at,
+            count(f.path) files_total,
+            count(f.path) filter (where f.status = 'done') files_done,
+            count(f.path) filter (where f.status = 'skipped') files_skipped,
+            count(f.path) filter (where f.status = 'failed') files_failed
+        from tag_jobs j
+        left join tag_job_files f on f.job_id = j.id
+        where j.id = :id
+        group by j.id
+        """,
+        {"id": job_id},
+    ).fetchone()
+    if row is None:
+        return None
+    return TagJob(**{**dict(row), "params": json.loads(row["params"])})
+
+
+def tag_job_failures_get(con: sqlite3.Connection, job_id: str) -> list[TagJobFailure]:
+    return [
+        TagJobFailure(row["path"], row["error"] or "")
+        for row in con.execute(
+            """
+            select path, error
+            from tag_job_files
+            where job_id = :job_id and status = 'failed'
+            order by path
+            """,
+            {"job_id": job_id},
+        )
+    ]
+
+
+def _tag_job_results_put(
+    con: sqlite3.Connection, results: list[dict[str, str | None]], rewritten: list[str]
+) -> None:
+    try:
+        con.executemany(
+            """
+            update tag_job_files
+            set
+                status = :status,
+                error = :error,
+                finished_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+            where job_id = :job_id and path = :path
+            """,
+            results,
+        )
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    mp3_metadata_delete(con, rewritten)
+
+
+class TagJobRunner:
+    """Runs tag jobs one at a time from a background thread, rewriting up to
+    max_workers files of a job at once.
+
+    Job and file state live in SQLite, so jobs that were queued or running when
+    the app stopped are picked up again by start(). Every job kind is safe to
+    repeat on a file that was already rewritten."""
+
+    def __init__(self, max_workers: int = TAG_JOB_MAX_WORKERS) -> None:
+        self.max_workers = max_workers
+        self._queue: queue.Queue[str] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._storage_path: str | None = None
+
+    def start(self, storage_path: str) -> None:
+        if self._thread is not None:
+            return
+        self._storage_path = storage_path
+        con = connection_get(storage_path)
+        try:
+            job_ids = [
+                row["id"]
+                for row in con.execute(
+                    """
+                    select id
+                    from tag_jobs
+                    where status in ('queued', 'running')
+                    order by created_at
+                    """
+                )
+            ]
+        finally:
+            con.close()
+        if job_ids:
+            log.info("Resuming %d tag jobs", len(job_ids))
+        for job_id in job_ids:
+            self._queue.put(job_id)
+        self._thread = threading.Thread(
+            target=self._run, name="tag-job-runner", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, job_id: str) -> None:
+        self._queue.put(job_id)
+
+    def _run(self) -> None:
+        if self._storage_path is None:
+            return
+        con = connection_get(self._storage_path)
+        try:
+            while True:
+                job_id = self._queue.get()
+                # The connection stays open between jobs, so end the previous
+                # read transaction to see jobs created since
+                con.rollback()
+                try:
+                    self._job_run(con, job_id)
+                except Exception:
+                    log.exception("Tag job %s failed", job_id)
+                    con.rollback()
+                    con.execute(
+                        """
+                        update tag_jobs
+                        set
+                            status = 'failed',
+                            finished_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+                        where id = :id
+                        """,
+                        {"id": job_id},
+                    )
+                    con.commit()
+        finally:
+            con.close()
+
+    def _job_run(self, con: sqlite3.Connection, job_id: str) -> None:
+        job = con.execute(
+            "select kind, params, status from tag_jobs where id = :id",
+            {"id": job_id},
+        ).fetchone()
+        if job is None or job["status"] in ("completed", "failed"):
+            return
+        kind = job["kind"]
+        params = json.loads(job["params"])
+        con.execute(
+            """
+            update tag_jobs
+            set
+                status = 'running',
+                started_at = coalesce(
+                    started_at, strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+                )
+            where id = :id
+            """,
+            {"id": job_id},
+        )
+        con.commit()
+        paths = [
+            row["path"]
+            for row in con.execute(
+                """
+                select path
+                from tag_job_files
+                where job_id = :job_id and status = 'pending'
+                """,
+                {"job_id": job_id},
+            )
+        ]
+        log.info("Running tag job %s over %d files", job_id, len(paths))
+
+        # Results are collected here and written in one short transaction per
+        # batch, so the write lock is not held while files are rewritten
+        results: list[dict[str, str | None]] = []
+        rewritten: list[str] = []
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            futures = {
+                executor.submit(_tag_job_file_run, kind, params, path): path
+                for path in paths
+            }
+            for future in concurrent.futures.as_completed(futures):
+                path = futures[future]
+                error = None
+                try:
+                    status = future.result()
+                except (mutagen.MutagenError, OSError, ValueError) as e:
+                    log.error("Unable to rewrite tags in %s: %s", path, e)
+                    status = "failed"
+                    error = str(e.__cause__ or e)
+                results.append(
+                    {"status": status, "error": error, "job_id": job_id, "path": path}
+                )
+                if status == "done":
+                    rewritten.append(path)
+                if len(results) >= TAG_JOB_COMMIT_EVERY:
+                    _tag_job_results_put(con, results, rewritten)
+                    results = []
+                    rewritten = []
+        _tag_job_results_put(con, results, rewritten)
+
+        con.execute(
+            """
+            update tag_jobs
+            set
+                status = 'completed',
+                finished_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+            where id = :id
+            """,
+            {"id": job_id},
+        )
+        con.commit()
+        log.info("Finished tag job %s", job_id)
+
+
+tag_job_runner = TagJobRunner()
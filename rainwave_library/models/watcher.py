@@ -0,0 +1,294 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import pathlib
+import select
+import struct
+import threading
+import time
+import typing
+
+log = logging.getLogger(__name__)
+
+WATCH_COALESCE_SECONDS = 0.5
+WATCH_POLL_INTERVAL_SECONDS = 30.0
+
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_DONT_FOLLOW = 0x02000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+# Writes are reported once the file is closed, so an upload is one event
+# rather than one per chunk
+_WATCH_MASK = (
+    _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+    | _IN_DONT_FOLLOW
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._add_watch.restype = ctypes.c_int
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self._rm_watch.restype = ctypes.c_int
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.fd = fd
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._rm_watch(self.fd, wd)
+
+    def read(self) -> typing.Iterator[tuple[int, int, str]]:
+        """Yield (watch descriptor, mask, name) for the events ready to read"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            yield wd, mask, name
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """Watches folders in a background thread and tells subscribers which
+    folders changed.
+
+    inotify is used where it is available. Each batch of events is collected
+    for WATCH_COALESCE_SECONDS and then published as one set of folders whose
+    contents, or anything below them, may have changed. Without inotify, or
+    when the kernel runs out of watches, folder mtimes are compared every
+    WATCH_POLL_INTERVAL_SECONDS instead; polling does not see files rewritten
+    in place, so caches should only skip their own checks when covers() is
+    true.
+
+    Every root is published as changed once inotify is watching and again when
+    it falls back to polling, since changes made before either point were not
+    seen. Folders that could not be watched are left out of covers()."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._roots: list[pathlib.Path] = []
+        self._subscribers: list[typing.Callable[[frozenset[pathlib.Path]], None]] = []
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._inotify_active = False
+        # Folders whose subtree inotify is not watching, replaced rather than
+        # changed so covers() can read it without the lock
+        self._unwatched: frozenset[str] = frozenset()
+
+    def watch(self, path: pathlib.Path) -> None:
+        """Add a folder to watch; call before start()"""
+        self._roots.append(path.resolve())
+
+    def subscribe(
+        self, callback: typing.Callable[[frozenset[pathlib.Path]], None]
+    ) -> None:
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def covers(self, path: pathlib.Path) -> bool:
+        """True when every change below path is being reported as it happens"""
+        return (
+            self._inotify_active
+            and any(path.is_relative_to(root) for root in self._roots)
+            and not any(path.is_relative_to(folder) for folder in self._unwatched)
+        )
+
+    def start(self) -> None:
+        if self._thread is not None or not self._roots:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="library-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _publish(self, changed: set[str]) -> None:
+        if not changed:
+            return
+        paths = frozenset(pathlib.Path(path) for path in changed)
+        log.debug("Publishing changes to %d folders", len(paths))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(paths)
+            except Exception:
+                log.exception("Library watcher subscriber failed")
+
+    def _run(self) -> None:
+        try:
+            inotify = _Inotify()
+        except (AttributeError, OSError) as error:
+            log.warning("inotify is not available, polling instead: %s", error)
+            self._poll()
+            return
+        try:
+            self._watch_inotify(inotify)
+        except OSError as error:
+            log.warning("Unable to watch with inotify, polling instead: %s", error)
+        else:
+            return
+        finally:
+            # Closing drops every watch, so they are free for other processes
+            # while polling
+            self._inotify_active = False
+            inotify.close()
+        # Anything may have changed while no events were being read
+        self._poll(publish_all=True)
+
+    def _watch_tree(
+        self, inotify: _Inotify, watches: dict[int, str], directory: str
+    ) -> None:
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            try:
+                watches[inotify.add_watch(path)] = path
+                with os.scandir(path) as entries:
+                    pending.extend(
+                        entry.path
+                        for entry in entries
+                        if entry.is_dir(follow_symlinks=False)
+                    )
+            except OSError as error:
+                # Running out of watches cannot be recovered from
+                if error.errno == errno.ENOSPC:
+                    raise
+                log.warning("Unable to watch folder %s: %s", path, error)
+                self._unwatched |= {path}
+            else:
+                if path in self._unwatched:
+                    self._unwatched -= {path}
+
+    def _watch_inotify(self, inotify: _Inotify) -> None:
+        watches: dict[int, str] = {}
+        self._unwatched = frozenset()
+        for root in self._roots:
+            self._watch_tree(inotify, watches, str(root))
+        self._inotify_active = True
+        log.info(
+            "Watching %d folders with inotify, %d could not be watched",
+            len(watches),
+            len(self._unwatched),
+        )
+        # Changes made during the walk, before a folder was watched, were missed
+        self._publish({str(root) for root in self._roots})
+        while not self._stop.is_set():
+            ready, _, _ = select.select([inotify.fd], [], [], 1.0)
+            if not ready:
+                continue
+            changed: set[str] = set()
+            deadline = time.monotonic() + WATCH_COALESCE_SECONDS
+            while ready:
+                for wd, mask, name in inotify.read():
+                    if mask & _IN_Q_OVERFLOW:
+                        changed.update(str(root) for root in self._roots)
+                        continue
+                    directory = watches.get(wd)
+                    if directory is None:
+                        continue
+                    if mask & _IN_IGNORED:
+                        del watches[wd]
+                        continue
+                    changed.add(directory)
+                    if mask & _IN_ISDIR and name:
+                        path = os.path.join(directory, name)
+                        changed.add(path)
+                        if mask & _IN_MOVED_FROM:
+                            # Watches follow the moved folder, so drop them and
+                            # watch it again under its new name
+                            prefix = os.path.join(path, "")
+                            for moved_wd, moved_path in list(watches.items()):
+                                if moved_path == path or moved_path.startswith(prefix):
+                                    inotify.rm_watch(moved_wd)
+                                    del watches[moved_wd]
+                        elif mask & (_IN_CREATE | _IN_MOVED_TO):
+                            self._watch_tree(inotify, watches, path)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                ready, _, _ = select.select([inotify.fd], [], [], remaining)
+            self._publish(changed)
+
+    def _snapshot(self) -> dict[str, int]:
+        mtimes = {}
+        pending = [str(root) for root in self._roots]
+        while pending:
+            path = pending.pop()
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+                with os.scandir(path) as entries:
+                    pending.extend(
+                        entry.path
+                        for entry in entries
+                        if entry.is_dir(follow_symlinks=False)
+                    )
+            except OSError as error:
+                log.debug("Unable to read folder %s: %s", path, error)
+        return mtimes
+
+    def _poll(self, *, publish_all: bool = False) -> None:
+        previous = self._snapshot()
+        if publish_all:
+            self._publish({str(root) for root in self._roots})
+        while not self._stop.wait(WATCH_POLL_INTERVAL_SECONDS):
+            current = self._snapshot()
+            self._publish(
+                {
+                    path
+                    for path in previous.keys() | current.keys()
+                    if previous.get(path) != current.get(path)
+                }
+            )
+            previous = current
+
+
+library_watcher = LibraryWatcher()
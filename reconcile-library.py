@@ -0,0 +1,117 @@
+"""Compare the MP3 files in the library with the songs Rainwave knows about.
+
+Only folders that changed since the previous run are listed again, so repeated
+runs finish quickly. Run it with the same environment file as the app:
+
+    uv run --env-file .local/.env reconcile-library.py
+
+Pass --full to list every folder again, which also picks up files that were
+rewritten in place. The result is saved and shown on the library reconciliation
+page.
+
+Each run also hashes the audio of new and changed files for duplicate
+detection. The first run hashes the whole library and can take a while; pass
+--skip-audio-index to leave the index as it is. Cached metadata for files that
+no longer exist is removed as well.
+"""
+
+import argparse
+import os
+import pathlib
+
+import rainwave_library.models.audio_index
+import rainwave_library.models.rainwave
+import rainwave_library.models.reconciliation
+import rainwave_library.models.storage
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare library files with the songs in Rainwave's database."
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="List every folder again instead of only the folders that changed.",
+    )
+    parser.add_argument(
+        "--report",
+        action="append",
+        choices=("orphans", "disabled", "missing", "moved"),
+        help="Only print these findings. May be given more than once.",
+    )
+    parser.add_argument(
+        "--skip-audio-index",
+        action="store_true",
+        help="Do not hash new and changed files for duplicate detection.",
+    )
+    args = parser.parse_args()
+
+    storage_dir = pathlib.Path(os.getenv("STATE_DIRECTORY") or ".local")
+    storage_path = os.getenv("STORAGE_CNX", str(storage_dir / "rainwave-library.db"))
+    rainwave_library.models.storage.connection_init(storage_path)
+    storage_cnx = rainwave_library.models.storage.connection_get(storage_path)
+    try:
+        rainwave_library.models.storage.migrate(storage_cnx)
+        dsn = rainwave_library.models.storage.setting_get(
+            storage_cnx, "rainwave/connection"
+        )
+        if not dsn:
+            msg = "Missing required setting: rainwave/connection"
+            raise RuntimeError(msg)
+        library_root = pathlib.Path(
+            rainwave_library.models.storage.setting_get(storage_cnx, "library/root")
+            or "/icecast"
+        )
+        db = rainwave_library.models.rainwave.connection_get(dsn)
+        known_filenames = rainwave_library.models.rainwave.get_song_filenames(db)
+        reconciliation = rainwave_library.models.reconciliation.library_reconcile(
+            storage_cnx, library_root, known_filenames, full=args.full
+        )
+        audio_index = (
+            None
+            if args.skip_audio_index
+            else rainwave_library.models.audio_index.audio_index_update(
+                storage_cnx, library_root
+            )
+        )
+        metadata_removed = rainwave_library.models.storage.mp3_metadata_prune(
+            storage_cnx
+        )
+    finally:
+        storage_cnx.close()
+
+    reports = args.report or ("orphans", "disabled", "missing", "moved")
+    if "orphans" in reports:
+        print(f"# {len(reconciliation.orphans)} files not in Rainwave")
+        for path in reconciliation.orphans:
+            print(path)
+    if "disabled" in reports:
+        print(f"# {len(reconciliation.disabled)} files for unverified songs")
+        for path in reconciliation.disabled:
+            print(path)
+    if "missing" in reports:
+        print(f"# {len(reconciliation.missing)} verified songs without a file")
+        for path in reconciliation.missing:
+            print(path)
+    if "moved" in reports:
+        print(f"# {len(reconciliation.moved)} songs that appear to have moved")
+        for move in reconciliation.moved:
+            print(f"{move.old_path} -> {move.new_path}")
+    print(
+        f"# {reconciliation.files_total} files in "
+        f"{reconciliation.directories_total} folders, "
+        f"{reconciliation.directories_rescanned} rescanned, "
+        f"in {reconciliation.duration_seconds:.1f} seconds"
+    )
+    print(f"# {metadata_removed} cached metadata rows for missing files removed")
+    if audio_index is not None:
+        print(
+            f"# {audio_index.files_hashed} of {audio_index.files_total} files "
+            f"hashed for duplicate detection, {audio_index.files_removed} removed, "
+            f"in {audio_index.duration_seconds:.1f} seconds"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Compare mp3_duration_seconds_estimate with a full mutagen parse on small
+synthetic files covering the layouts the estimate handles on its own"""
+
+import pathlib
+
+import mutagen.id3
+import mutagen.mp3
+import pytest
+
+from rainwave_library.models.mp3 import (
+    _MP3_BITRATES_KBPS,
+    mp3_duration_seconds_estimate,
+)
+
+# MPEG 1 layer III at 44.1 kHz, 1152 samples per frame
+SAMPLE_RATE = 44100
+TOLERANCE_SECONDS = 0.01
+
+
+def _frame(bitrate_index: int = 9, mode: int = 0, body: bytes = b"") -> bytes:
+    header = bytes([0xFF, 0xFB, bitrate_index << 4, mode << 6])
+    bitrate_bps = _MP3_BITRATES_KBPS[1, 3][bitrate_index] * 1000
+    length = 144 * bitrate_bps // SAMPLE_RATE
+    return (header + body).ljust(length, b"\x00")
+
+
+def _frames(count: int, bitrate_indexes: tuple[int, ...] = (9,)) -> bytes:
+    return b"".join(
+        _frame(bitrate_indexes[i % len(bitrate_indexes)]) for i in range(count)
+    )
+
+
+def _xing_frame(
+    tag: bytes, frame_count: int, byte_count: int, lame: bytes = b""
+) -> bytes:
+    # Stereo MPEG 1 puts the header 32 bytes of side information after the sync
+    body = bytes(32) + tag + (0x03).to_bytes(4) + frame_count.to_bytes(4)
+    return _frame(body=body + byte_count.to_bytes(4) + lame)
+
+
+def _lame_tag(version: bytes, delay: int, padding: int) -> bytes:
+    return version + bytes(12) + ((delay << 12) | padding).to_bytes(3) + bytes(12)
+
+
+def _vbri_frame(frame_count: int, byte_count: int, toc_entry_size: int = 2) -> bytes:
+    toc_entries = 100
+    body = (
+        bytes(32)
+        + b"VBRI"
+        + (1).to_bytes(2)
+        + bytes(2)
+        + (75).to_bytes(2)
+        + byte_count.to_bytes(4)
+        + frame_count.to_bytes(4)
+        + toc_entries.to_bytes(2)
+        + (1).to_bytes(2)
+        + toc_entry_size.to_bytes(2)
+        + (frame_count // toc_entries).to_bytes(2)
+    )
+    return _frame(body=body + bytes(toc_entries * toc_entry_size))
+
+
+def _cbr() -> bytes:
+    return _frames(2000)
+
+
+def _mixed() -> bytes:
+    return _frames(2000, (9, 11, 5))
+
+
+def _xing() -> bytes:
+    audio = _mixed()
+    return _xing_frame(b"Xing", 2000, len(audio)) + audio
+
+
+def _xing_lame() -> bytes:
+    audio = _mixed()
+    lame = _lame_tag(b"LAME3.99r", 576, 1000)
+    return _xing_frame(b"Xing", 2000, len(audio), lame) + audio
+
+
+def _xing_lame_3_100() -> bytes:
+    audio = _mixed()
+    lame = _lame_tag(b"LAME3.100", 576, 1000)
+    return _xing_frame(b"Xing", 2000, len(audio), lame) + audio
+
+
+def _info() -> bytes:
+    audio = _cbr()
+    return _xing_frame(b"Info", 2000, len(audio)) + audio
+
+
+def _vbri() -> bytes:
+    audio = _mixed()
+    return _vbri_frame(2000, len(audio)) + audio
+
+
+def _vbri_bad_toc() -> bytes:
+    audio = _mixed()
+    return _vbri_frame(2000, len(audio), toc_entry_size=3) + audio
+
+
+def _junk_prefix() -> bytes:
+    return b"\xff\x00" * 100 + _cbr()
+
+
+LAYOUTS = {
+    "cbr": _cbr,
+    "mixed-bitrate": _mixed,
+    "xing": _xing,
+    "xing-lame": _xing_lame,
+    "xing-lame-3.100": _xing_lame_3_100,
+    "info": _info,
+    "vbri": _vbri,
+    "vbri-bad-toc": _vbri_bad_toc,
+    "junk-prefix": _junk_prefix,
+}
+
+
+def _write(
+    path: pathlib.Path, audio: bytes, *, id3v2: bool = False, id3v1: bool = False
+) -> pathlib.Path:
+    path.write_bytes(audio)
+    if id3v2:
+        tags = mutagen.id3.ID3()
+        tags.add(mutagen.id3.TIT2(encoding=3, text=["x" * 5000]))
+        tags.save(path)
+    if id3v1:
+        with path.open("ab") as f:
+            f.write(b"TAG" + bytes(125))
+    return path
+
+
+@pytest.mark.parametrize("tags", ["none", "id3v2", "id3v1", "both"])
+@pytest.mark.parametrize("layout", sorted(LAYOUTS))
+def test_estimate_matches_mutagen(
+    tmp_path: pathlib.Path, layout: str, tags: str
+) -> None:
+    path = _write(
+        tmp_path / f"{layout}.mp3",
+        LAYOUTS[layout](),
+        id3v2=tags in ("id3v2", "both"),
+        id3v1=tags in ("id3v1", "both"),
+    )
+    expected = mutagen.mp3.MP3(path).info.length
+    assert mp3_duration_seconds_estimate(path) == pytest.approx(
+        expected, abs=TOLERANCE_SECONDS
+    )
+
+
+def test_estimate_missing_file(tmp_path: pathlib.Path) -> None:
+    assert mp3_duration_seconds_estimate(tmp_path / "missing.mp3") is None